@@ -1,8 +1,16 @@
 
+import contextvars
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from cachelib import SimpleCache
+
+import cache_invalidation
+from circuit_breaker import guarded_request
+from jsonapi import project_document, fields_cache_key
+from lru_cache import ByteLRUCache
 
 # APS API settings
 APS_CLIENT_ID = os.getenv('APS_CLIENT_ID')
@@ -10,17 +18,54 @@ APS_CLIENT_SECRET = os.getenv('APS_CLIENT_SECRET')
 APS_AUTH_URL = os.getenv('APS_AUTH_URL', 'https://developer.api.autodesk.com/authentication/v2/token')
 APS_DATA_URL = os.getenv('APS_DATA_URL', 'https://developer.api.autodesk.com')
 APS_SCOPES = ['data:read', 'bucket:read', 'account:read']
+API_CACHE_TTL = 60 * 60  # Cache API responses for 1 hour
+# Last known good copy, served when APS fails or its circuit is open
+STALE_CACHE_TTL = int(os.getenv('STALE_CACHE_TTL', str(24 * 60 * 60)))
+APS_STALE_CACHE_MAX_BYTES = int(os.getenv('APS_STALE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+STALE_PREFIX = 'stale:'
+
+# Age in seconds of the stale response served during the current request (None if fresh)
+served_stale_age = contextvars.ContextVar('served_stale_age', default=None)
+
+def key_group(key):
+    """Groups cache keys for statistics: ids are replaced by '*' (data/v1/projects/*/folders/*/contents)."""
+    prefix = ''
+    if key.startswith(STALE_PREFIX):
+        prefix, key = STALE_PREFIX, key[len(STALE_PREFIX):]
+    key, projected, _ = key.partition('?fields:')
+    if '://' in key:
+        key = key.split('://', 1)[1].split('/', 1)[-1]
+    segments = key.split('?', 1)[0].strip('/').split('/')
+    # APS paths alternate collection/id after the version segment
+    template = segments[:3] + [s if i % 2 else '*' for i, s in enumerate(segments[3:])]
+    return prefix + '/'.join(template) + ('?fields' if projected else '')
 
 # Cache for API responses
-cache = SimpleCache()
+cache = ByteLRUCache(key_group=key_group)
+# Last good copies have their own byte budget so they never push live entries out of `cache`
+stale_cache = ByteLRUCache(max_bytes=APS_STALE_CACHE_MAX_BYTES, key_group=key_group)
+# Single-flight lock: concurrent requests wait for one token fetch instead of all calling APS
+_token_lock = threading.Lock()
+# endpoint -> cache keys of its ?fields= projections (guarded by _projection_lock)
+_projection_keys = {}
+_projection_lock = threading.Lock()
+# Called with each endpoint invalidated by another worker (e.g. cache_warmer.refresh_now)
+invalidation_listeners = []
 
 def get_internal_token():
     """Gets a 2-legged token for internal server-to-server calls."""
     token = cache.get('internal_token')
-    if token is None:
+    if token is not None:
+        return token, None
+    with _token_lock:
+        token = cache.get('internal_token')
+        if token is not None:
+            return token, None
         try:
-            response = requests.post(
+            response = guarded_request(
+                'POST',
                 APS_AUTH_URL,
+                family='auth',
                 headers={'Content-Type': 'application/x-www-form-urlencoded'},
                 data={
                     'client_id': APS_CLIENT_ID,
@@ -37,15 +82,125 @@ def get_internal_token():
             return None, str(e)
     return token, None
 
+def fetch_api_data(endpoint, token, params=None):
+    """Makes an uncached GET request to the APS API (endpoint may be a full URL)."""
+    url = endpoint if endpoint.startswith('http') else f'{APS_DATA_URL}/{endpoint}'
+    try:
+        response = guarded_request('GET', url, headers={'Authorization': f'Bearer {token}'}, params=params)
+        response.raise_for_status()
+        return response.json(), None
+    except requests.exceptions.RequestException as e:
+        return None, str(e)
+
+def _remember(endpoint, data):
+    stale_cache.set(f'{STALE_PREFIX}{endpoint}', (time.time(), data), timeout=STALE_CACHE_TTL)
+
+def get_stale_api_data(endpoint):
+    """Returns (data, age_seconds) of the last good response for an endpoint, or (None, None)."""
+    entry = stale_cache.get(f'{STALE_PREFIX}{endpoint}')
+    if entry is None:
+        return None, None
+    fetched_at, data = entry
+    return data, time.time() - fetched_at
+
+def apply_remote_invalidations():
+    """Evicts the endpoints that other workers invalidated (webhooks) since the last check."""
+    for endpoint in cache_invalidation.pending():
+        invalidate_api_data(endpoint)
+        for listener in invalidation_listeners:
+            listener(endpoint)
+
 def get_api_data(endpoint, token):
-    """Makes a GET request to the APS API and caches the response."""
+    """Makes a GET request to the APS API and caches the response.
+    If APS fails (or its circuit is open) the last good copy is served instead."""
+    apply_remote_invalidations()
     data = cache.get(endpoint)
     if data is None:
-        try:
-            response = requests.get(f'{APS_DATA_URL}/{endpoint}', headers={'Authorization': f'Bearer {token}'})
-            response.raise_for_status()
-            data = response.json()
-            cache.set(endpoint, data, timeout=60 * 60)  # Cache for 1 hour
-        except requests.exceptions.RequestException as e:
-            return None, str(e)
+        return _load_api_data(endpoint, token)
+    return data, None
+
+def _load_api_data(endpoint, token):
+    """Cache miss path of get_api_data: fetch, store, or fall back to the stale copy."""
+    data, error = fetch_api_data(endpoint, token)
+    if error:
+        stale_data, age = get_stale_api_data(endpoint)
+        if stale_data is None:
+            return None, error
+        print(f"[aps] Sirviendo copia de hace {int(age)}s para {endpoint}: {error}")
+        mark_stale(age)
+        return stale_data, None
+    cache.set(endpoint, data, timeout=API_CACHE_TTL)
+    _remember(endpoint, data)
+    return data, None
+
+def mark_stale(age):
+    """Folds a stale age (e.g. reported by a worker thread) into the current request's marker."""
+    if age is not None:
+        served_stale_age.set(max(age, served_stale_age.get() or 0))
+
+def submit_tracking_stale(executor, fn, *args, **kwargs):
+    """Submits fn to a thread pool in a copy of the caller's context. The future's result
+    is (result, stale_age); pass stale_age to mark_stale in the request thread."""
+    context = contextvars.copy_context()
+
+    def run():
+        served_stale_age.set(None)
+        return fn(*args, **kwargs), served_stale_age.get()
+
+    return executor.submit(context.run, run)
+
+def get_many_api_data(endpoints, token, max_workers=8):
+    """get_api_data for several endpoints: cache hits are answered inline and
+    misses are fetched concurrently. Returns {endpoint: (data, error)}."""
+    apply_remote_invalidations()
+    results = {}
+    misses = []
+    for endpoint in dict.fromkeys(endpoints):
+        data = cache.get(endpoint)
+        if data is None:
+            misses.append(endpoint)
+        else:
+            results[endpoint] = (data, None)
+    if not misses:
+        return results
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(misses))) as executor:
+        futures = {
+            endpoint: submit_tracking_stale(executor, _load_api_data, endpoint, token)
+            for endpoint in misses
+        }
+        for endpoint, future in futures.items():
+            results[endpoint], age = future.result()
+            mark_stale(age)
+    return results
+
+def set_api_data(endpoint, data, timeout=API_CACHE_TTL):
+    """Replaces the cached response for an endpoint and drops its stale projections."""
+    apply_remote_invalidations()
+    invalidate_api_data(endpoint)
+    cache.set(endpoint, data, timeout=timeout)
+    _remember(endpoint, data)
+
+def invalidate_api_data(endpoint):
+    """Evicts the cached response for an endpoint together with its projections."""
+    cache.delete(endpoint)
+    with _projection_lock:
+        keys = _projection_keys.pop(endpoint, ())
+    for key in keys:
+        cache.delete(key)
+
+def get_projected_api_data(endpoint, token, fields):
+    """Like get_api_data, but returns (and caches) only the requested JSON:API fields."""
+    apply_remote_invalidations()
+    cache_key = f'{endpoint}?{fields_cache_key(fields)}'
+    data = cache.get(cache_key)
+    if data is None:
+        full_data, error = get_api_data(endpoint, token)
+        if error:
+            return None, error
+        data = project_document(full_data, fields)
+        if served_stale_age.get() is not None:
+            return data, None  # don't cache a projection built from stale data
+        cache.set(cache_key, data, timeout=API_CACHE_TTL)
+        with _projection_lock:
+            _projection_keys.setdefault(endpoint, set()).add(cache_key)
     return data, None
@@ -0,0 +1,112 @@
+"""
+Benchmark de capacidad concurrente: workers sync vs gevent con el mismo hardware.
+
+Levanta un APS simulado (cada respuesta tarda UPSTREAM_DELAY segundos), arranca
+gunicorn con cada clase de worker apuntando a él y lanza CONCURRENCY clientes
+contra /api/projects/<p>/folders/<f>/changes, que consulta APS en cada petición.
+
+Uso: python bench_workers.py [concurrency] [requests] [workers]
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+UPSTREAM_PORT = 3900
+APP_PORT = 3901
+UPSTREAM_DELAY = float(os.getenv('BENCH_UPSTREAM_DELAY', '0.2'))
+
+
+class FakeAPS(BaseHTTPRequestHandler):
+    def _reply(self, payload):
+        time.sleep(UPSTREAM_DELAY)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._reply({'access_token': 'bench', 'expires_in': 3600})
+
+    def do_GET(self):
+        self._reply({'data': [{'type': 'items', 'id': 'i1',
+                               'attributes': {'lastModifiedTime': '2024-01-01T00:00:00.000Z'}}]})
+
+    def log_message(self, *args):
+        pass
+
+
+def run_gunicorn(worker_class, workers):
+    env = dict(os.environ,
+               APS_AUTH_URL=f'http://127.0.0.1:{UPSTREAM_PORT}/token',
+               APS_DATA_URL=f'http://127.0.0.1:{UPSTREAM_PORT}',
+               CACHE_WARMER_ENABLED='false',
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_BIND=f'127.0.0.1:{APP_PORT}',
+               WEB_CONCURRENCY=str(workers))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'server:app'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f'http://127.0.0.1:{APP_PORT}/api/auth/status', timeout=1)
+            return proc
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f'gunicorn ({worker_class}) no arrancó')
+
+
+def load(concurrency, total):
+    url = f'http://127.0.0.1:{APP_PORT}/api/projects/b.bench/folders/f/changes'
+    latencies = []
+
+    def one(_):
+        session_start = time.time()
+        resp = requests.get(url, timeout=120)
+        latencies.append(time.time() - session_start)
+        return resp.status_code
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        codes = list(executor.map(one, range(total)))
+    elapsed = time.time() - started
+    latencies.sort()
+    return {
+        'ok': sum(1 for c in codes if c == 200),
+        'elapsed': elapsed,
+        'rps': total / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+if __name__ == '__main__':
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    upstream = ThreadingHTTPServer(('127.0.0.1', UPSTREAM_PORT), FakeAPS)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    print(f"APS simulado: {UPSTREAM_DELAY * 1000:.0f} ms por respuesta; "
+          f"{total} peticiones, {concurrency} concurrentes, {workers} workers")
+    for worker_class in ('sync', 'gevent'):
+        proc = run_gunicorn(worker_class, workers)
+        try:
+            load(concurrency, concurrency)  # calentamiento (token, imports)
+            result = load(concurrency, total)
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{worker_class:>7}: {result['ok']}/{total} OK en {result['elapsed']:.1f}s "
+              f"-> {result['rps']:.1f} req/s, p50 {result['p50'] * 1000:.0f} ms, p95 {result['p95'] * 1000:.0f} ms")
+    upstream.shutdown()
@@ -0,0 +1,93 @@
+"""
+Difusión de invalidaciones de `aps.cache` entre workers de gunicorn.
+
+La caché de APS vive en la memoria de cada proceso, pero cada webhook de APS
+llega a un solo worker. Ese worker anota los endpoints afectados en una tabla
+SQLite compartida (CACHE_INVALIDATION_DB_PATH) y cada proceso, al leer de la
+caché, desaloja los que aún no ha visto. La tabla se consulta como mucho una
+vez cada CACHE_INVALIDATION_POLL_SECONDS por proceso.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+CACHE_INVALIDATION_DB_PATH = os.getenv(
+    'CACHE_INVALIDATION_DB_PATH',
+    os.path.join(os.path.dirname(__file__), 'cache', 'invalidations.sqlite3')
+)
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv('CACHE_INVALIDATION_POLL_SECONDS', '1'))
+# Más que el TTL de la caché: pasado ese tiempo la entrada habría vencido igualmente.
+RETENTION_SECONDS = 24 * 3600
+
+_lock = threading.Lock()
+_last_id = None   # último evento visto por este proceso (None: aún no se ha consultado)
+_own_ids = set()  # eventos publicados por este proceso, que ya los aplicó al publicarlos
+_next_poll = 0.0
+
+
+@contextmanager
+def _db():
+    """Conexión a la tabla compartida dentro de una transacción; se cierra al salir."""
+    os.makedirs(os.path.dirname(CACHE_INVALIDATION_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_INVALIDATION_DB_PATH, timeout=30)
+    try:
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS invalidations ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT, endpoint TEXT NOT NULL, created REAL NOT NULL)'
+            )
+            yield conn
+    finally:
+        conn.close()
+
+
+def publish(endpoints):
+    """Anota endpoints ya desalojados en este proceso para que los desalojen los demás."""
+    endpoints = list(endpoints)
+    if not endpoints:
+        return
+    now = time.time()
+    try:
+        with _db() as conn:
+            ids = [
+                conn.execute('INSERT INTO invalidations (endpoint, created) VALUES (?, ?)', (endpoint, now)).lastrowid
+                for endpoint in endpoints
+            ]
+            conn.execute('DELETE FROM invalidations WHERE created < ?', (now - RETENTION_SECONDS,))
+    except sqlite3.Error as e:
+        print(f"[cache-invalidation] No se pudo publicar la invalidación: {e}")
+        return
+    with _lock:
+        _own_ids.update(ids)
+
+
+def pending():
+    """Endpoints invalidados por otros procesos desde la última consulta ([] entre sondeos)."""
+    global _last_id, _next_poll
+    now = time.monotonic()
+    with _lock:
+        if now < _next_poll:
+            return []
+        _next_poll = now + CACHE_INVALIDATION_POLL_SECONDS
+        last_id = _last_id
+    try:
+        with _db() as conn:
+            if last_id is None:
+                # Primera consulta del proceso: su caché aún está vacía, basta con la posición actual.
+                rows = []
+                newest = conn.execute('SELECT MAX(id) FROM invalidations').fetchone()[0] or 0
+            else:
+                rows = conn.execute(
+                    'SELECT id, endpoint FROM invalidations WHERE id > ? ORDER BY id', (last_id,)
+                ).fetchall()
+                newest = rows[-1][0] if rows else last_id
+    except sqlite3.Error as e:
+        print(f"[cache-invalidation] No se pudo consultar la tabla de invalidaciones: {e}")
+        return []
+    with _lock:
+        _last_id = max(_last_id or 0, newest)
+        endpoints = [endpoint for event_id, endpoint in rows if event_id not in _own_ids]
+        _own_ids.difference_update(event_id for event_id, _ in rows)
+    return list(dict.fromkeys(endpoints))
@@ -0,0 +1,149 @@
+"""
+Precalentamiento de la caché de APS con refresco anticipado (refresh-ahead).
+
+Al arrancar se cargan hubs, proyectos, topFolders del proyecto ACC y los
+endpoints configurados. Cada entrada se vuelve a pedir CACHE_WARM_MARGIN
+segundos antes de que venza su TTL en `aps.cache`, así las entradas calientes
+nunca expiran. El trabajo corre en un hilo daemon con concurrencia acotada.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aps import API_CACHE_TTL, fetch_api_data, get_internal_token, invalidation_listeners, set_api_data
+
+CACHE_WARMER_ENABLED = os.getenv('CACHE_WARMER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CACHE_WARM_CONCURRENCY = int(os.getenv('CACHE_WARM_CONCURRENCY', '4'))
+CACHE_WARM_MARGIN = int(os.getenv('CACHE_WARM_MARGIN_SECONDS', '300'))
+CACHE_WARM_RETRY_SECONDS = 60
+HUBS_ENDPOINT = 'project/v1/hubs'
+
+# endpoint -> {'due': ts, 'last_warmed': ts, 'duration': s, 'error': str}
+_entries = {}
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+_acc_project_id = None
+
+
+def schedule(endpoint, due=None):
+    """Añade un endpoint al conjunto que se mantiene caliente."""
+    with _lock:
+        entry = _entries.setdefault(endpoint, {'due': 0, 'last_warmed': None, 'duration': None, 'error': None})
+        if due is not None:
+            entry['due'] = due
+    _wakeup.set()
+
+
+def refresh_now(endpoint):
+    """Adelanta el refresco de un endpoint ya precalentado. Devuelve False si no se sigue."""
+    with _lock:
+        if _thread is None or endpoint not in _entries:
+            return False
+        _entries[endpoint]['due'] = 0
+    _wakeup.set()
+    return True
+
+
+def _children(endpoint, data):
+    """Endpoints que se descubren a partir de una respuesta (hubs -> proyectos -> topFolders)."""
+    resources = (data or {}).get('data') or []
+    if endpoint == HUBS_ENDPOINT:
+        return [f"{HUBS_ENDPOINT}/{hub['id']}/projects" for hub in resources if hub.get('id')]
+    if endpoint.startswith(f'{HUBS_ENDPOINT}/') and endpoint.endswith('/projects') and _acc_project_id:
+        if any(project.get('id') == _acc_project_id for project in resources):
+            return [f'{endpoint}/{_acc_project_id}/topFolders']
+    return []
+
+
+def warm_endpoint(endpoint, token):
+    """Pide el endpoint a APS (sin caché), lo guarda y programa su próximo refresco."""
+    started = time.time()
+    data, error = fetch_api_data(endpoint, token)
+    duration = time.time() - started
+    now = time.time()
+    with _lock:
+        entry = _entries[endpoint]
+        entry['duration'] = duration
+        entry['error'] = error
+        if error:
+            entry['due'] = now + CACHE_WARM_RETRY_SECONDS
+        else:
+            entry['last_warmed'] = now
+            entry['due'] = now + max(API_CACHE_TTL - CACHE_WARM_MARGIN, CACHE_WARM_RETRY_SECONDS)
+    if error:
+        print(f"[cache-warmer] Error en {endpoint} ({duration:.2f}s): {error}")
+        return []
+    set_api_data(endpoint, data)
+    print(f"[cache-warmer] {endpoint} ({duration:.2f}s)")
+    return _children(endpoint, data)
+
+
+def _warm_due(executor):
+    now = time.time()
+    with _lock:
+        due = [endpoint for endpoint, entry in _entries.items() if entry['due'] <= now]
+    if not due:
+        return
+    token, error = get_internal_token()
+    if error:
+        print(f"[cache-warmer] Sin token, se reintentará: {error}")
+        for endpoint in due:
+            schedule(endpoint, due=now + CACHE_WARM_RETRY_SECONDS)
+        return
+    started = time.time()
+    discovered = []
+    for children in executor.map(lambda endpoint: warm_endpoint(endpoint, token), due):
+        discovered.extend(children)
+    print(f"[cache-warmer] {len(due)} endpoints calentados en {time.time() - started:.2f}s")
+    with _lock:
+        new_endpoints = [endpoint for endpoint in discovered if endpoint not in _entries]
+    for endpoint in new_endpoints:
+        schedule(endpoint, due=0)
+
+
+def _run():
+    with ThreadPoolExecutor(max_workers=CACHE_WARM_CONCURRENCY, thread_name_prefix='cache-warmer') as executor:
+        while True:
+            _wakeup.clear()
+            try:
+                _warm_due(executor)
+            except Exception as e:
+                print(f"[cache-warmer] Error inesperado: {e}")
+            with _lock:
+                next_due = min((entry['due'] for entry in _entries.values()), default=None)
+            timeout = None if next_due is None else max(next_due - time.time(), 0)
+            if timeout != 0:
+                _wakeup.wait(timeout)
+
+
+def start_cache_warmer(endpoints=(), acc_project_id=None):
+    """Arranca el hilo de precalentamiento (una vez por proceso)."""
+    global _thread, _acc_project_id
+    if not CACHE_WARMER_ENABLED or _thread is not None:
+        return
+    _acc_project_id = acc_project_id
+    # Los webhooks recibidos por otros workers también adelantan el refresco aquí.
+    invalidation_listeners.append(refresh_now)
+    for endpoint in (HUBS_ENDPOINT, *endpoints):
+        schedule(endpoint, due=0)
+    _thread = threading.Thread(target=_run, name='cache-warmer', daemon=True)
+    _thread.start()
+
+
+def warmer_status():
+    now = time.time()
+    with _lock:
+        return {
+            'enabled': CACHE_WARMER_ENABLED and _thread is not None,
+            'endpoints': {
+                endpoint: {
+                    'last_warmed_ago': round(now - entry['last_warmed'], 1) if entry['last_warmed'] else None,
+                    'next_refresh_in': round(max(entry['due'] - now, 0), 1),
+                    'duration': round(entry['duration'], 3) if entry['duration'] is not None else None,
+                    'error': entry['error'],
+                }
+                for endpoint, entry in _entries.items()
+            }
+        }
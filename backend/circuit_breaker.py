@@ -0,0 +1,151 @@
+"""
+Circuit breaker por familia de endpoints de APS (auth, project, data, oss,
+modelderivative).
+
+Tras CIRCUIT_FAILURE_THRESHOLD fallos seguidos (timeouts, errores de
+conexión, 5xx o 429) el circuito se abre y las llamadas fallan al instante
+durante CIRCUIT_RECOVERY_SECONDS. Después se deja pasar una sola petición de
+prueba (half-open): si va bien el circuito se cierra, si falla se reabre.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RECOVERY_SECONDS = float(os.getenv('CIRCUIT_RECOVERY_SECONDS', '30'))
+APS_REQUEST_TIMEOUT = float(os.getenv('APS_REQUEST_TIMEOUT', '15'))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+FAMILY_PREFIXES = (
+    ('authentication/', 'auth'),
+    ('project/', 'project'),
+    ('data/', 'data'),
+    ('oss/', 'oss'),
+    ('modelderivative/', 'modelderivative'),
+    ('derivativeservice/', 'modelderivative'),
+    ('webhooks/', 'webhooks'),
+)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """El circuito de la familia está abierto: no se llama a APS."""
+
+    def __init__(self, family, retry_after):
+        super().__init__(f'APS ({family}) no disponible temporalmente; reintenta en {int(retry_after) + 1}s.')
+        self.family = family
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, family, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_seconds=CIRCUIT_RECOVERY_SECONDS):
+        self.family = family
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Lanza CircuitOpenError si no se debe llamar a APS ahora."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            elapsed = time.time() - self.opened_at
+            if self.state == OPEN and elapsed >= self.recovery_seconds:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return
+            raise CircuitOpenError(self.family, max(self.recovery_seconds - elapsed, 0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"[circuit] {self.family}: APS recuperado, circuito cerrado")
+            self.state = CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"[circuit] {self.family}: circuito abierto tras {self.failures} fallos")
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def release_probe(self):
+        """La llamada se interrumpió sin resultado (p. ej. greenlet cancelado): deja pasar otra prueba."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'open_for': round(time.time() - self.opened_at, 1) if self.state != CLOSED else None,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def endpoint_family(url):
+    path = urlparse(url).path.lstrip('/') if '://' in url else url.lstrip('/')
+    for prefix, family in FAMILY_PREFIXES:
+        if path.startswith(prefix):
+            return family
+    return 'other'
+
+
+def breaker_for(family):
+    with _breakers_lock:
+        if family not in _breakers:
+            _breakers[family] = CircuitBreaker(family)
+        return _breakers[family]
+
+
+def is_upstream_failure(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+def guarded_request(method, url, family=None, **kwargs):
+    """
+    requests.request con timeout por defecto y circuit breaker de la familia.
+    Lanza CircuitOpenError (subclase de RequestException) si el circuito está abierto.
+    """
+    breaker = breaker_for(family or endpoint_family(url))
+    breaker.before_call()
+    kwargs.setdefault('timeout', APS_REQUEST_TIMEOUT)
+    try:
+        response = requests.request(method, url, **kwargs)
+    except Exception:
+        # No solo RequestException: un error de decodificación o SSL de un adaptador
+        # también debe contar, o la prueba half-open quedaría pendiente para siempre.
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.release_probe()
+        raise
+    if is_upstream_failure(response.status_code):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def breaker_states():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.family: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,121 @@
+"""
+Compresión de respuestas (brotli/gzip) negociada con Accept-Encoding y
+serializador JSON rápido (orjson) para Flask.
+
+Ambas dependencias son opcionales: sin `brotli` solo se ofrece gzip y sin
+`orjson` se mantiene el proveedor JSON por defecto de Flask.
+"""
+import gzip
+import os
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/vnd.api+json',
+    'application/javascript',
+    'application/xml',
+    'application/vnd.google-earth.kml+xml',
+    'image/svg+xml',
+}
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask respaldado por orjson (mucho más rápido en payloads grandes)."""
+
+    def dumps(self, obj, **kwargs):
+        """
+        Traduce sort_keys/indent a opciones de orjson; con argumentos que orjson no
+        soporta (otra indentación, separators no compactos, cls...) usa el proveedor por defecto.
+        """
+        options = dict(kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if options.pop('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        indent = options.pop('indent', None)
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        elif indent is not None:
+            return super().dumps(obj, **kwargs)
+        if options.pop('separators', (',', ':')) != (',', ':') and not indent:
+            return super().dumps(obj, **kwargs)
+        # orjson siempre escribe UTF-8 sin escapar: es el mismo JSON que con ensure_ascii.
+        options.pop('ensure_ascii', None)
+        default = options.pop('default', self.default)
+        if options:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def _is_compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def choose_encoding(accept_encodings):
+    """Elige 'br' o 'gzip' según Accept-Encoding (respetando q=0)."""
+    if brotli is not None and accept_encodings['br'] > 0:
+        return 'br'
+    if accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """Hook after_request: comprime respuestas grandes si el cliente lo admite."""
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or 'Content-Encoding' in response.headers
+        or not _is_compressible(response)
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag'):
+        # El cuerpo cambió: la ETag fuerte ya no corresponde a estos bytes.
+        etag, _ = response.get_etag()
+        response.set_etag(f'{etag}-{encoding}', weak=True)
+    return response
+
+
+def init_compression(app):
+    """Registra el serializador rápido y la compresión en la app Flask."""
+    if orjson is not None:
+        app.json = ORJSONProvider(app)
+    app.after_request(compress_response)
@@ -0,0 +1,206 @@
+"""
+Caché local (proxy) de derivados de Model Derivative para el visor.
+
+Cada manifest/asset se descarga de APS una sola vez y se guarda en disco
+direccionado por contenido (sha256). Un índice SQLite relaciona la ruta
+solicitada con su hash, tamaño y último acceso; cuando el total supera
+DERIVATIVE_CACHE_MAX_BYTES se expulsan los objetos menos usados (LRU).
+
+Los manifests solo se cachean cuando la traducción terminó (`status: success`);
+mientras está en curso se reenvían sin guardar.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+DERIVATIVE_CACHE_FOLDER = os.getenv(
+    'DERIVATIVE_CACHE_FOLDER',
+    os.path.join(os.path.dirname(__file__), 'cache', 'derivatives')
+)
+DERIVATIVE_CACHE_MAX_BYTES = int(os.getenv('DERIVATIVE_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+UPSTREAM_TIMEOUT = int(os.getenv('DERIVATIVE_PROXY_TIMEOUT', '60'))
+ALLOWED_PREFIXES = ('modelderivative/v2/designdata/', 'derivativeservice/v2/')
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _index():
+    """Conexión al índice SQLite dentro de una transacción; se cierra al salir."""
+    os.makedirs(os.path.join(DERIVATIVE_CACHE_FOLDER, 'objects'), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(DERIVATIVE_CACHE_FOLDER, 'index.sqlite3'), timeout=30)
+    try:
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL,'
+                ' content_type TEXT, fetched_at REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+            yield conn
+    finally:
+        conn.close()
+
+
+def _object_path(digest):
+    return os.path.join(DERIVATIVE_CACHE_FOLDER, 'objects', digest[:2], digest)
+
+
+def _lock_for(key):
+    with _key_locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def is_allowed_path(path):
+    return path.startswith(ALLOWED_PREFIXES) and '..' not in path
+
+
+def lookup(key):
+    """Devuelve la entrada cacheada {digest, size, content_type, path} o None."""
+    with _index() as conn:
+        row = conn.execute(
+            'SELECT digest, size, content_type FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        path = _object_path(row[0])
+        if not os.path.exists(path):
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            return None
+        conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+    return {'digest': row[0], 'size': row[1], 'content_type': row[2], 'path': path}
+
+
+def _store(key, tmp_path, digest, size, content_type):
+    path = _object_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(tmp_path)  # mismo contenido ya almacenado por otra ruta
+    else:
+        os.replace(tmp_path, path)
+    now = time.time()
+    with _index() as conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO entries (key, digest, size, content_type, fetched_at, last_access)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (key, digest, size, content_type, now, now)
+        )
+    enforce_budget(keep=(key,))
+    return {'digest': digest, 'size': size, 'content_type': content_type, 'path': path}
+
+
+def _is_incomplete_manifest(path, tmp_path):
+    if not path.rstrip('/').endswith('/manifest'):
+        return False
+    try:
+        with open(tmp_path, 'rb') as f:
+            return json.load(f).get('status') != 'success'
+    except (OSError, ValueError):
+        return True
+
+
+def fetch(path, query, upstream_base, token):
+    """
+    Devuelve (entrada, error, status). Si no está en caché la descarga de APS
+    escribiendo a disco por trozos mientras calcula el sha256.
+    `entrada['cached']` indica si quedó guardada (los manifests incompletos no).
+    """
+    key = f'{path}?{query}' if query else path
+    entry = lookup(key)
+    if entry:
+        return dict(entry, cached=True, hit=True), None, 200
+
+    with _lock_for(key):
+        entry = lookup(key)  # otro hilo pudo descargarlo mientras esperábamos
+        if entry:
+            return dict(entry, cached=True, hit=True), None, 200
+        url = f'{upstream_base}/{key}'
+        try:
+            resp = requests.get(url, headers={'Authorization': f'Bearer {token}'},
+                                stream=True, timeout=UPSTREAM_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            return None, str(e), 502
+        if resp.status_code != 200:
+            body = resp.text
+            resp.close()
+            return None, body or f'APS respondió {resp.status_code}', resp.status_code
+
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=DERIVATIVE_CACHE_FOLDER, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    if chunk:
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+        except requests.exceptions.RequestException as e:
+            os.remove(tmp_path)
+            return None, str(e), 502
+        finally:
+            resp.close()
+
+        content_type = resp.headers.get('Content-Type') or 'application/octet-stream'
+        digest = hasher.hexdigest()
+        if _is_incomplete_manifest(path, tmp_path):
+            return {'digest': digest, 'size': size, 'content_type': content_type,
+                    'path': tmp_path, 'cached': False, 'hit': False}, None, 200
+        entry = _store(key, tmp_path, digest, size, content_type)
+        return dict(entry, cached=True, hit=False), None, 200
+
+
+def enforce_budget(max_bytes=DERIVATIVE_CACHE_MAX_BYTES, keep=()):
+    """
+    Expulsa entradas por antigüedad de acceso hasta quedar bajo el presupuesto.
+    Las claves de `keep` (p. ej. la que se acaba de guardar) no se expulsan.
+    """
+    with _index() as conn:
+        total = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)'
+        ).fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        evicted = 0
+        for key, digest, size in conn.execute(
+            'SELECT key, digest, size FROM entries ORDER BY last_access ASC'
+        ).fetchall():
+            if total <= max_bytes:
+                break
+            if key in keep:
+                continue
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            still_used = conn.execute(
+                'SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)
+            ).fetchone()
+            if not still_used:
+                try:
+                    os.remove(_object_path(digest))
+                except FileNotFoundError:
+                    pass
+                total -= size
+            evicted += 1
+    if evicted:
+        print(f"[derivative-cache] {evicted} entradas expulsadas por presupuesto")
+    return evicted
+
+
+def stats():
+    with _index() as conn:
+        entries, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()
+        unique = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)'
+        ).fetchone()[0]
+    return {'entries': entries, 'logical_bytes': total, 'stored_bytes': unique,
+            'max_bytes': DERIVATIVE_CACHE_MAX_BYTES}
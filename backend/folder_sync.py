@@ -0,0 +1,156 @@
+"""
+Sincronización incremental (delta) de carpetas ACC.
+
+Para cada carpeta se guarda un listado fusionado y una marca de agua
+(`watermark`) con el mayor `lastModifiedTime` visto. Cada refresco pide a la
+Data API solo los elementos modificados desde esa marca
+(`filter[lastModifiedTime]-ge=`) y los fusiona con el listado.
+
+El listado fusionado vive solo en FOLDER_SYNC. La entrada de `aps.cache` de la
+carpeta guarda siempre la primera página tal cual la devuelve APS (la misma
+forma que escriben get_api_data y el precalentador): una sincronización completa
+la reemplaza por la página recién descargada y una incremental con cambios la
+invalida para que la ruta de contenidos la vuelva a pedir.
+"""
+import threading
+from datetime import datetime, timezone
+
+from aps import fetch_api_data, invalidate_api_data, set_api_data
+
+# (project_id, folder_id) -> estado de sincronización
+FOLDER_SYNC = {}
+_sync_lock = threading.Lock()
+
+
+def contents_endpoint(project_id, folder_id):
+    return f'data/v1/projects/{project_id}/folders/{folder_id}/contents'
+
+
+def parse_time(value):
+    """Convierte un ISO 8601 de APS (hasta 7 decimales, sufijo Z) a datetime UTC."""
+    if not value:
+        return None
+    text = value.strip().replace('Z', '+00:00')
+    if '.' in text:
+        head, _, rest = text.partition('.')
+        digits = ''.join(c for c in rest if c.isdigit())
+        tz = rest[len(digits):]
+        text = f'{head}.{digits[:6].ljust(6, "0")}{tz}'
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def format_time(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.') + f'{value.microsecond // 1000:03d}Z'
+
+
+def _modified_at(resource):
+    return parse_time((resource.get('attributes') or {}).get('lastModifiedTime'))
+
+
+def _fetch_all_pages(endpoint, token, params=None):
+    """
+    Descarga todas las páginas (`links.next`) de un listado JSON:API.
+    Devuelve (data, included, primera página tal cual, error).
+    """
+    data, included = [], []
+    page, error = fetch_api_data(endpoint, token, params=params)
+    first_page = page
+    while page is not None:
+        data.extend(page.get('data') or [])
+        included.extend(page.get('included') or [])
+        next_href = ((page.get('links') or {}).get('next') or {}).get('href')
+        if not next_href:
+            break
+        page, error = fetch_api_data(next_href, token)
+    if error:
+        return None, None, None, error
+    return data, included, first_page, None
+
+
+def _merge(state, data, included):
+    """Fusiona recursos nuevos/modificados en el estado. Devuelve los ids que cambiaron de verdad."""
+    changed = []
+    for resource in data:
+        resource_id = resource.get('id')
+        if not resource_id:
+            continue
+        if (resource.get('attributes') or {}).get('hidden'):
+            # Los elementos eliminados en ACC aparecen como ocultos.
+            if state['entries'].pop(resource_id, None) is not None:
+                state['deleted'][resource_id] = _modified_at(resource) or datetime.now(timezone.utc)
+            continue
+        # El filtro -ge vuelve a traer el elemento de la marca de agua: solo cuenta si difiere.
+        if state['entries'].get(resource_id) != resource:
+            changed.append(resource_id)
+        state['entries'][resource_id] = resource
+        state['deleted'].pop(resource_id, None)
+        modified = _modified_at(resource)
+        if modified and (state['watermark'] is None or modified > state['watermark']):
+            state['watermark'] = modified
+    for resource in included:
+        if resource.get('id'):
+            state['included'][resource['id']] = resource
+    return changed
+
+
+def sync_folder(project_id, folder_id, token):
+    """Trae solo los cambios desde la última marca de agua y actualiza la caché."""
+    key = (project_id, folder_id)
+    endpoint = contents_endpoint(project_id, folder_id)
+    with _sync_lock:
+        state = FOLDER_SYNC.get(key)
+        watermark = state['watermark'] if state else None
+
+    if watermark is None:
+        data, included, first_page, error = _fetch_all_pages(endpoint, token)
+    else:
+        data, included, _, error = _fetch_all_pages(endpoint, token, params={
+            'filter[lastModifiedTime]-ge': format_time(watermark),
+            'includeHidden': 'true',
+        })
+    if error:
+        return None, error
+
+    with _sync_lock:
+        state = FOLDER_SYNC.get(key)
+        if state is None or watermark is None:
+            state = {'watermark': None, 'entries': {}, 'included': {}, 'deleted': {}}
+            FOLDER_SYNC[key] = state
+        deleted_before = len(state['deleted'])
+        changed = _merge(state, data, included)
+        state['synced_at'] = datetime.now(timezone.utc)
+        deleted = len(state['deleted']) != deleted_before
+    if watermark is None:
+        set_api_data(endpoint, first_page)
+    elif changed or deleted:
+        invalidate_api_data(endpoint)
+    print(f"[folder-sync] {folder_id}: {len(data)} recibidos, {len(changed)} cambios")
+    return state, None
+
+
+def changes_since(state, since):
+    """Construye la respuesta de /changes: recursos modificados y eliminados desde `since`."""
+    with _sync_lock:
+        if since is None:
+            changed = list(state['entries'].values())
+            deleted = []
+        else:
+            changed = [
+                resource for resource in state['entries'].values()
+                if (_modified_at(resource) or since) > since
+            ]
+            deleted = [resource_id for resource_id, when in state['deleted'].items() if when > since]
+        watermark = state['watermark']
+    return {
+        'since': format_time(since) if since else None,
+        'watermark': format_time(watermark) if watermark else None,
+        'full': since is None,
+        'data': changed,
+        'deleted': deleted,
+    }
@@ -0,0 +1,32 @@
+"""
+Configuración de gunicorn (se carga automáticamente desde este directorio).
+
+Casi todas las rutas esperan a APS (token, Data Management, OSS, manifest),
+así que el modo recomendado es cooperativo con gevent:
+
+    GUNICORN_WORKER_CLASS=gevent gunicorn server:app
+
+Con workers sync la concurrencia queda limitada a WEB_CONCURRENCY; con gevent
+cada worker atiende hasta GUNICORN_WORKER_CONNECTIONS peticiones a la vez.
+El estado compartido (MAP_JOBS, aps.cache, tokens) está protegido con locks
+de threading, que gevent convierte en locks cooperativos: el worker gevent
+parchea la stdlib él mismo al arrancar, antes de importar la app.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '3000')}")
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '1'))  # solo aplica a worker_class=gthread
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # El precalentador y el recolector no arrancan al importar server: se lanzan
+    # aquí. El precalentador corre en cada worker (la caché es por proceso); el
+    # recolector solo en el que obtenga el lock de archivo.
+    import server
+    server.start_background_workers()
@@ -0,0 +1,87 @@
+"""
+Proyección de campos (sparse fieldsets) para documentos JSON:API de APS.
+
+Los endpoints de Data Management devuelven documentos con `included`, `links`
+y bloques `extension` que el frontend casi nunca usa. Con `?fields=` el cliente
+pide solo los atributos que necesita y el documento recortado se cachea aparte.
+
+Formatos aceptados en el query string:
+    fields=displayName,lastModifiedTime          -> aplica a todos los tipos
+    fields[items]=displayName&fields[versions]=versionNumber
+Nombres especiales: `links` conserva los links del recurso y cualquier nombre
+que coincida con una relación (p. ej. `tip`, `storage`) conserva su `data`.
+"""
+
+WILDCARD = '*'
+TOP_LEVEL_KEYS = ('data', 'included', 'meta')
+
+
+def parse_fields(args):
+    """Lee `fields` / `fields[tipo]` de request.args. Devuelve dict tipo -> set o None."""
+    fields = {}
+    for key in args.keys():
+        if key == 'fields':
+            resource_type = WILDCARD
+        elif key.startswith('fields[') and key.endswith(']'):
+            resource_type = key[len('fields['):-1].strip()
+        else:
+            continue
+        if not resource_type:
+            continue
+        names = set()
+        for value in args.getlist(key):
+            names.update(name.strip() for name in value.split(',') if name.strip())
+        if names:
+            fields.setdefault(resource_type, set()).update(names)
+    return fields or None
+
+
+def fields_cache_key(fields):
+    """Representación canónica de la proyección para usarla como clave de caché."""
+    parts = []
+    for resource_type in sorted(fields):
+        parts.append(f"{resource_type}={','.join(sorted(fields[resource_type]))}")
+    return 'fields:' + ';'.join(parts)
+
+
+def _project_resource(resource, fields):
+    if not isinstance(resource, dict):
+        return resource
+    names = fields.get(resource.get('type'))
+    if names is None:
+        names = fields.get(WILDCARD)
+    if names is None:
+        return resource
+
+    projected = {'type': resource.get('type'), 'id': resource.get('id')}
+    attributes = resource.get('attributes') or {}
+    projected['attributes'] = {name: attributes[name] for name in names if name in attributes}
+    relationships = resource.get('relationships') or {}
+    kept = {
+        name: {'data': rel.get('data')}
+        for name, rel in relationships.items()
+        if name in names and isinstance(rel, dict)
+    }
+    if kept:
+        projected['relationships'] = kept
+    if 'links' in names and 'links' in resource:
+        projected['links'] = resource['links']
+    return projected
+
+
+def project_document(document, fields):
+    """Devuelve una copia del documento con solo los campos pedidos."""
+    if not isinstance(document, dict) or not fields:
+        return document
+    projected = {}
+    for key in TOP_LEVEL_KEYS:
+        if key not in document:
+            continue
+        value = document[key]
+        if key == 'meta':
+            projected[key] = value
+        elif isinstance(value, list):
+            projected[key] = [_project_resource(entry, fields) for entry in value]
+        else:
+            projected[key] = _project_resource(value, fields)
+    return projected
@@ -0,0 +1,148 @@
+"""
+Caché en memoria con presupuesto en bytes y expulsión LRU real.
+
+Cada valor se guarda serializado (pickle, como SimpleCache) y, si supera
+APS_CACHE_COMPRESS_MIN_BYTES, comprimido con zlib, así que lo que cuenta
+para el presupuesto es su tamaño real en memoria y no el número de entradas.
+Al pasarse de APS_CACHE_MAX_BYTES se descartan primero las entradas
+vencidas y luego las menos usadas recientemente. Las estadísticas se agrupan
+por familia de clave (ver `key_group` en aps.py).
+"""
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from cachelib import BaseCache
+
+APS_CACHE_MAX_BYTES = int(os.getenv('APS_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+APS_CACHE_COMPRESS_MIN_BYTES = int(os.getenv('APS_CACHE_COMPRESS_MIN_BYTES', '4096'))
+COMPRESS_LEVEL = 6
+
+
+class ByteLRUCache(BaseCache):
+    """BaseCache de cachelib con límite en bytes, LRU y estadísticas por grupo de clave."""
+
+    def __init__(self, max_bytes=APS_CACHE_MAX_BYTES, compress_min_bytes=APS_CACHE_COMPRESS_MIN_BYTES,
+                 default_timeout=300, key_group=None):
+        super().__init__(default_timeout)
+        self.max_bytes = max_bytes
+        self.compress_min_bytes = compress_min_bytes
+        self.key_group = key_group or (lambda key: key)
+        # key -> (expires, payload, compressed, raw_size); el final es lo más reciente
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._counters = {}
+        self._lock = threading.RLock()
+
+    def _count(self, key, name):
+        counters = self._counters.setdefault(self.key_group(key), {'hits': 0, 'misses': 0, 'evictions': 0})
+        counters[name] += 1
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    @staticmethod
+    def _expired(entry, now):
+        return entry[0] != 0 and entry[0] <= now
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+        return entry
+
+    def _make_room(self, needed):
+        now = time.time()
+        if self._bytes + needed > self.max_bytes:
+            for key in [k for k, entry in self._entries.items() if self._expired(entry, now)]:
+                self._remove(key)
+        while self._entries and self._bytes + needed > self.max_bytes:
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= len(entry[1])
+            self._count(key, 'evictions')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, time.time()):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._count(key, 'misses')
+                return None
+            self._entries.move_to_end(key)
+            self._count(key, 'hits')
+        payload = zlib.decompress(entry[1]) if entry[2] else entry[1]
+        return pickle.loads(payload)
+
+    def set(self, key, value, timeout=None):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        raw_size = len(payload)
+        compressed = raw_size >= self.compress_min_bytes
+        if compressed:
+            payload = zlib.compress(payload, COMPRESS_LEVEL)
+        if len(payload) > self.max_bytes:
+            with self._lock:
+                self._remove(key)
+            return False
+        entry = (self._expires(timeout), payload, compressed, raw_size)
+        with self._lock:
+            self._remove(key)
+            self._make_room(len(payload))
+            self._entries[key] = entry
+            self._bytes += len(payload)
+        return True
+
+    def add(self, key, value, timeout=None):
+        with self._lock:
+            if self.has(key):
+                return False
+            return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key) is not None
+
+    def has(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry, time.time())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        return True
+
+    def stats(self):
+        """Uso total y, por grupo de clave: entradas, bytes guardados/sin comprimir y aciertos."""
+        now = time.time()
+        with self._lock:
+            groups = {}
+            for key, entry in self._entries.items():
+                if self._expired(entry, now):
+                    continue
+                group = groups.setdefault(self.key_group(key), {'entries': 0, 'bytes': 0, 'raw_bytes': 0})
+                group['entries'] += 1
+                group['bytes'] += len(entry[1])
+                group['raw_bytes'] += entry[3]
+            for name, counters in self._counters.items():
+                groups.setdefault(name, {'entries': 0, 'bytes': 0, 'raw_bytes': 0}).update(counters)
+            total_entries = len(self._entries)
+            total_bytes = self._bytes
+        for group in groups.values():
+            group.setdefault('hits', 0)
+            group.setdefault('misses', 0)
+            group.setdefault('evictions', 0)
+            lookups = group['hits'] + group['misses']
+            group['hit_ratio'] = round(group['hits'] / lookups, 3) if lookups else None
+        return {
+            'max_bytes': self.max_bytes,
+            'bytes': total_bytes,
+            'entries': total_entries,
+            'groups': dict(sorted(groups.items(), key=lambda item: -item[1]['bytes'])),
+        }
@@ -0,0 +1,367 @@
+"""
+Configuraciones de phasing (Gantt) por modelo, guardadas en el servidor.
+
+Cada configuración (URN del modelo + nombre, p. ej. "Semana 12 2026") guarda
+las tareas y, por tarea, el conjunto de dbIds asociados. Los dbIds de una
+tarea suelen ser rangos casi contiguos, así que se guardan como runs
+(inicio, longitud): en SQLite como varints comprimidos con zlib y hacia el
+cliente como una lista plana [hueco, longitud, hueco, longitud, ...] donde
+`hueco` es la distancia desde el final del run anterior. Las operaciones de
+conjuntos (unión, intersección, diferencia y los elementos visibles en una
+fecha) se hacen sobre runs, sin expandir los ids.
+"""
+import json
+import math
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from folder_sync import parse_time
+
+PHASING_DB_PATH = os.getenv(
+    'PHASING_DB_PATH',
+    os.path.join(os.path.dirname(__file__), 'uploads', 'phasing.sqlite3')
+)
+# Mismos estados (y colores en el cliente) que checkTaskStatus de PhasingExtension.js.
+STATUSES = ('finished', 'inProgress', 'late', 'advanced', 'notYetStarted')
+
+
+class PhasingError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@contextmanager
+def _db():
+    """Conexión SQLite dentro de una transacción; se cierra al salir."""
+    os.makedirs(os.path.dirname(PHASING_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(PHASING_DB_PATH, timeout=30)
+    try:
+        with conn:
+            conn.executescript(
+                'CREATE TABLE IF NOT EXISTS configs ('
+                ' urn TEXT NOT NULL, name TEXT NOT NULL, tasks TEXT NOT NULL, prop_mappings TEXT,'
+                ' updated REAL NOT NULL, PRIMARY KEY (urn, name));'
+                'CREATE TABLE IF NOT EXISTS task_sets ('
+                ' urn TEXT NOT NULL, name TEXT NOT NULL, task_id TEXT NOT NULL,'
+                ' runs BLOB NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (urn, name, task_id));'
+            )
+            yield conn
+    finally:
+        conn.close()
+
+
+# --- Codificación de conjuntos de dbIds ---------------------------------------
+
+def _check_non_negative_ints(values, message):
+    """Rechaza floats, booleanos, cadenas y negativos en lugar de convertirlos con int()."""
+    for value in values:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise PhasingError(message)
+
+
+def to_runs(dbids):
+    """dbIds (en cualquier orden, con repetidos) -> [(inicio, longitud)] ordenados."""
+    _check_non_negative_ints(dbids, 'Los dbIds deben ser enteros mayores o iguales que 0.')
+    runs = []
+    for dbid in sorted(set(dbids)):
+        if runs and runs[-1][0] + runs[-1][1] == dbid:
+            runs[-1][1] += 1
+        else:
+            runs.append([dbid, 1])
+    return [tuple(run) for run in runs]
+
+
+def runs_to_list(runs):
+    """Expande los runs a la lista de dbIds."""
+    return [dbid for start, length in runs for dbid in range(start, start + length)]
+
+
+def runs_count(runs):
+    return sum(length for _, length in runs)
+
+
+def encode_runs(runs):
+    """Runs -> lista plana [hueco, longitud, ...] (el formato que viaja en JSON)."""
+    flat = []
+    previous_end = 0
+    for start, length in runs:
+        flat.extend((start - previous_end, length))
+        previous_end = start + length
+    return flat
+
+
+def decode_runs(flat):
+    """Inversa de encode_runs; valida que la lista sea coherente."""
+    if not isinstance(flat, list):
+        raise PhasingError('runs debe ser una lista.')
+    if len(flat) % 2:
+        raise PhasingError('La lista de runs debe tener un número par de elementos.')
+    _check_non_negative_ints(flat, 'Los runs deben ser enteros mayores o iguales que 0.')
+    runs = []
+    previous_end = 0
+    for i in range(0, len(flat), 2):
+        gap, length = flat[i], flat[i + 1]
+        if gap < 0 or length <= 0 or (runs and gap == 0):
+            raise PhasingError('Runs de dbIds no válidos.')
+        start = previous_end + gap
+        runs.append((start, length))
+        previous_end = start + length
+    return runs
+
+
+def _pack(runs):
+    out = bytearray()
+    for value in encode_runs(runs):
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return zlib.compress(bytes(out))
+
+
+def _unpack(blob):
+    flat, value, shift = [], 0, 0
+    for byte in zlib.decompress(blob):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            flat.append(value)
+            value, shift = 0, 0
+    return decode_runs(flat)
+
+
+def union_runs(*run_lists):
+    merged = []
+    for start, length in sorted(run for runs in run_lists for run in runs):
+        end = start + length
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end - start) for start, end in merged]
+
+
+def intersect_runs(a, b):
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][0] + a[i][1], b[j][0] + b[j][1])
+        if start < end:
+            result.append((start, end - start))
+        if a[i][0] + a[i][1] < b[j][0] + b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def subtract_runs(a, b):
+    result = []
+    j = 0
+    for start, length in a:
+        end = start + length
+        while j < len(b) and b[j][0] + b[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] < end:
+            if b[k][0] > start:
+                result.append((start, b[k][0] - start))
+            start = max(start, b[k][0] + b[k][1])
+            k += 1
+        if start < end:
+            result.append((start, end - start))
+    return result
+
+
+def encoded_set(runs):
+    return {'runs': encode_runs(runs), 'count': runs_count(runs)}
+
+
+def _runs_from_payload(value):
+    """Acepta {runs: [...]} (codificado) o una lista simple de dbIds."""
+    if isinstance(value, dict):
+        return decode_runs(value.get('runs') or [])
+    if isinstance(value, list):
+        return to_runs(value)
+    raise PhasingError('Cada conjunto debe ser una lista de dbIds o {runs: [...]}.')
+
+
+# --- Estado de tareas ----------------------------------------------------------
+
+def task_progress(task):
+    """Avance 0-100 de una tarea; acepta números o texto numérico ('45', '45.5')."""
+    value = task.get('progress') or 0
+    if isinstance(value, bool):
+        raise PhasingError('El progress de las tareas debe ser un número.')
+    try:
+        progress = float(value)
+    except (TypeError, ValueError):
+        raise PhasingError('El progress de las tareas debe ser un número.')
+    if not math.isfinite(progress):
+        raise PhasingError('El progress de las tareas debe ser un número.')
+    return progress
+
+
+def task_status(task, reference):
+    """Port de checkTaskStatus (PhasingExtension.js)."""
+    start = parse_time(task.get('start'))
+    end = parse_time(task.get('end'))
+    if start is None or end is None:
+        return None
+    progress = task_progress(task)
+    started = reference >= start
+    finished = reference >= end
+    if started and finished and progress == 100:
+        return 'finished'
+    if not started and progress > 0:
+        return 'advanced'
+    if not started and progress == 0:
+        return 'notYetStarted'
+    if started and not finished:
+        if progress == 0:
+            return 'late'
+        if progress == 100:
+            return 'advanced'
+        return 'inProgress'
+    if started and finished and progress < 100:
+        return 'late'
+    return 'inProgress'
+
+
+# --- Almacén -------------------------------------------------------------------
+
+def save_config(urn, name, tasks, objects, prop_mappings=None):
+    """Guarda (reemplaza) una configuración. `objects`: {task_id: [dbIds] | {runs}}."""
+    if not urn or not name:
+        raise PhasingError('urn y name son obligatorios.')
+    if not isinstance(tasks, list) or not isinstance(objects, dict):
+        raise PhasingError('tasks debe ser una lista y objects un objeto.')
+    for task in tasks:
+        if not isinstance(task, dict):
+            raise PhasingError('Cada tarea debe ser un objeto.')
+        task_progress(task)
+    sets = {str(task_id): _runs_from_payload(value) for task_id, value in objects.items()}
+    with _db() as conn:
+        conn.execute('DELETE FROM task_sets WHERE urn = ? AND name = ?', (urn, name))
+        conn.execute(
+            'INSERT OR REPLACE INTO configs (urn, name, tasks, prop_mappings, updated) VALUES (?, ?, ?, ?, ?)',
+            (urn, name, json.dumps(tasks, ensure_ascii=False),
+             json.dumps(prop_mappings) if prop_mappings else None, time.time())
+        )
+        conn.executemany(
+            'INSERT INTO task_sets (urn, name, task_id, runs, count) VALUES (?, ?, ?, ?, ?)',
+            [(urn, name, task_id, _pack(runs), runs_count(runs)) for task_id, runs in sets.items()]
+        )
+    return {'name': name, 'tasks': len(tasks), 'dbids': sum(runs_count(runs) for runs in sets.values())}
+
+
+def list_configs(urn):
+    with _db() as conn:
+        rows = conn.execute(
+            'SELECT c.name, c.updated, COUNT(s.task_id), COALESCE(SUM(s.count), 0) FROM configs c'
+            ' LEFT JOIN task_sets s ON s.urn = c.urn AND s.name = c.name'
+            ' WHERE c.urn = ? GROUP BY c.name ORDER BY c.updated DESC',
+            (urn,)
+        ).fetchall()
+    return [
+        {
+            'name': name,
+            'updated': datetime.fromtimestamp(updated, timezone.utc).isoformat().replace('+00:00', 'Z'),
+            'task_sets': task_sets,
+            'dbids': dbids,
+        }
+        for name, updated, task_sets, dbids in rows
+    ]
+
+
+def _task_sets(conn, urn, name):
+    return {
+        task_id: _unpack(blob)
+        for task_id, blob in conn.execute(
+            'SELECT task_id, runs FROM task_sets WHERE urn = ? AND name = ?', (urn, name)
+        )
+    }
+
+
+def load_config(urn, name):
+    """Configuración con los conjuntos codificados como runs, o None."""
+    with _db() as conn:
+        row = conn.execute('SELECT tasks, prop_mappings, updated FROM configs WHERE urn = ? AND name = ?',
+                           (urn, name)).fetchone()
+        if row is None:
+            return None
+        sets = _task_sets(conn, urn, name)
+    tasks, prop_mappings, updated = row
+    return {
+        'name': name,
+        'tasks': json.loads(tasks),
+        'propMappings': json.loads(prop_mappings) if prop_mappings else None,
+        'updated': datetime.fromtimestamp(updated, timezone.utc).isoformat().replace('+00:00', 'Z'),
+        'objects': {task_id: encoded_set(runs) for task_id, runs in sets.items()},
+    }
+
+
+def delete_config(urn, name):
+    with _db() as conn:
+        conn.execute('DELETE FROM task_sets WHERE urn = ? AND name = ?', (urn, name))
+        return conn.execute('DELETE FROM configs WHERE urn = ? AND name = ?', (urn, name)).rowcount > 0
+
+
+def _load_sets(urn, name):
+    with _db() as conn:
+        if conn.execute('SELECT 1 FROM configs WHERE urn = ? AND name = ?', (urn, name)).fetchone() is None:
+            raise PhasingError('Configuración no encontrada.', 404)
+        tasks = json.loads(conn.execute('SELECT tasks FROM configs WHERE urn = ? AND name = ?',
+                                        (urn, name)).fetchone()[0])
+        return tasks, _task_sets(conn, urn, name)
+
+
+def visible_at(urn, name, reference):
+    """
+    Elementos por estado en la fecha `reference` (unión de los dbIds de las tareas
+    en cada estado) y `visible`: todo menos lo que aún no ha empezado.
+    """
+    tasks, sets = _load_sets(urn, name)
+    by_status = {status: [] for status in STATUSES}
+    for task in tasks:
+        status = task_status(task, reference)
+        runs = sets.get(str(task.get('id')))
+        if status and runs:
+            by_status[status].append(runs)
+    unions = {status: union_runs(*run_lists) for status, run_lists in by_status.items()}
+    visible = union_runs(*(runs for status, runs in unions.items() if status != 'notYetStarted'))
+    return {
+        'date': reference.isoformat().replace('+00:00', 'Z'),
+        'statuses': {status: encoded_set(runs) for status, runs in unions.items()},
+        'visible': encoded_set(visible),
+    }
+
+
+def set_operation(urn, name, op, task_ids, extra_sets=()):
+    """union / intersection / difference (el primero menos el resto) de conjuntos de tareas."""
+    if op not in ('union', 'intersection', 'difference'):
+        raise PhasingError('op debe ser union, intersection o difference.')
+    _, sets = _load_sets(urn, name)
+    operands = []
+    for task_id in task_ids:
+        if str(task_id) not in sets:
+            raise PhasingError(f'Tarea no encontrada: {task_id}', 404)
+        operands.append(sets[str(task_id)])
+    operands.extend(_runs_from_payload(value) for value in extra_sets)
+    if not operands:
+        raise PhasingError('Indica al menos una tarea o conjunto.')
+    if op == 'union':
+        result = union_runs(*operands)
+    else:
+        result = operands[0]
+        for other in operands[1:]:
+            result = intersect_runs(result, other) if op == 'intersection' else subtract_runs(result, other)
+    return encoded_set(result)
@@ -0,0 +1,294 @@
+"""
+Índice persistente de placemarks para las capas KML/KMZ subidas.
+
+Cada archivo se parsea una sola vez (iterparse, en streaming) y sus
+placemarks se guardan en SQLite: nombre, atributos (ExtendedData), geometría
+GeoJSON y bbox. Un índice FTS5 sobre nombre y atributos permite buscar sin
+que el cliente descargue ni parsee la capa completa. Si el archivo cambia
+(mtime distinto) se reindexa.
+"""
+import json
+import os
+import sqlite3
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+
+PLACEMARK_INDEX_PATH = os.getenv(
+    'PLACEMARK_INDEX_PATH',
+    os.path.join(os.path.dirname(__file__), 'cache', 'placemarks.sqlite3')
+)
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+INSERT_BATCH_SIZE = 1000
+
+_build_lock = threading.Lock()
+
+
+@contextmanager
+def _index():
+    """Conexión al índice SQLite dentro de una transacción; se cierra al salir."""
+    os.makedirs(os.path.dirname(PLACEMARK_INDEX_PATH), exist_ok=True)
+    conn = sqlite3.connect(PLACEMARK_INDEX_PATH, timeout=30)
+    try:
+        with conn:
+            conn.executescript(
+                'CREATE TABLE IF NOT EXISTS layers ('
+                ' layer TEXT PRIMARY KEY, mtime REAL NOT NULL, feature_count INTEGER NOT NULL);'
+                'CREATE TABLE IF NOT EXISTS features ('
+                ' id INTEGER PRIMARY KEY, layer TEXT NOT NULL, name TEXT, attributes TEXT,'
+                ' geometry TEXT, minx REAL, miny REAL, maxx REAL, maxy REAL);'
+                'CREATE INDEX IF NOT EXISTS features_layer ON features (layer);'
+                'CREATE INDEX IF NOT EXISTS features_bbox ON features (minx, maxx, miny, maxy);'
+                'CREATE VIRTUAL TABLE IF NOT EXISTS features_fts USING fts5(name, attributes);'
+            )
+            yield conn
+    finally:
+        conn.close()
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_coordinates(text):
+    coords = []
+    for chunk in (text or '').split():
+        parts = chunk.split(',')
+        try:
+            coords.append([float(parts[0]), float(parts[1])])
+        except (IndexError, ValueError):
+            continue
+    return coords
+
+
+def _geometry(elem):
+    """Convierte una geometría KML a GeoJSON (solo lon/lat)."""
+    kind = _local(elem.tag)
+    if kind == 'Point':
+        coords = _parse_coordinates(_find_text(elem, 'coordinates'))
+        return {'type': 'Point', 'coordinates': coords[0]} if coords else None
+    if kind == 'LineString':
+        return {'type': 'LineString', 'coordinates': _parse_coordinates(_find_text(elem, 'coordinates'))}
+    if kind == 'Polygon':
+        rings = []
+        for boundary in elem:
+            if _local(boundary.tag) in ('outerBoundaryIs', 'innerBoundaryIs'):
+                ring = _parse_coordinates(_find_text(boundary, 'coordinates'))
+                if _local(boundary.tag) == 'outerBoundaryIs':
+                    rings.insert(0, ring)
+                else:
+                    rings.append(ring)
+        return {'type': 'Polygon', 'coordinates': rings}
+    if kind == 'MultiGeometry':
+        parts = [_geometry(child) for child in elem]
+        return {'type': 'GeometryCollection', 'geometries': [g for g in parts if g]}
+    return None
+
+
+def _find_text(elem, name):
+    for child in elem.iter():
+        if _local(child.tag) == name:
+            return child.text
+    return None
+
+
+def _bbox(geometry):
+    xs, ys = [], []
+
+    def walk(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            xs.append(coords[0])
+            ys.append(coords[1])
+        else:
+            for c in coords:
+                walk(c)
+
+    if geometry['type'] == 'GeometryCollection':
+        for part in geometry['geometries']:
+            box = _bbox(part)
+            if box:
+                xs.extend((box[0], box[2]))
+                ys.extend((box[1], box[3]))
+    else:
+        walk(geometry.get('coordinates') or [])
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _placemark(elem):
+    name = None
+    attributes = {}
+    geometry = None
+    for child in elem:
+        tag = _local(child.tag)
+        if tag == 'name':
+            name = (child.text or '').strip()
+        elif tag == 'description' and child.text:
+            attributes['description'] = child.text.strip()
+        elif tag == 'ExtendedData':
+            for data in child.iter():
+                data_tag = _local(data.tag)
+                if data_tag == 'Data' and data.get('name'):
+                    attributes[data.get('name')] = (_find_text(data, 'value') or '').strip()
+                elif data_tag == 'SimpleData' and data.get('name'):
+                    attributes[data.get('name')] = (data.text or '').strip()
+        elif geometry is None:
+            geometry = _geometry(child)
+    return name, attributes, geometry
+
+
+def _open_kml(path):
+    """Devuelve un stream con el KML (para KMZ, doc.kml o el primer .kml del zip)."""
+    if path.lower().endswith('.kmz'):
+        archive = zipfile.ZipFile(path)
+        names = [n for n in archive.namelist() if n.lower().endswith('.kml')]
+        if not names:
+            archive.close()
+            raise ValueError('El KMZ no contiene ningún KML.')
+        inner = 'doc.kml' if 'doc.kml' in names else names[0]
+        return archive.open(inner)
+    return open(path, 'rb')
+
+
+def iter_placemarks(path):
+    with _open_kml(path) as stream:
+        for _, elem in ET.iterparse(stream, events=('end',)):
+            if _local(elem.tag) != 'Placemark':
+                continue
+            yield _placemark(elem)
+            elem.clear()
+
+
+def build_layer_index(path):
+    """(Re)indexa un archivo KML/KMZ. Devuelve el número de placemarks."""
+    layer = os.path.basename(path)
+    mtime = os.path.getmtime(path)
+    rows = []
+    count = 0
+    with _build_lock, _index() as conn:
+        conn.execute('DELETE FROM features_fts WHERE rowid IN (SELECT id FROM features WHERE layer = ?)', (layer,))
+        conn.execute('DELETE FROM features WHERE layer = ?', (layer,))
+        for name, attributes, geometry in iter_placemarks(path):
+            box = _bbox(geometry) if geometry else None
+            rows.append((
+                layer, name, json.dumps(attributes, ensure_ascii=False),
+                json.dumps(geometry) if geometry else None,
+                *(box or (None, None, None, None))
+            ))
+            count += 1
+            if len(rows) >= INSERT_BATCH_SIZE:
+                _insert(conn, rows)
+                rows = []
+        _insert(conn, rows)
+        conn.execute('INSERT OR REPLACE INTO layers (layer, mtime, feature_count) VALUES (?, ?, ?)',
+                     (layer, mtime, count))
+    print(f"[placemarks] {layer}: {count} placemarks indexados")
+    return count
+
+
+def _insert(conn, rows):
+    for row in rows:
+        cursor = conn.execute(
+            'INSERT INTO features (layer, name, attributes, geometry, minx, miny, maxx, maxy)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row
+        )
+        # El texto de atributos se indexa como "clave valor" para buscar por ambos.
+        attributes = ' '.join(f'{k} {v}' for k, v in json.loads(row[2]).items())
+        conn.execute('INSERT INTO features_fts (rowid, name, attributes) VALUES (?, ?, ?)',
+                     (cursor.lastrowid, row[1], attributes))
+
+
+def ensure_layer_index(path):
+    """Indexa la capa si no está indexada o si el archivo cambió desde entonces."""
+    layer = os.path.basename(path)
+    with _index() as conn:
+        row = conn.execute('SELECT mtime FROM layers WHERE layer = ?', (layer,)).fetchone()
+    if row is None or row[0] != os.path.getmtime(path):
+        build_layer_index(path)
+
+
+def remove_layer(layer):
+    """Quita del índice los placemarks de una capa (p. ej. cuando se borra el archivo)."""
+    with _build_lock, _index() as conn:
+        conn.execute('DELETE FROM features_fts WHERE rowid IN (SELECT id FROM features WHERE layer = ?)', (layer,))
+        conn.execute('DELETE FROM features WHERE layer = ?', (layer,))
+        conn.execute('DELETE FROM layers WHERE layer = ?', (layer,))
+
+
+def build_layer_index_async(path):
+    def run():
+        try:
+            build_layer_index(path)
+        except Exception as e:
+            print(f"[placemarks] No se pudo indexar {path}: {e}")
+    threading.Thread(target=run, name='placemark-index', daemon=True).start()
+
+
+def _fts_query(text):
+    """Cada palabra como prefijo entre comillas (AND implícito); evita la sintaxis FTS del usuario."""
+    tokens = [t for t in text.split() if t]
+    return ' '.join('"' + t.replace('"', '""') + '"*' for t in tokens)
+
+
+def _feature_summary(row):
+    feature_id, layer, name, attributes, minx, miny, maxx, maxy = row
+    return {
+        'id': feature_id,
+        'layer': layer,
+        'name': name,
+        'attributes': json.loads(attributes or '{}'),
+        'bbox': [minx, miny, maxx, maxy] if minx is not None else None,
+    }
+
+
+def search_features(query=None, layer=None, bbox=None, limit=DEFAULT_SEARCH_LIMIT):
+    """Busca placemarks por texto, capa y/o intersección con bbox (sin geometría)."""
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    clauses, params = [], []
+    sql = 'SELECT f.id, f.layer, f.name, f.attributes, f.minx, f.miny, f.maxx, f.maxy FROM features f'
+    if query and _fts_query(query):
+        sql += ' JOIN features_fts ON features_fts.rowid = f.id'
+        clauses.append('features_fts MATCH ?')
+        params.append(_fts_query(query))
+    if layer:
+        clauses.append('f.layer = ?')
+        params.append(layer)
+    if bbox:
+        minx, miny, maxx, maxy = bbox
+        clauses.append('f.maxx >= ? AND f.minx <= ? AND f.maxy >= ? AND f.miny <= ?')
+        params.extend((minx, maxx, miny, maxy))
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY ' + ('features_fts.rank' if query and _fts_query(query) else 'f.id') + ' LIMIT ?'
+    params.append(limit)
+    with _index() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [_feature_summary(row) for row in rows]
+
+
+def get_feature(feature_id):
+    """Devuelve un placemark como Feature GeoJSON, o None."""
+    with _index() as conn:
+        row = conn.execute(
+            'SELECT id, layer, name, attributes, minx, miny, maxx, maxy, geometry FROM features WHERE id = ?',
+            (feature_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    summary = _feature_summary(row[:8])
+    return {
+        'type': 'Feature',
+        'id': summary['id'],
+        'bbox': summary['bbox'],
+        'geometry': json.loads(row[8]) if row[8] else None,
+        'properties': dict(summary['attributes'], name=summary['name'], layer=summary['layer']),
+    }
+
+
+def list_layers():
+    with _index() as conn:
+        rows = conn.execute('SELECT layer, feature_count FROM layers ORDER BY layer').fetchall()
+    return [{'layer': layer, 'feature_count': count} for layer, count in rows]
@@ -0,0 +1,74 @@
+"""
+Lock de archivo entre procesos para tareas que deben correr una sola vez por
+máquina (precalentador, recolector de subidas) aunque gunicorn arranque varios
+workers. El lock lo libera el sistema operativo cuando muere el proceso.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+_held = {}
+LOCK_POLL_SECONDS = 0.05
+
+
+def _open(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+
+def _lock_nb(fd):
+    """Lock exclusivo sin bloquear; OSError si lo tiene otro proceso."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def try_acquire(path):
+    """Intenta tomar el lock sin bloquear; si lo consigue, se mantiene mientras viva el proceso."""
+    if path in _held:
+        return True
+    fd = _open(path)
+    try:
+        _lock_nb(fd)
+    except OSError:
+        os.close(fd)
+        return False
+    _held[path] = fd
+    return True
+
+
+@contextmanager
+def locked(path):
+    """
+    Lock exclusivo entre procesos mientras dura el bloque `with`. Se espera con
+    sondeo y time.sleep en vez de un flock bloqueante para no congelar el bucle
+    de eventos de un worker gevent mientras otro proceso tiene el lock.
+    """
+    fd = _open(path)
+    try:
+        while True:
+            try:
+                _lock_nb(fd)
+                break
+            except OSError:
+                time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
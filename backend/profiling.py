@@ -0,0 +1,208 @@
+"""
+Perfilado bajo demanda de peticiones individuales.
+
+Una petición se perfila si trae la cabecera `X-Profile-Token` con el valor de
+PROFILING_TOKEN, o al azar con probabilidad PROFILING_SAMPLE_RATE. Se usa
+cProfile (determinista, solo el hilo de la petición) y además se mide el
+tiempo de pared frente al tiempo de CPU del hilo: la diferencia es espera,
+casi siempre E/S hacia APS, y `socket_ms` es la parte que pasó bloqueada en
+sockets. Los perfiles se guardan en disco (compartidos entre workers) y solo
+se conservan los PROFILING_MAX_PROFILES más recientes.
+
+Sin token ni muestreo no se registra ningún hook, así que el coste es nulo.
+"""
+import cProfile
+import hmac
+import json
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+
+from flask import g, request
+
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', '50'))
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(__file__), 'cache', 'profiles')
+)
+TOKEN_HEADER = 'X-Profile-Token'
+TOP_FUNCTIONS = 25
+# Métodos C de socket/ssl en los que el hilo queda bloqueado esperando la red.
+SOCKET_MODULES = ('_socket.socket', '_ssl._SSLSocket', 'getaddrinfo')
+
+_prune_lock = threading.Lock()
+
+
+def is_enabled():
+    return bool(PROFILING_TOKEN) or PROFILING_SAMPLE_RATE > 0
+
+
+def is_authorized(req):
+    """True si la petición trae el token de perfilado correcto."""
+    received = req.headers.get(TOKEN_HEADER)
+    if not PROFILING_TOKEN or not received:
+        return False
+    # En bytes: compare_digest no admite str con caracteres no ASCII (cabeceras latin-1).
+    return hmac.compare_digest(received.encode('utf-8'), PROFILING_TOKEN.encode('utf-8'))
+
+
+def _start_profile():
+    if request.path.startswith('/api/profiles'):
+        return
+    if is_authorized(request):
+        trigger = 'header'
+    elif PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE:
+        trigger = 'sample'
+    else:
+        return
+    profiler = cProfile.Profile()
+    g.profile = {
+        'id': f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}",
+        'trigger': trigger,
+        'profiler': profiler,
+        'started_at': time.time(),
+        'wall': time.perf_counter(),
+        'cpu': time.thread_time(),
+        'status': None,
+    }
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: solo puede haber un perfilador activo por proceso a la vez.
+        g.pop('profile')
+
+
+def _tag_response(response):
+    profile = g.get('profile')
+    if profile is not None:
+        profile['status'] = response.status_code
+        response.headers['X-Profile-Id'] = profile['id']
+    return response
+
+
+def _socket_seconds(stats):
+    return sum(
+        entry[2] for (filename, _, name), entry in stats.stats.items()
+        if filename == '~' and any(module in name for module in SOCKET_MODULES)
+    )
+
+
+def _top_functions(stats):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            'function': name if filename == '~' else f'{os.path.basename(filename)}:{line}({name})',
+            'calls': entry[1],
+            'own_ms': round(entry[2] * 1000, 2),
+            'cumulative_ms': round(entry[3] * 1000, 2),
+        }
+        for (filename, line, name), entry in rows
+    ]
+
+
+def _finish_profile(exc=None):
+    """Hook teardown_request: cierra el perfil (también tras respuestas en streaming)."""
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    profile['profiler'].disable()
+    wall = time.perf_counter() - profile['wall']
+    cpu = time.thread_time() - profile['cpu']
+    try:
+        stats = pstats.Stats(profile['profiler'])
+        summary = {
+            'id': profile['id'],
+            'trigger': profile['trigger'],
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': profile['status'] if exc is None else 500,
+            'started_at': profile['started_at'],
+            'wall_ms': round(wall * 1000, 2),
+            'cpu_ms': round(cpu * 1000, 2),
+            'wait_ms': round(max(wall - cpu, 0) * 1000, 2),
+            'socket_ms': round(_socket_seconds(stats) * 1000, 2),
+            'top': _top_functions(stats),
+        }
+        _save(summary, stats)
+    except Exception as e:
+        print(f"[profiling] No se pudo guardar el perfil {profile['id']}: {e}")
+
+
+def _save(summary, stats):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, summary['id'])
+    # Mismo formato que Stats.dump_stats: se abre con pstats, snakeviz, etc.
+    with open(f'{base}.prof', 'wb') as f:
+        marshal.dump(stats.stats, f)
+    with open(f'{base}.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f)
+    print(f"[profiling] {summary['method']} {summary['path']}: {summary['wall_ms']} ms "
+          f"(CPU {summary['cpu_ms']} ms, sockets {summary['socket_ms']} ms) -> {summary['id']}")
+    _prune()
+
+
+def _prune():
+    with _prune_lock:
+        ids = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+        for profile_id in ids[:-PROFILING_MAX_PROFILES] if PROFILING_MAX_PROFILES > 0 else ids:
+            for ext in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profiles():
+    """Resúmenes (sin top de funciones) de los perfiles guardados, del más reciente al más antiguo."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        summary = get_profile(name[:-5])
+        if summary:
+            summary.pop('top', None)
+            profiles.append(summary)
+    return profiles
+
+
+def _profile_path(profile_id, ext):
+    if not profile_id or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    return path if os.path.isfile(path) else None
+
+
+def get_profile(profile_id):
+    path = _profile_path(profile_id, '.json')
+    if path is None:
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def profile_stats_path(profile_id):
+    """Ruta del volcado .prof de un perfil, o None."""
+    return _profile_path(profile_id, '.prof')
+
+
+def init_profiling(app):
+    """Registra los hooks de perfilado solo si hay token o muestreo configurados."""
+    if not is_enabled():
+        return
+    app.before_request(_start_profile)
+    app.after_request(_tag_response)
+    app.teardown_request(_finish_profile)
+    print(f"[profiling] Activo (cabecera {TOKEN_HEADER}: {'sí' if PROFILING_TOKEN else 'no'}, "
+          f"muestreo {PROFILING_SAMPLE_RATE:.2%})")
@@ -0,0 +1,237 @@
+"""
+Subidas reanudables al estilo tus (create / PATCH con offset / HEAD / finalize).
+
+Cada subida vive en `uploads/partial` como un par `<id>.part` (bytes recibidos)
+y `<id>.json` (metadatos), de modo que cualquier worker puede continuarla;
+las escrituras y la finalización se serializan entre procesos con el lock de
+archivo `<id>.lock`. Los trozos se escriben directamente a disco mientras se leen del socket; el
+archivo completo nunca se carga en memoria.
+"""
+import base64
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import process_lock
+
+PARTIAL_UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads', 'partial')
+MAX_UPLOAD_BYTES = int(os.getenv('RESUMABLE_UPLOAD_MAX_BYTES', str(2 * 1024 ** 3)))
+STALE_UPLOAD_SECONDS = int(os.getenv('RESUMABLE_UPLOAD_TTL_HOURS', '24')) * 3600
+READ_BLOCK_SIZE = 1024 * 1024
+SUPPORTED_CHECKSUMS = ('sha256', 'sha1', 'md5')
+
+os.makedirs(PARTIAL_UPLOAD_FOLDER, exist_ok=True)
+
+
+class UploadError(Exception):
+    """Error de protocolo con el código HTTP que debe devolverse al cliente."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _lock_path(upload_id):
+    return os.path.join(PARTIAL_UPLOAD_FOLDER, f'{upload_id}.lock')
+
+
+def _paths(upload_id):
+    base = os.path.join(PARTIAL_UPLOAD_FOLDER, upload_id)
+    return f'{base}.part', f'{base}.json'
+
+
+def _remove_lock_file(upload_id):
+    # Quien espere todavía el lock lo obtiene sobre el archivo borrado y ve que el .part ya no existe.
+    try:
+        os.remove(_lock_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def parse_size(value, name='Upload-Length'):
+    """Entero >= 0 de un JSON (no bool ni float) o de una cabecera (solo dígitos)."""
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise UploadError(f'{name} debe ser un entero mayor o igual que 0.', 400)
+
+
+def _save_meta(upload):
+    _, meta_path = _paths(upload['id'])
+    tmp_path = f'{meta_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(upload, f)
+    os.replace(tmp_path, meta_path)
+
+
+def parse_checksum_header(value):
+    """Interpreta 'Upload-Checksum: <algoritmo> <base64>' del protocolo tus."""
+    if not value:
+        return None
+    try:
+        algorithm, encoded = value.strip().split(' ', 1)
+        digest = base64.b64decode(encoded.strip(), validate=True).hex()
+    except ValueError:
+        raise UploadError('Upload-Checksum inválido.', 400)
+    algorithm = algorithm.lower()
+    if algorithm not in SUPPORTED_CHECKSUMS:
+        raise UploadError(f'Algoritmo de checksum no soportado: {algorithm}', 400)
+    return algorithm, digest
+
+
+def create_upload(filename, length, kind, checksum=None):
+    """Registra una subida nueva. `checksum` es el sha256 hex opcional del archivo completo."""
+    if length is None:
+        raise UploadError('Upload-Length es obligatorio.', 400)
+    length = parse_size(length)
+    if length > MAX_UPLOAD_BYTES:
+        raise UploadError('El archivo supera el tamaño máximo permitido.', 413)
+    checksum = None if checksum == '' else checksum
+    if checksum is not None and not (
+        isinstance(checksum, str) and len(checksum) == 64
+        and all(c in '0123456789abcdefABCDEF' for c in checksum)
+    ):
+        raise UploadError('checksum debe ser el sha256 del archivo en hexadecimal (64 caracteres).', 400)
+    cleanup_stale_uploads()
+    upload = {
+        'id': uuid.uuid4().hex,
+        'filename': filename,
+        'kind': kind,
+        'length': length,
+        'offset': 0,
+        'checksum': checksum.lower() if checksum is not None else None,
+        'created_at': time.time(),
+        'updated_at': time.time(),
+    }
+    part_path, _ = _paths(upload['id'])
+    open(part_path, 'wb').close()
+    _save_meta(upload)
+    return upload
+
+
+def get_upload(upload_id):
+    """Lee los metadatos de una subida; el offset real es el tamaño del .part."""
+    if not upload_id or not upload_id.isalnum():
+        return None
+    part_path, meta_path = _paths(upload_id)
+    if not os.path.exists(meta_path) or not os.path.exists(part_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            upload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    upload['offset'] = os.path.getsize(part_path)
+    return upload
+
+
+def append_chunk(upload, offset, stream, chunk_checksum=None):
+    """
+    Añade un trozo leyendo `stream` por bloques. Si el checksum del trozo no
+    coincide, se trunca el archivo al offset anterior. Devuelve el nuevo offset.
+    """
+    with process_lock.locked(_lock_path(upload['id'])):
+        part_path, _ = _paths(upload['id'])
+        try:
+            current = os.path.getsize(part_path)
+        except FileNotFoundError:
+            raise UploadError('Subida no encontrada.', 404)
+        if offset != current:
+            raise UploadError(f'Upload-Offset no coincide (esperado {current}).', 409)
+        hasher = hashlib.new(chunk_checksum[0]) if chunk_checksum else None
+        written = 0
+        with open(part_path, 'ab') as f:
+            while True:
+                block = stream.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if current + written > upload['length']:
+                    f.truncate(current)
+                    raise UploadError('El trozo excede Upload-Length.', 413)
+                if hasher:
+                    hasher.update(block)
+                f.write(block)
+            if hasher and hasher.hexdigest() != chunk_checksum[1]:
+                f.truncate(current)
+                # 460 Checksum Mismatch (extensión checksum de tus)
+                raise UploadError('El checksum del trozo no coincide.', 460)
+        upload['offset'] = current + written
+        upload['updated_at'] = time.time()
+        _save_meta(upload)
+        return upload['offset']
+
+
+def _file_digest(path, algorithm='sha256'):
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def finalize_upload(upload, destination_path):
+    """Verifica tamaño y checksum y mueve el archivo completo a su carpeta final."""
+    with process_lock.locked(_lock_path(upload['id'])):
+        part_path, meta_path = _paths(upload['id'])
+        try:
+            size = os.path.getsize(part_path)
+        except FileNotFoundError:
+            # Otra petición ya la finalizó (o se canceló) mientras esperábamos el lock.
+            raise UploadError('Subida no encontrada.', 404)
+        if size != upload['length']:
+            raise UploadError(f"Subida incompleta: {size} de {upload['length']} bytes.", 409)
+        if upload.get('checksum') and _file_digest(part_path) != upload['checksum']:
+            raise UploadError('El checksum del archivo no coincide.', 460)
+        shutil.move(part_path, destination_path)
+        os.remove(meta_path)
+    _remove_lock_file(upload['id'])
+
+
+def delete_upload(upload_id):
+    with process_lock.locked(_lock_path(upload_id)):
+        for path in _paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    _remove_lock_file(upload_id)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def cleanup_stale_uploads(max_age=STALE_UPLOAD_SECONDS):
+    """Elimina subidas parciales sin actividad durante más de `max_age` segundos."""
+    now = time.time()
+    removed = 0
+    for name in os.listdir(PARTIAL_UPLOAD_FOLDER):
+        if name.endswith('.lock'):
+            # Lock de una subida que ya no existe (p. ej. creado por una petición tardía).
+            upload_id = name[:-len('.lock')]
+            if not os.path.exists(_paths(upload_id)[0]) and now - _mtime(_lock_path(upload_id)) > max_age:
+                _remove_lock_file(upload_id)
+            continue
+        if not name.endswith('.part'):
+            continue
+        upload_id = name[:-len('.part')]
+        part_path, meta_path = _paths(upload_id)
+        try:
+            last_activity = max(os.path.getmtime(part_path), os.path.getmtime(meta_path))
+        except OSError:
+            last_activity = 0
+        if now - last_activity > max_age:
+            delete_upload(upload_id)
+            removed += 1
+    if removed:
+        print(f"[resumable-upload] {removed} subidas abandonadas eliminadas")
+    return removed
@@ -1,24 +1,79 @@
 
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
+import hmac
+import json
+import math
 import mimetypes
 import requests
 import urllib.parse
+import threading
 import time
-from flask import Flask, jsonify, request, send_from_directory, redirect
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, abort, jsonify, request, send_from_directory, send_file, redirect, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+from werkzeug.serving import is_running_from_reloader
 from werkzeug.utils import secure_filename
 
-from aps import get_internal_token, get_api_data
+from aps import (
+    get_internal_token, get_api_data, get_projected_api_data, get_many_api_data, APS_DATA_URL,
+    served_stale_age, submit_tracking_stale
+)
+from aps import cache as aps_cache, stale_cache as aps_stale_cache
+from circuit_breaker import CircuitOpenError, guarded_request, breaker_states
+from compression import init_compression
+import profiling
+from jsonapi import parse_fields, project_document
+from folder_sync import sync_folder, changes_since, parse_time
+from thumbnails import (
+    thumbnail_name, schedule_thumbnail, schedule_acc_thumbnail,
+    fetch_acc_thumbnail, acc_thumbnail_name
+)
+import derivative_cache
+import phasing_store
+import placemark_index
+import process_lock
+import storage
+import webhooks
+from cache_warmer import start_cache_warmer, warmer_status
+from resumable_upload import (
+    UploadError, create_upload, get_upload, append_chunk, finalize_upload,
+    delete_upload, parse_checksum_header, parse_size
+)
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Flask app setup
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+CORS(app, resources={r"/api/*": {"origins": "*"}},
+     expose_headers=['Content-Range', 'Accept-Ranges', 'Content-Length',
+                     'Upload-Offset', 'Upload-Length', 'Location'])
+init_compression(app)
+profiling.init_profiling(app)
+
+
+@app.before_request
+def reset_stale_marker():
+    served_stale_age.set(None)
+
+
+@app.after_request
+def mark_stale_response(response):
+    """Si se sirvió una copia vieja porque APS falló, se indica en las cabeceras."""
+    age = served_stale_age.get()
+    if age is not None:
+        response.headers['X-Cache-Status'] = 'stale'
+        response.headers['Age'] = str(int(age))
+        response.headers['Warning'] = '110 - "Response is Stale"'
+    return response
+
+
+def circuit_open_response(error):
+    return jsonify({'error': str(error)}), 503, {'Retry-After': str(int(error.retry_after) + 1)}
 
 MAP_PREPARATION_SECONDS = int(os.getenv('MAPS_PREPARATION_SECONDS', '5'))
 DEFAULT_TILESET_URL = os.getenv(
@@ -35,10 +90,80 @@ ALLOWED_DOC_EXTENSIONS = {
 }
 ACC_PROJECT_ID = os.getenv('ACC_PROJECT_ID', 'b.50e13047-2a8c-4c8b-af53-8d509a281dba')
 ACC_FOLDER_URN = os.getenv('ACC_FOLDER_URN', 'urn:adsk.wipprod:fs.folder:co.OdZ3iENkTh6vroYpYJxylA')
+DERIVATIVE_PROXY_ENABLED = os.getenv('DERIVATIVE_PROXY_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Secreto para los endpoints de administración (cabecera X-Admin-Token).
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+# Carpetas ACC (separadas por comas) sobre las que se pueden registrar webhooks.
+APS_WEBHOOK_FOLDERS = [
+    f.strip() for f in os.getenv('APS_WEBHOOK_FOLDERS', ACC_FOLDER_URN).split(',') if f.strip()
+]
 MAP_JOBS = {}
+# Protege MAP_JOBS y la renovación de tokens.json bajo workers con hilos/greenlets.
+# USER_TOKENS_LOCK serializa dentro del proceso; USER_TOKENS_LOCK_PATH entre workers.
+MAP_JOBS_LOCK = threading.Lock()
+USER_TOKENS_LOCK = threading.Lock()
+USER_TOKENS_PATH = os.path.join(os.path.dirname(__file__), 'tokens.json')
+USER_TOKENS_LOCK_PATH = os.path.join(os.path.dirname(__file__), 'cache', 'tokens.lock')
+
+
+def on_document_evicted(filename):
+    THUMB_STORE.evict(thumbnail_name(filename))
+    if allowed_gis_file(filename):
+        placemark_index.remove_layer(filename)
+
+# Carpetas de subidas con cuota, subcarpetas por hash y recolector en segundo plano.
+# Las miniaturas cuentan en la cuota y son lo primero que se borra (se regeneran).
+THUMB_STORE = storage.register_store('thumbnails', os.path.join(DOC_UPLOAD_FOLDER, 'thumbnails'),
+                                     tier=storage.TIER_DERIVED)
+DOC_STORE = storage.register_store('documents', DOC_UPLOAD_FOLDER, on_evict=on_document_evicted)
+MAP_STORE = storage.register_store('maps', MAP_UPLOAD_FOLDER, on_evict=placemark_index.remove_layer)
+QUOTA_ERROR = 'Cuota de almacenamiento excedida.'
+
+# Endpoints extra (separados por comas) que el precalentador mantiene en caché,
+# además de hubs/proyectos/topFolders y el contenido de ACC_FOLDER_URN.
+CACHE_WARM_ENDPOINTS = [e.strip() for e in os.getenv('CACHE_WARM_ENDPOINTS', '').split(',') if e.strip()]
+BACKGROUND_LOCK_PATH = os.getenv(
+    'BACKGROUND_LOCK_PATH',
+    os.path.join(os.path.dirname(__file__), 'cache', 'background.lock')
+)
+BACKGROUND_LOCK_RETRY_SECONDS = 30
+_background_started = False
 
-os.makedirs(MAP_UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(DOC_UPLOAD_FOLDER, exist_ok=True)
+
+def start_background_workers():
+    """
+    Arranca el precalentador de caché y el recolector de subidas. No se llama al
+    importar el módulo sino desde gunicorn (post_worker_init) o desde __main__.
+    `aps.cache` vive en la memoria de cada proceso, así que el precalentador
+    corre en todos los workers; el recolector trabaja sobre archivos compartidos
+    y solo lo ejecuta el proceso que toma BACKGROUND_LOCK_PATH (si ese proceso
+    muere, otro worker lo releva en el siguiente intento).
+    """
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+    start_cache_warmer(
+        [*CACHE_WARM_ENDPOINTS, f'data/v1/projects/{ACC_PROJECT_ID}/folders/{ACC_FOLDER_URN}/contents'],
+        acc_project_id=ACC_PROJECT_ID
+    )
+
+    def run_gc():
+        while not process_lock.try_acquire(BACKGROUND_LOCK_PATH):
+            time.sleep(BACKGROUND_LOCK_RETRY_SECONDS)
+        print(f"[server] Recolector de subidas activo en el proceso {os.getpid()}")
+        storage.start_storage_gc()
+
+    threading.Thread(target=run_gc, name='storage-gc-lock', daemon=True).start()
+
+def require_admin():
+    """None si la petición trae el ADMIN_TOKEN correcto; si no, la respuesta de error."""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Configura ADMIN_TOKEN para usar este endpoint.'}), 503
+    received = request.headers.get('X-Admin-Token') or ''
+    if not hmac.compare_digest(received.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({'error': 'No autorizado.'}), 403
+    return None
 
 def allowed_gis_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_GIS_EXTENSIONS
@@ -46,6 +171,15 @@ def allowed_gis_file(filename):
 def allowed_doc_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_DOC_EXTENSIONS
 
+def index_map_layer(save_path):
+    """Indexa los placemarks si el archivo es KML/KMZ (también los subidos como documento)."""
+    if allowed_gis_file(save_path):
+        placemark_index.build_layer_index_async(save_path)
+
+def timestamped_filename(filename):
+    """Nombre de guardado local: prefijo UTC + nombre saneado."""
+    return f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{secure_filename(filename)}"
+
 def normalize_urn(urn):
     """Replace chars so we can build mock URLs per URN."""
     return ''.join('_' if c in ':/\\' else c for c in urn)
@@ -88,7 +222,7 @@ def serialize_job(job):
 
 
 def upsert_job(urn):
-    """Create a fake preparation job or refresh an existing one."""
+    """Create a fake preparation job or refresh an existing one (hold MAP_JOBS_LOCK)."""
     job = MAP_JOBS.get(urn)
     created = False
     if job is None:
@@ -113,45 +247,273 @@ def get_viewer_token():
         return jsonify({'error': error}), 500
     return jsonify({'access_token': token})
 
-@app.route('/api/hubs')
-def get_hubs():
+def jsonapi_passthrough(endpoint):
+    """Proxy a JSON:API document from APS, applying ?fields= projection if requested."""
     token, error = get_internal_token()
     if error: return jsonify({'error': error}), 500
-    data, error = get_api_data('project/v1/hubs', token)
+    fields = parse_fields(request.args)
+    if fields:
+        data, error = get_projected_api_data(endpoint, token, fields)
+    else:
+        data, error = get_api_data(endpoint, token)
     if error: return jsonify({'error': error}), 500
     return jsonify(data)
 
+@app.route('/api/viewer/config')
+def get_viewer_config():
+    """Configuración del visor: si el proxy de derivados está activo, el visor apunta a él."""
+    base = request.host_url.rstrip('/')
+    return jsonify({
+        'derivative_proxy': f'{base}/api/derivatives' if DERIVATIVE_PROXY_ENABLED else None
+    })
+
+@app.route('/api/viewer/cache-stats')
+def get_derivative_cache_stats():
+    if not DERIVATIVE_PROXY_ENABLED:
+        return jsonify({'enabled': False})
+    return jsonify(dict(derivative_cache.stats(), enabled=True))
+
+@app.route('/api/derivatives/<path:path>')
+def proxy_derivative(path):
+    """
+    Proxy con caché en disco para Model Derivative (manifests, SVF, property DBs).
+    El visor lo usa con Autodesk.Viewing.endpoint.setEndpointAndApi(<base>/api/derivatives, 'modelDerivativeV2').
+    Soporta Range y If-None-Match (ETag = sha256 del contenido).
+    """
+    if not DERIVATIVE_PROXY_ENABLED or not derivative_cache.is_allowed_path(path):
+        return jsonify({'error': 'Not found'}), 404
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header[len('Bearer '):] if auth_header.startswith('Bearer ') else None
+    if not token:
+        token, error = get_internal_token()
+        if error: return jsonify({'error': error}), 500
+    for attempt in range(2):
+        entry, error, status = derivative_cache.fetch(
+            path, request.query_string.decode('utf-8'), APS_DATA_URL, token
+        )
+        if error:
+            return jsonify({'error': error}), status
+        try:
+            response = send_file(
+                entry['path'],
+                mimetype=entry['content_type'],
+                conditional=True,
+                etag=entry['digest'],
+                max_age=0 if not entry['cached'] else 24 * 3600
+            )
+            break
+        except FileNotFoundError:
+            # Expulsado por presupuesto entre la búsqueda y la apertura: se trata como fallo de caché.
+            if attempt:
+                raise
+    response.headers['X-Cache'] = 'HIT' if entry['hit'] else 'MISS'
+    if not entry['cached']:
+        # Manifest de una traducción en curso: se sirve una vez y se descarta.
+        tmp_path = entry['path']
+        response.call_on_close(lambda: os.path.exists(tmp_path) and os.remove(tmp_path))
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/health/upstream')
+def get_upstream_health():
+    """Estado de los circuit breakers por familia de endpoints de APS."""
+    return jsonify({'breakers': breaker_states()})
+
+@app.route('/api/storage/stats')
+def get_storage_stats():
+    """Uso de disco de las carpetas de subidas frente a la cuota."""
+    return jsonify(storage.usage_stats())
+
+@app.route('/api/storage/gc', methods=['POST'])
+def run_storage_gc():
+    """
+    Lanza una pasada del recolector ahora (solo borra si se supera la marca alta).
+    Requiere X-Admin-Token. JSON opcional {min_idle_days}, que no puede bajar de
+    STORAGE_MIN_IDLE_SECONDS.
+    """
+    denied = require_admin()
+    if denied: return denied
+    payload = request.get_json(silent=True) or {}
+    min_idle_seconds = storage.STORAGE_MIN_IDLE_SECONDS
+    if payload.get('min_idle_days') is not None:
+        try:
+            min_idle_seconds = float(payload['min_idle_days']) * 86400
+        except (TypeError, ValueError):
+            min_idle_seconds = None
+        if min_idle_seconds is None or not math.isfinite(min_idle_seconds):
+            return jsonify({'error': 'min_idle_days debe ser un número.'}), 400
+    evicted = storage.collect_garbage(min_idle_seconds=min_idle_seconds)
+    return jsonify(dict(storage.usage_stats(), evicted_now=evicted))
+
+@app.route('/api/profiles')
+def list_request_profiles():
+    """Perfiles de peticiones guardados (requiere la cabecera X-Profile-Token)."""
+    if not profiling.is_authorized(request):
+        return jsonify({'error': 'No autorizado.'}), 403
+    return jsonify({'profiles': profiling.list_profiles()})
+
+@app.route('/api/profiles/<profile_id>')
+def get_request_profile(profile_id):
+    """Resumen de un perfil; con ?format=prof descarga el volcado para pstats/snakeviz."""
+    if not profiling.is_authorized(request):
+        return jsonify({'error': 'No autorizado.'}), 403
+    if request.args.get('format') == 'prof':
+        path = profiling.profile_stats_path(profile_id)
+        if path is None:
+            return jsonify({'error': 'Perfil no encontrado.'}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+    summary = profiling.get_profile(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Perfil no encontrado.'}), 404
+    return jsonify(summary)
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """Uso de memoria y aciertos de la caché de APS, por familia de endpoint (y de las copias de respaldo)."""
+    return jsonify({**aps_cache.stats(), 'stale': aps_stale_cache.stats()})
+
+@app.route('/api/cache/warmer')
+def get_cache_warmer_status():
+    return jsonify(warmer_status())
+
+@app.route('/api/hubs')
+def get_hubs():
+    return jsonapi_passthrough('project/v1/hubs')
+
 @app.route('/api/hubs/<hub_id>/projects')
 def get_projects(hub_id):
-    token, error = get_internal_token()
-    if error: return jsonify({'error': error}), 500
-    data, error = get_api_data(f'project/v1/hubs/{hub_id}/projects', token)
-    if error: return jsonify({'error': error}), 500
-    return jsonify(data)
+    return jsonapi_passthrough(f'project/v1/hubs/{hub_id}/projects')
 
 @app.route('/api/hubs/<hub_id>/projects/<project_id>/topFolders')
 def get_top_folders(hub_id, project_id):
-    token, error = get_internal_token()
-    if error: return jsonify({'error': error}), 500
-    data, error = get_api_data(f'project/v1/hubs/{hub_id}/projects/{project_id}/topFolders', token)
-    if error: return jsonify({'error': error}), 500
-    return jsonify(data)
+    return jsonapi_passthrough(f'project/v1/hubs/{hub_id}/projects/{project_id}/topFolders')
 
 @app.route('/api/projects/<project_id>/folders/<folder_id>/contents')
 def get_folder_contents(project_id, folder_id):
-    token, error = get_internal_token()
-    if error: return jsonify({'error': error}), 500
-    data, error = get_api_data(f'data/v1/projects/{project_id}/folders/{folder_id}/contents', token)
-    if error: return jsonify({'error': error}), 500
-    return jsonify(data)
+    return jsonapi_passthrough(f'data/v1/projects/{project_id}/folders/{folder_id}/contents')
 
 @app.route('/api/projects/<project_id>/items/<item_id>/versions')
 def get_item_versions(project_id, item_id):
+    return jsonapi_passthrough(f'data/v1/projects/{project_id}/items/{item_id}/versions')
+
+VERSIONS_BATCH_PARALLELISM = int(os.getenv('VERSIONS_BATCH_PARALLELISM', '8'))
+VERSIONS_BATCH_MAX_ITEMS = 200
+
+def tip_version(versions):
+    """La versión con mayor versionNumber de un listado de versiones."""
+    return max(
+        versions or [],
+        key=lambda version: (version.get('attributes') or {}).get('versionNumber') or 0,
+        default=None
+    )
+
+@app.route('/api/projects/<project_id>/items/versions', methods=['POST'])
+def get_items_versions_batch(project_id):
+    """
+    Versiones de varios ítems en una sola petición.
+    JSON: {items: [item_id, ...], tip: bool}. Con tip=true solo se devuelve la
+    última versión de cada ítem. Acepta ?fields= como el resto de listados.
+    Devuelve {items: {item_id: {data} | {error}}}.
+    """
+    payload = request.get_json(silent=True) or {}
+    item_ids = [str(i) for i in payload.get('items') or [] if i]
+    if not item_ids:
+        return jsonify({'error': 'Falta la lista items.'}), 400
+    if len(item_ids) > VERSIONS_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Máximo {VERSIONS_BATCH_MAX_ITEMS} ítems por petición.'}), 400
     token, error = get_internal_token()
     if error: return jsonify({'error': error}), 500
-    data, error = get_api_data(f'data/v1/projects/{project_id}/items/{item_id}/versions', token)
+
+    endpoints = {item_id: f'data/v1/projects/{project_id}/items/{item_id}/versions' for item_id in item_ids}
+    responses = get_many_api_data(endpoints.values(), token, max_workers=VERSIONS_BATCH_PARALLELISM)
+    fields = parse_fields(request.args)
+    items = {}
+    for item_id, endpoint in endpoints.items():
+        data, error = responses[endpoint]
+        if error:
+            items[item_id] = {'error': error}
+            continue
+        if payload.get('tip'):
+            data = {'data': tip_version(data.get('data'))}
+        items[item_id] = project_document(data, fields)
+    return jsonify({'items': items})
+
+@app.route('/api/projects/<project_id>/folders/<folder_id>/changes')
+def get_folder_changes(project_id, folder_id):
+    """
+    Devuelve solo los elementos cambiados desde ?since= (ISO 8601).
+    El cliente guarda el 'watermark' de la respuesta y lo envía en la siguiente consulta.
+    """
+    since_arg = request.args.get('since')
+    since = parse_time(since_arg)
+    if since_arg and since is None:
+        return jsonify({'error': 'El parámetro since debe ser una fecha ISO 8601.'}), 400
+    token, error = get_internal_token()
     if error: return jsonify({'error': error}), 500
-    return jsonify(data)
+    state, error = sync_folder(project_id, folder_id, token)
+    if error: return jsonify({'error': error}), 500
+    return jsonify(changes_since(state, since))
+
+@app.route('/api/phasing/<urn>/configs')
+def list_phasing_configs(urn):
+    return jsonify({'configs': phasing_store.list_configs(urn)})
+
+@app.route('/api/phasing/<urn>/configs/<name>', methods=['GET', 'PUT', 'DELETE'])
+def phasing_config(urn, name):
+    """
+    Configuración de phasing de un modelo. PUT JSON: {tasks, objects, propMappings};
+    objects es {task_id: {runs: [hueco, longitud, ...]}} o {task_id: [dbIds]}.
+    GET devuelve los conjuntos siempre codificados como runs.
+    """
+    if request.method == 'DELETE':
+        if not phasing_store.delete_config(urn, name):
+            return jsonify({'error': 'Configuración no encontrada.'}), 404
+        return '', 204
+    if request.method == 'PUT':
+        payload = request.get_json(silent=True) or {}
+        try:
+            result = phasing_store.save_config(
+                urn, name, payload.get('tasks'), payload.get('objects') or {}, payload.get('propMappings')
+            )
+        except phasing_store.PhasingError as e:
+            return jsonify({'error': e.message}), e.status
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Datos de phasing no válidos.'}), 400
+        return jsonify(result)
+    config = phasing_store.load_config(urn, name)
+    if config is None:
+        return jsonify({'error': 'Configuración no encontrada.'}), 404
+    return jsonify(config)
+
+@app.route('/api/phasing/<urn>/configs/<name>/visible')
+def phasing_visible_at(urn, name):
+    """Elementos por estado y visibles en ?date= (ISO 8601, por defecto ahora)."""
+    date_arg = request.args.get('date')
+    reference = parse_time(date_arg) if date_arg else datetime.now(timezone.utc)
+    if reference is None:
+        return jsonify({'error': 'El parámetro date debe ser una fecha ISO 8601.'}), 400
+    try:
+        return jsonify(phasing_store.visible_at(urn, name, reference))
+    except phasing_store.PhasingError as e:
+        return jsonify({'error': e.message}), e.status
+
+@app.route('/api/phasing/<urn>/configs/<name>/sets', methods=['POST'])
+def phasing_set_operation(urn, name):
+    """
+    Operación de conjuntos sobre los dbIds de las tareas.
+    JSON: {op: union|intersection|difference, tasks: [task_id], sets: [[dbIds] | {runs}]}.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        result = phasing_store.set_operation(
+            urn, name, payload.get('op') or 'union', payload.get('tasks') or [], payload.get('sets') or []
+        )
+    except phasing_store.PhasingError as e:
+        return jsonify({'error': e.message}), e.status
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Datos de phasing no válidos.'}), 400
+    return jsonify(result)
 
 @app.route('/api/maps/prepare', methods=['POST'])
 def prepare_maps():
@@ -159,10 +521,12 @@ def prepare_maps():
     urn = (payload.get('urn') or '').strip()
     if not urn:
         return jsonify({'error': 'El URN es obligatorio.'}), 400
-    job, created = upsert_job(urn)
+    with MAP_JOBS_LOCK:
+        job, created = upsert_job(urn)
+        job = serialize_job(job)
     action = 'Creada' if created else 'Actualizada'
     print(f"{action} preparación Cesium para URN: {urn}")
-    return jsonify({'job': serialize_job(job)})
+    return jsonify({'job': job})
 
 
 @app.route('/api/maps/status/<path:urn>')
@@ -170,11 +534,14 @@ def get_maps_status(urn):
     urn = urn.strip()
     if not urn:
         return jsonify({'error': 'Proporciona un URN válido.'}), 400
-    job = MAP_JOBS.get(urn)
+    with MAP_JOBS_LOCK:
+        job = MAP_JOBS.get(urn)
+        if job is not None:
+            refresh_job_state(job)
+            job = serialize_job(job)
     if job is None:
         return jsonify({'error': 'No existe una preparación registrada para este URN.'}), 404
-    refresh_job_state(job)
-    return jsonify({'job': serialize_job(job)})
+    return jsonify({'job': job})
 
 @app.route('/api/maps/upload', methods=['POST'])
 def upload_gis_file():
@@ -185,16 +552,78 @@ def upload_gis_file():
         return jsonify({'error': 'Archivo inválido.'}), 400
     if not allowed_gis_file(file.filename):
         return jsonify({'error': 'Solo se permiten archivos KML o KMZ.'}), 400
-    filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{secure_filename(file.filename)}"
-    save_path = os.path.join(MAP_UPLOAD_FOLDER, filename)
+    if not storage.has_room(request.content_length):
+        return jsonify({'error': QUOTA_ERROR}), 507
+    filename = timestamped_filename(file.filename)
+    save_path = MAP_STORE.path_for(filename)
     file.save(save_path)
+    MAP_STORE.register(filename)
+    index_map_layer(save_path)
     base = request.host_url.rstrip('/')
     url = f'{base}/maps/uploads/{filename}'
     return jsonify({'url': url})
 
+@app.route('/api/maps/layers')
+def list_indexed_layers():
+    return jsonify({'layers': placemark_index.list_layers()})
+
+@app.route('/api/maps/features')
+def search_map_features():
+    """
+    Busca placemarks en las capas KML/KMZ indexadas sin descargar la capa.
+    Parámetros: q (texto en nombre/atributos), layer (archivo subido como mapa o documento),
+    bbox=minLon,minLat,maxLon,maxLat y limit. No incluye geometría.
+    """
+    query = (request.args.get('q') or '').strip()
+    layer = request.args.get('layer')
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = [float(v) for v in request.args['bbox'].split(',')]
+        except ValueError:
+            bbox = None
+        if not bbox or len(bbox) != 4:
+            return jsonify({'error': 'bbox debe ser minLon,minLat,maxLon,maxLat.'}), 400
+    try:
+        limit = int(request.args.get('limit', placemark_index.DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un entero.'}), 400
+    if layer:
+        layer = secure_filename(layer)
+        layer_path = MAP_STORE.resolve(layer) or DOC_STORE.resolve(layer)
+        if layer_path is None:
+            return jsonify({'error': 'Capa no encontrada.'}), 404
+        try:
+            placemark_index.ensure_layer_index(layer_path)
+        except (ValueError, OSError, ET.ParseError) as e:
+            return jsonify({'error': f'No se pudo indexar la capa: {e}'}), 422
+    features = placemark_index.search_features(query or None, layer, bbox, limit)
+    return jsonify({'features': features, 'count': len(features)})
+
+@app.route('/api/maps/features/<int:feature_id>')
+def get_map_feature(feature_id):
+    """Geometría completa (GeoJSON Feature) de un placemark indexado."""
+    feature = placemark_index.get_feature(feature_id)
+    if feature is None:
+        return jsonify({'error': 'Placemark no encontrado.'}), 404
+    return jsonify(feature)
+
+def send_stored_file(store, filename):
+    """Sirve un archivo de una carpeta de subidas y anota el acceso para el recolector."""
+    filename = secure_filename(filename)
+    path = store.resolve(filename) if filename else None
+    if path is None:
+        # Copia de ACC borrada por el recolector: se sigue leyendo desde ACC por streaming.
+        origin = store.evicted_origin(filename) if filename else None
+        if origin:
+            return redirect(acc_stream_url(origin['projectId'], origin['versionId']))
+        abort(404)
+    store.touch(filename)
+    return send_from_directory(os.path.dirname(path), filename)
+
 @app.route('/maps/uploads/<path:filename>')
 def serve_uploaded_gis(filename):
-    response = send_from_directory(MAP_UPLOAD_FOLDER, filename)
+    response = send_stored_file(MAP_STORE, filename)
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Headers'] = '*'
     return response
@@ -208,20 +637,193 @@ def upload_document_file():
         return jsonify({'error': 'Archivo inválido.'}), 400
     if not allowed_doc_file(file.filename):
         return jsonify({'error': 'Tipo de archivo no soportado.'}), 400
-    filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{secure_filename(file.filename)}"
-    save_path = os.path.join(DOC_UPLOAD_FOLDER, filename)
+    if not storage.has_room(request.content_length):
+        return jsonify({'error': QUOTA_ERROR}), 507
+    filename = timestamped_filename(file.filename)
+    save_path = DOC_STORE.path_for(filename)
     file.save(save_path)
+    DOC_STORE.register(filename)
+    index_map_layer(save_path)
     base = request.host_url.rstrip('/')
     url = f'{base}/docs/uploads/{filename}'
-    return jsonify({'url': url, 'filename': file.filename, 'content_type': file.mimetype})
+    return jsonify({
+        'url': url,
+        'filename': file.filename,
+        'content_type': file.mimetype,
+        'thumbnail_url': document_thumbnail_url(save_path)
+    })
 
 @app.route('/docs/uploads/<path:filename>')
 def serve_uploaded_document(filename):
-    response = send_from_directory(DOC_UPLOAD_FOLDER, filename)
+    response = send_stored_file(DOC_STORE, filename)
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Headers'] = '*'
     return response
 
+THUMBNAIL_MAX_AGE = 7 * 24 * 3600
+
+def document_thumbnail_url(save_path, base=None):
+    """Encola la miniatura de un documento local y devuelve su URL pública (o None)."""
+    if schedule_thumbnail(save_path, THUMB_STORE) == 'unsupported':
+        return None
+    base = base or request.host_url.rstrip('/')
+    return f'{base}/docs/thumbnails/{thumbnail_name(os.path.basename(save_path))}'
+
+@app.route('/docs/thumbnails/<path:filename>')
+def serve_document_thumbnail(filename):
+    response = send_stored_file(THUMB_STORE, filename)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Cache-Control'] = f'public, max-age={THUMBNAIL_MAX_AGE}, immutable'
+    return response
+
+@app.route('/api/thumbnails/acc/<urn>')
+def get_acc_thumbnail(urn):
+    """Miniatura de Model Derivative para una versión de ACC, descargada una vez y cacheada en disco."""
+    if not THUMB_STORE.resolve(acc_thumbnail_name(urn)):
+        token, error = get_internal_token()
+        if error: return jsonify({'error': error}), 500
+        _, error = fetch_acc_thumbnail(THUMB_STORE, urn, token)
+        if error: return jsonify({'error': error}), 404
+    response = send_stored_file(THUMB_STORE, acc_thumbnail_name(urn))
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Cache-Control'] = f'public, max-age={THUMBNAIL_MAX_AGE}'
+    return response
+
+@app.route('/api/thumbnails/batch', methods=['POST'])
+def get_thumbnails_batch():
+    """
+    Miniaturas para la lista de pines en una sola petición.
+    JSON: {documents: [url o nombre en uploads/documents], urns: [urn de versión ACC]}.
+    Devuelve {documents: {clave: {status, url}}, urns: {urn: {status, url}}}.
+    """
+    payload = request.get_json(silent=True) or {}
+    base = request.host_url.rstrip('/')
+    documents = {}
+    for key in payload.get('documents') or []:
+        filename = secure_filename(str(key).rsplit('/', 1)[-1])
+        source_path = DOC_STORE.resolve(filename) if filename else None
+        status = schedule_thumbnail(source_path, THUMB_STORE) if source_path else 'unsupported'
+        documents[key] = {
+            'status': status,
+            'url': None if status == 'unsupported' else f'{base}/docs/thumbnails/{thumbnail_name(filename)}'
+        }
+    urns = {}
+    urn_list = payload.get('urns') or []
+    if urn_list:
+        token, error = get_internal_token()
+        if error: return jsonify({'error': error}), 500
+        for urn in urn_list:
+            urns[urn] = {
+                'status': schedule_acc_thumbnail(THUMB_STORE, urn, token),
+                'url': f'{base}/api/thumbnails/acc/{urllib.parse.quote(urn, safe="")}'
+            }
+    return jsonify({'documents': documents, 'urns': urns})
+
+# Destinos de las subidas reanudables: carpeta, validador, ruta pública y error de tipo.
+RESUMABLE_UPLOAD_KINDS = {
+    'documents': (DOC_STORE, allowed_doc_file, 'docs/uploads', 'Tipo de archivo no soportado.'),
+    'maps': (MAP_STORE, allowed_gis_file, 'maps/uploads', 'Solo se permiten archivos KML o KMZ.'),
+}
+TUS_HEADERS = {'Tus-Resumable': '1.0.0', 'Cache-Control': 'no-store'}
+
+def upload_status_headers(upload):
+    headers = dict(TUS_HEADERS)
+    headers['Upload-Offset'] = str(upload['offset'])
+    headers['Upload-Length'] = str(upload['length'])
+    return headers
+
+@app.route('/api/uploads', methods=['POST'])
+def create_resumable_upload():
+    """
+    Crea una subida reanudable. JSON: {filename, size, kind: 'documents'|'maps', checksum?: sha256 hex}.
+    Luego: PATCH /api/uploads/<id> con Upload-Offset, HEAD para consultar el offset
+    y POST /api/uploads/<id>/complete para finalizar.
+    """
+    payload = request.get_json(silent=True) or {}
+    filename = (payload.get('filename') or '').strip()
+    kind = payload.get('kind') or 'documents'
+    if kind not in RESUMABLE_UPLOAD_KINDS:
+        return jsonify({'error': f'Tipo de subida desconocido: {kind}'}), 400
+    _, validator, _, type_error = RESUMABLE_UPLOAD_KINDS[kind]
+    if not filename:
+        return jsonify({'error': 'Archivo inválido.'}), 400
+    if not validator(filename):
+        return jsonify({'error': type_error}), 400
+    size = payload.get('size', request.headers.get('Upload-Length'))
+    try:
+        size = parse_size(size) if size is not None else None
+        if not storage.has_room(size):
+            return jsonify({'error': QUOTA_ERROR}), 507
+        upload = create_upload(filename, size, kind, payload.get('checksum'))
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+    headers = upload_status_headers(upload)
+    headers['Location'] = f"{request.host_url.rstrip('/')}/api/uploads/{upload['id']}"
+    print(f"[resumable-upload] Creada {upload['id']} para {filename} ({upload['length']} bytes)")
+    return jsonify({'upload_id': upload['id'], 'offset': 0, 'length': upload['length']}), 201, headers
+
+@app.route('/api/uploads/<upload_id>', methods=['HEAD', 'GET'])
+def get_resumable_upload(upload_id):
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Subida no encontrada.'}), 404, TUS_HEADERS
+    return jsonify({'upload_id': upload_id, 'offset': upload['offset'], 'length': upload['length']}), 200, upload_status_headers(upload)
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def patch_resumable_upload(upload_id):
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Subida no encontrada.'}), 404, TUS_HEADERS
+    try:
+        offset = parse_size(request.headers.get('Upload-Offset', ''), 'Upload-Offset')
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status, TUS_HEADERS
+    try:
+        checksum = parse_checksum_header(request.headers.get('Upload-Checksum'))
+        append_chunk(upload, offset, request.stream, checksum)
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status, upload_status_headers(get_upload(upload_id) or upload)
+    return '', 204, upload_status_headers(upload)
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_resumable_upload(upload_id):
+    upload = get_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Subida no encontrada.'}), 404
+    store, _, public_path, _ = RESUMABLE_UPLOAD_KINDS[upload['kind']]
+    filename = timestamped_filename(upload['filename'])
+    save_path = store.path_for(filename)
+    try:
+        finalize_upload(upload, save_path)
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+    store.register(filename)
+    url = f"{request.host_url.rstrip('/')}/{public_path}/{filename}"
+    print(f"[resumable-upload] Finalizada {upload_id} -> {filename}")
+    result = {'url': url}
+    index_map_layer(save_path)
+    if upload['kind'] == 'documents':
+        result.update({
+            'filename': upload['filename'],
+            'content_type': mimetypes.guess_type(upload['filename'])[0] or 'application/octet-stream',
+            'thumbnail_url': document_thumbnail_url(save_path)
+        })
+    return jsonify(result)
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def delete_resumable_upload(upload_id):
+    if get_upload(upload_id) is None:
+        return jsonify({'error': 'Subida no encontrada.'}), 404, TUS_HEADERS
+    delete_upload(upload_id)
+    return '', 204, TUS_HEADERS
+
+def save_user_tokens(tokens):
+    """Reescribe tokens.json de forma atómica: otro worker nunca lee un JSON a medias."""
+    tmp_path = f'{USER_TOKENS_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(tokens, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, USER_TOKENS_PATH)
+
 def refresh_user_tokens(tokens):
     refresh_token = tokens.get('refresh_token')
     if not refresh_token:
@@ -245,22 +847,17 @@ def refresh_user_tokens(tokens):
         new_tokens = resp.json()
         
         # Save new tokens
-        tokens_path = os.path.join(os.path.dirname(__file__), 'tokens.json')
-        with open(tokens_path, 'w', encoding='utf-8') as f:
-            import json
-            json.dump(new_tokens, f, ensure_ascii=False, indent=2)
-            
+        save_user_tokens(new_tokens)
         return new_tokens
     except Exception as e:
         print(f"Error refreshing token: {e}")
         return None
 
 def load_user_tokens():
-    tokens_path = os.path.join(os.path.dirname(__file__), 'tokens.json')
+    tokens_path = USER_TOKENS_PATH
     if not os.path.exists(tokens_path):
         return None
     try:
-        import json
         with open(tokens_path, 'r', encoding='utf-8') as f:
             tokens = json.load(f)
             
@@ -271,8 +868,13 @@ def load_user_tokens():
         
         # Refresh if token is older than (expires_in - 5 minutes)
         if age > (expires_in - 300):
-            print(f"Token age {int(age)}s > {expires_in - 300}s. Refreshing...")
-            new_tokens = refresh_user_tokens(tokens)
+            with USER_TOKENS_LOCK, process_lock.locked(USER_TOKENS_LOCK_PATH):
+                # Otro hilo o worker pudo renovarlo mientras esperábamos: releer antes de refrescar.
+                if os.path.getmtime(tokens_path) != mtime:
+                    with open(tokens_path, 'r', encoding='utf-8') as f:
+                        return json.load(f)
+                print(f"Token age {int(age)}s > {expires_in - 300}s. Refreshing...")
+                new_tokens = refresh_user_tokens(tokens)
             if new_tokens:
                 return new_tokens
             else:
@@ -346,7 +948,7 @@ def get_signed_url():
         
         try:
             print(f'[get-signed-url] ACC object detected, using signeds3download: {storage_id}')
-            resp = requests.get(url, headers={'Authorization': f'Bearer {access_token}'})
+            resp = guarded_request('GET', url, headers={'Authorization': f'Bearer {access_token}'})
             if resp.ok:
                 data = resp.json()
                 download_url = data.get('url')
@@ -359,6 +961,8 @@ def get_signed_url():
             else:
                 print(f'[get-signed-url] OSS API error ({resp.status_code}): {resp.text}')
                 return jsonify({'error': f'OSS API Error: {resp.text}'}), resp.status_code
+        except CircuitOpenError as e:
+            return circuit_open_response(e)
         except Exception as e:
             print(f'[get-signed-url] Exception: {e}')
             return jsonify({'error': str(e)}), 500
@@ -372,36 +976,83 @@ def get_signed_url():
         url = f'https://developer.api.autodesk.com/oss/v2/buckets/{bucket_key}/objects/{encoded_obj}/signed?access=read'
         
         try:
-            resp = requests.get(url, headers={'Authorization': f'Bearer {access_token}'})
+            resp = guarded_request('GET', url, headers={'Authorization': f'Bearer {access_token}'})
             if resp.ok:
                 data = resp.json()
                 signed_url = data.get('signedUrl') or data.get('url')
                 return jsonify({'url': signed_url})
             else:
                 return jsonify({'error': f'APS Error: {resp.text}'}), resp.status_code
+        except CircuitOpenError as e:
+            return circuit_open_response(e)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/build/acc-upload', methods=['POST'])
-def upload_to_acc():
+ACC_UPLOAD_PARALLELISM = int(os.getenv('ACC_UPLOAD_PARALLELISM', '4'))
+ACC_UPLOAD_MAX_PARALLELISM = 16
+
+
+def list_acc_folder_items(headers):
+    """Devuelve {displayName: item_id} de la carpeta ACC configurada (recorre todas las páginas)."""
+    items = {}
+    url = f'https://developer.api.autodesk.com/data/v1/projects/{ACC_PROJECT_ID}/folders/{ACC_FOLDER_URN}/contents'
+    while url:
+        contents_resp = requests.get(url, headers=headers)
+        contents_resp.raise_for_status()
+        contents_data = contents_resp.json()
+        for item in contents_data.get('data', []):
+            if item.get('type') == 'items':
+                item_name = item.get('attributes', {}).get('displayName', '')
+                items.setdefault(item_name, item['id'])
+        url = ((contents_data.get('links') or {}).get('next') or {}).get('href')
+    return items
+
+
+def create_acc_version(existing_item_id, filename, object_id, headers):
+    """Crea una nueva versión de un item existente apuntando al objeto recién subido."""
+    version_payload = {
+        "data": {
+            "type": "versions",
+            "attributes": {
+                "name": filename,
+                "extension": {
+                    "type": "versions:autodesk.bim360:File",
+                    "version": "1.0"
+                }
+            },
+            "relationships": {
+                "item": {
+                    "data": {
+                        "type": "items",
+                        "id": existing_item_id
+                    }
+                },
+                "storage": {
+                    "data": {
+                        "type": "objects",
+                        "id": object_id
+                    }
+                }
+            }
+        }
+    }
+
+    versions_url = f'https://developer.api.autodesk.com/data/v1/projects/{ACC_PROJECT_ID}/versions'
+    version_resp = requests.post(versions_url, headers=headers, json=version_payload)
+    version_resp.raise_for_status()
+    return version_resp.json()
+
+
+def run_acc_upload(filename, file_data, access_token, folder_items=None):
     """
-    Sube un archivo a ACC en la carpeta configurada (ACC_FOLDER_URN) usando el token 3-legged guardado en tokens.json.
+    Ejecuta la cadena completa de subida a ACC para un archivo:
+    storage -> signed S3 upload -> item/versión -> traducción.
+    `file_data` puede ser bytes o un objeto tipo archivo.
+    `folder_items` ({displayName: item_id}) permite saltar directamente a crear
+    una versión cuando el archivo ya existe, sin el POST que devolvería 409.
+    Devuelve (resultado, error).
     """
-    tokens = load_user_tokens()
-    if not tokens or not tokens.get('access_token'):
-        return jsonify({'error': 'Falta token de usuario. Ejecuta el login 3-legged primero.'}), 401
-    access_token = tokens['access_token']
-    if 'file' not in request.files:
-        return jsonify({'error': 'No se recibió archivo.'}), 400
-    up_file = request.files['file']
-    if not up_file or not up_file.filename:
-        return jsonify({'error': 'Archivo inválido.'}), 400
-
-    # Use original filename without timestamp to enable proper versioning in ACC
-    filename = secure_filename(up_file.filename)
-    print(f"[acc-upload] Uploading file: {filename}")
-    
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json'
@@ -426,20 +1077,19 @@ def upload_to_acc():
     try:
         storage_resp = requests.post(storage_url, headers=headers, json=storage_payload)
         if not storage_resp.ok:
-            return jsonify({'error': f'Storage error: {storage_resp.status_code} {storage_resp.text}'}), 500
+            return None, f'Storage error: {storage_resp.status_code} {storage_resp.text}'
         storage_json = storage_resp.json()
         storage_data = storage_json.get('data') or {}
         object_id = storage_data.get('id')
         if not object_id:
-            return jsonify({'error': 'No se obtuvo objectId de storage.'}), 500
+            return None, 'No se obtuvo objectId de storage.'
     except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Storage error: {e}'}), 500
+        return None, f'Storage error: {e}'
 
     # 2) Subir usando signed S3 upload (nuevo flujo ACC)
-    file_bytes = up_file.read()
     bucket_key, object_name = parse_storage_components(object_id)
     if not bucket_key or not object_name:
-        return jsonify({'error': f'No se pudo parsear bucket/object de storageId: {object_id}'}), 500
+        return None, f'No se pudo parsear bucket/object de storageId: {object_id}'
 
     # No codificamos los slashes para respetar las carpetas dentro del bucket.
     encoded_obj = urllib.parse.quote(object_name, safe='/')
@@ -448,28 +1098,28 @@ def upload_to_acc():
     signed_resp = requests.get(signed_url, headers={'Authorization': f'Bearer {access_token}'})
     if not signed_resp.ok:
         print(f'[acc-upload] signed upload error {signed_resp.status_code}: {signed_resp.text}')
-        return jsonify({'error': f'Signed upload error: {signed_resp.status_code} {signed_resp.text}'}), 500
+        return None, f'Signed upload error: {signed_resp.status_code} {signed_resp.text}'
 
     try:
         signed_data = signed_resp.json()
     except ValueError:
         print(f'[acc-upload] signed upload no JSON: {signed_resp.text}')
-        return jsonify({'error': f'Signed upload no devolvió JSON: {signed_resp.text}'}), 500
+        return None, f'Signed upload no devolvió JSON: {signed_resp.text}'
     if isinstance(signed_data, str):
         try:
             import json
             signed_data = json.loads(signed_data)
         except Exception:
             print(f'[acc-upload] signed upload respuesta string inválida: {signed_data}')
-            return jsonify({'error': f'Signed upload respuesta no válida: {signed_data}'}), 500
+            return None, f'Signed upload respuesta no válida: {signed_data}'
     if not isinstance(signed_data, dict):
         print(f'[acc-upload] signed upload respuesta inesperada: {signed_data}')
-        return jsonify({'error': f'Signed upload respuesta inesperada: {signed_data}'}), 500
+        return None, f'Signed upload respuesta inesperada: {signed_data}'
 
     urls = signed_data.get('urls')
     if not urls or not isinstance(urls, list):
         print(f'[acc-upload] signed upload sin urls: {signed_data}')
-        return jsonify({'error': f'Signed upload sin urls: {signed_data}'}), 500
+        return None, f'Signed upload sin urls: {signed_data}'
     url_entry = urls[0] or {}
     if isinstance(url_entry, dict):
         upload_url = url_entry.get('url')
@@ -479,20 +1129,20 @@ def upload_to_acc():
         signed_headers = {}
     else:
         print(f'[acc-upload] url_entry inesperado: {url_entry}')
-        return jsonify({'error': f'url_entry inesperado: {url_entry}'}), 500
+        return None, f'url_entry inesperado: {url_entry}'
 
     upload_key = signed_data.get('uploadKey')
     if not upload_url or not upload_key:
         print(f'[acc-upload] signed upload incompleto: {signed_data}')
-        return jsonify({'error': f'Signed upload incompleto: {signed_data}'}), 500
+        return None, f'Signed upload incompleto: {signed_data}'
 
     put_headers = dict(signed_headers) if isinstance(signed_headers, dict) else {}
-    put_resp = requests.put(upload_url, headers=put_headers, data=file_bytes)
+    put_resp = requests.put(upload_url, headers=put_headers, data=file_data)
     if not put_resp.ok:
         print(f'[acc-upload] upload S3 error {put_resp.status_code}: {put_resp.text}')
         print(f'[acc-upload] upload_url: {upload_url}')
         print(f'[acc-upload] headers usados: {put_headers}')
-        return jsonify({'error': f'Upload S3 error: {put_resp.status_code} {put_resp.text}'}), 500
+        return None, f'Upload S3 error: {put_resp.status_code} {put_resp.text}'
 
     complete_resp = requests.post(signed_url, headers={
         'Authorization': f'Bearer {access_token}',
@@ -500,7 +1150,7 @@ def upload_to_acc():
     }, json={'uploadKey': upload_key})
     if not complete_resp.ok:
         print(f'[acc-upload] complete upload error {complete_resp.status_code}: {complete_resp.text}')
-        return jsonify({'error': f'Complete upload error: {complete_resp.status_code} {complete_resp.text}'}), 500
+        return None, f'Complete upload error: {complete_resp.status_code} {complete_resp.text}'
 
     upload_resp = complete_resp
 
@@ -569,79 +1219,46 @@ def upload_to_acc():
 
     items_url = f'https://developer.api.autodesk.com/data/v1/projects/{ACC_PROJECT_ID}/items'
     try:
-        items_resp = requests.post(items_url, headers=headers, json=item_payload)
-        
-        # If we get 409 Conflict, it means the file already exists - create a new version instead
-        if items_resp.status_code == 409:
-            print(f"[acc-upload] File '{filename}' already exists, creating new version...")
-            
-            # Extract the existing item ID from the error response
-            error_data = items_resp.json()
-            existing_item_id = None
-            
-            # Try to get item ID from error response or fetch it from folder contents
-            try:
-                # Some ACC errors include the conflicting item ID
-                if 'id' in error_data:
-                    existing_item_id = error_data['id']
-                else:
-                    # Need to search for the item
-                    folder_contents_url = f'https://developer.api.autodesk.com/data/v1/projects/{ACC_PROJECT_ID}/folders/{ACC_FOLDER_URN}/contents'
-                    contents_resp = requests.get(folder_contents_url, headers=headers)
-                    if contents_resp.ok:
-                        contents_data = contents_resp.json()
-                        for item in contents_data.get('data', []):
-                            if item.get('type') == 'items':
-                                item_name = item.get('attributes', {}).get('displayName', '')
-                                if item_name == filename:
-                                    existing_item_id = item['id']
-                                    break
-            except Exception as e:
-                print(f"[acc-upload] Error finding existing item: {e}")
-            
-            if not existing_item_id:
-                return jsonify({'error': f'File already exists but could not find item ID to create version'}), 500
-            
-            # Create a new version for the existing item
-            version_payload = {
-                "data": {
-                    "type": "versions",
-                    "attributes": {
-                        "name": filename,
-                        "extension": {
-                            "type": "versions:autodesk.bim360:File",
-                            "version": "1.0"
-                        }
-                    },
-                    "relationships": {
-                        "item": {
-                            "data": {
-                                "type": "items",
-                                "id": existing_item_id
-                            }
-                        },
-                        "storage": {
-                            "data": {
-                                "type": "objects",
-                                "id": object_id
-                            }
-                        }
-                    }
-                }
-            }
-            
-            versions_url = f'https://developer.api.autodesk.com/data/v1/projects/{ACC_PROJECT_ID}/versions'
-            version_resp = requests.post(versions_url, headers=headers, json=version_payload)
-            version_resp.raise_for_status()
-            item_data = version_resp.json()
+        known_item_id = folder_items.get(filename) if folder_items is not None else None
+        if known_item_id:
+            print(f"[acc-upload] File '{filename}' already in folder listing, creating new version...")
+            item_data = create_acc_version(known_item_id, filename, object_id, headers)
             print(f"[acc-upload] Created new version successfully")
         else:
-            items_resp.raise_for_status()
-            item_data = items_resp.json()
-            print(f"[acc-upload] Created new item successfully")
-            
+            items_resp = requests.post(items_url, headers=headers, json=item_payload)
+
+            # If we get 409 Conflict, it means the file already exists - create a new version instead
+            if items_resp.status_code == 409:
+                print(f"[acc-upload] File '{filename}' already exists, creating new version...")
+
+                # Extract the existing item ID from the error response
+                error_data = items_resp.json()
+                existing_item_id = None
+
+                # Try to get item ID from error response or fetch it from folder contents
+                try:
+                    # Some ACC errors include the conflicting item ID
+                    if 'id' in error_data:
+                        existing_item_id = error_data['id']
+                    else:
+                        # Need to search for the item
+                        existing_item_id = list_acc_folder_items(headers).get(filename)
+                except Exception as e:
+                    print(f"[acc-upload] Error finding existing item: {e}")
+
+                if not existing_item_id:
+                    return None, 'File already exists but could not find item ID to create version'
+
+                # Create a new version for the existing item
+                item_data = create_acc_version(existing_item_id, filename, object_id, headers)
+                print(f"[acc-upload] Created new version successfully")
+            else:
+                items_resp.raise_for_status()
+                item_data = items_resp.json()
+                print(f"[acc-upload] Created new item successfully")
+
     except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Item/Version error: {e}'}), 500
+        return None, f'Item/Version error: {e}'
 
     # Extraer webView link si existe
     webview_url = None
@@ -663,7 +1280,7 @@ def upload_to_acc():
         else:
             # Fallback: try to get from relationships
             version_id = item_data['data']['relationships']['tip']['data']['id']
-        
+
         print(f"[acc-upload] Extracted versionId: {version_id}")
     except (KeyError, TypeError, IndexError) as e:
         print(f"[acc-upload] Could not extract versionId from response: {e}")
@@ -679,7 +1296,7 @@ def upload_to_acc():
     print(f"[acc-upload] Version ID: {version_id}")
     print(f"[acc-upload] Generated URN: {urn}")
     print(f"[acc-upload] ===========================")
-    
+
     trigger_translation(urn, access_token)
 
     # Extract item_id for deletion purposes
@@ -693,8 +1310,11 @@ def upload_to_acc():
         print(f"[acc-upload] Error extracting itemId: {e}")
         # Fallback: try to guess or leave None
 
+    if folder_items is not None and item_id:
+        folder_items.setdefault(filename, item_id)
+
     # Respuesta simplificada para el frontend Build
-    return jsonify({
+    return {
         'name': filename,
         'size': upload_resp.json().get('size'),
         'storage_id': object_id,
@@ -707,8 +1327,128 @@ def upload_to_acc():
         'url': read_url,  # Solo devolvemos URL si es de lectura válida
         'webview_url': webview_url,
         'urn': urn
+    }, None
+
+
+@app.route('/api/build/acc-upload', methods=['POST'])
+def upload_to_acc():
+    """
+    Sube un archivo a ACC en la carpeta configurada (ACC_FOLDER_URN) usando el token 3-legged guardado en tokens.json.
+    """
+    tokens = load_user_tokens()
+    if not tokens or not tokens.get('access_token'):
+        return jsonify({'error': 'Falta token de usuario. Ejecuta el login 3-legged primero.'}), 401
+    access_token = tokens['access_token']
+    if 'file' not in request.files:
+        return jsonify({'error': 'No se recibió archivo.'}), 400
+    up_file = request.files['file']
+    if not up_file or not up_file.filename:
+        return jsonify({'error': 'Archivo inválido.'}), 400
+
+    # Use original filename without timestamp to enable proper versioning in ACC
+    filename = secure_filename(up_file.filename)
+    print(f"[acc-upload] Uploading file: {filename}")
+
+    result, error = run_acc_upload(filename, up_file.read(), access_token)
+    if error:
+        return jsonify({'error': error}), 500
+    return jsonify(result)
+
+
+@app.route('/api/build/acc-upload-batch', methods=['POST'])
+def upload_batch_to_acc():
+    """
+    Sube varios archivos (campo multipart 'files') a ACC en paralelo.
+    Comparte el token y un único listado de la carpeta entre todos los archivos;
+    ?parallelism=N ajusta la concurrencia (por defecto ACC_UPLOAD_PARALLELISM).
+    Devuelve un resultado por archivo en el mismo orden en que se enviaron.
+    """
+    tokens = load_user_tokens()
+    if not tokens or not tokens.get('access_token'):
+        return jsonify({'error': 'Falta token de usuario. Ejecuta el login 3-legged primero.'}), 401
+    access_token = tokens['access_token']
+    up_files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f and f.filename]
+    if not up_files:
+        return jsonify({'error': 'No se recibieron archivos.'}), 400
+    try:
+        parallelism = int(request.args.get('parallelism', ACC_UPLOAD_PARALLELISM))
+    except ValueError:
+        return jsonify({'error': 'parallelism debe ser un entero.'}), 400
+    parallelism = max(1, min(parallelism, ACC_UPLOAD_MAX_PARALLELISM, len(up_files)))
+
+    # Un solo listado de la carpeta para todo el lote: los archivos que ya existen
+    # van directo a "nueva versión" sin el POST de item que acabaría en 409.
+    try:
+        folder_items = list_acc_folder_items({'Authorization': f'Bearer {access_token}'})
+    except requests.exceptions.RequestException as e:
+        print(f"[acc-upload-batch] No se pudo listar la carpeta, se resolverán conflictos por archivo: {e}")
+        folder_items = None
+
+    filenames = [secure_filename(f.filename) for f in up_files]
+    print(f"[acc-upload-batch] Subiendo {len(up_files)} archivos con paralelismo {parallelism}")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = [
+            executor.submit(run_acc_upload, name, up_file.stream, access_token, folder_items)
+            for name, up_file in zip(filenames, up_files)
+        ]
+        results = []
+        for name, future in zip(filenames, futures):
+            try:
+                result, error = future.result()
+            except Exception as e:
+                result, error = None, str(e)
+            if error:
+                results.append({'name': name, 'ok': False, 'error': error})
+            else:
+                results.append(dict(result, ok=True))
+
+    succeeded = sum(1 for r in results if r['ok'])
+    print(f"[acc-upload-batch] {succeeded}/{len(results)} archivos subidos en {time.time() - started:.1f}s")
+    return jsonify({
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded
     })
 
+@app.route('/api/webhooks/register', methods=['POST'])
+def register_aps_webhooks():
+    """
+    Registra los webhooks de Data Management sobre ACC_FOLDER_URN (o 'folderUrn' del JSON,
+    que debe estar en APS_WEBHOOK_FOLDERS) apuntando a APS_WEBHOOK_CALLBACK_URL.
+    Requiere APS_WEBHOOK_SECRET y la cabecera X-Admin-Token.
+    """
+    denied = require_admin()
+    if denied: return denied
+    if not webhooks.APS_WEBHOOK_SECRET:
+        return jsonify({'error': 'Configura APS_WEBHOOK_SECRET para registrar webhooks.'}), 503
+    payload = request.get_json(silent=True) or {}
+    folder_urn = payload.get('folderUrn') or ACC_FOLDER_URN
+    if folder_urn not in APS_WEBHOOK_FOLDERS:
+        return jsonify({'error': 'Carpeta no permitida para webhooks.'}), 400
+    callback_url = webhooks.APS_WEBHOOK_CALLBACK_URL
+    if not callback_url:
+        return jsonify({'error': 'Configura APS_WEBHOOK_CALLBACK_URL para registrar webhooks.'}), 503
+    token, error = get_internal_token()
+    if error: return jsonify({'error': error}), 500
+    error = webhooks.register_webhook_secret(token)
+    if error: return jsonify({'error': error}), 500
+    results = webhooks.register_webhooks(token, callback_url, folder_urn)
+    return jsonify({'callbackUrl': callback_url, 'folderUrn': folder_urn, 'hooks': results})
+
+@app.route('/api/webhooks/aps', methods=['POST'])
+def receive_aps_webhook():
+    """Callback de APS: verifica la firma y convierte el evento en invalidaciones de caché."""
+    if not webhooks.APS_WEBHOOK_SECRET:
+        return jsonify({'error': 'Webhooks no configurados.'}), 503
+    raw_body = request.get_data(cache=True)
+    if not webhooks.verify_signature(raw_body, request.headers.get('x-adsk-signature')):
+        return jsonify({'error': 'Firma inválida.'}), 401
+    event = request.get_json(silent=True)
+    if not isinstance(event, dict):
+        return jsonify({'error': 'Evento inválido.'}), 400
+    return jsonify(webhooks.handle_event(event))
+
 @app.route('/api/auth/login')
 def auth_login():
     client_id = os.getenv('APS_CLIENT_ID')
@@ -748,10 +1488,7 @@ def auth_callback():
         tokens = resp.json()
         # Persist tokens locally so they can be reused (no deploy impact).
         try:
-            tokens_path = os.path.join(os.path.dirname(__file__), 'tokens.json')
-            with open(tokens_path, 'w', encoding='utf-8') as f:
-                import json
-                json.dump(tokens, f, ensure_ascii=False, indent=2)
+            save_user_tokens(tokens)
         except OSError as write_err:
             # Do not fail the callback if writing the file fails.
             print(f"[auth] No se pudo guardar tokens.json: {write_err}")
@@ -762,29 +1499,121 @@ def auth_callback():
     except requests.exceptions.RequestException as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/documents/link', methods=['POST'])
-def link_acc_document():
-    payload = request.get_json() or {}
-    project_id = payload.get('projectId')
-    version_id = payload.get('versionId')
-    display_name = payload.get('name')
-    web_view = payload.get('href')
-    if not project_id or not version_id:
-        return jsonify({'error': 'projectId y versionId son obligatorios.'}), 400
-    token, error = get_internal_token()
-    if error:
-        return jsonify({'error': error}), 500
-    result, download_error = download_acc_document(project_id, version_id, token)
+def link_document(project_id, version_id, display_name=None, web_view=None, stream=False, token=None, base=None):
+    """
+    Resuelve un documento de ACC para un pin: URL del proxy de streaming o copia local.
+    Si la descarga falla se devuelve igualmente el enlace a ACC (href) con el motivo en 'message'.
+    `base` (URL pública del servidor) es obligatorio fuera de un contexto de petición.
+    """
+    if stream:
+        # Sin copia local: el cliente lee el documento a través del proxy de streaming.
+        return {
+            'url': acc_stream_url(project_id, version_id, base),
+            'filename': display_name or 'Documento',
+            'content_type': mimetypes.guess_type(display_name or '')[0],
+            'href': web_view
+        }
+    result, download_error = download_acc_document(project_id, version_id, token, base)
     if download_error:
-        return jsonify({
+        return {
             'url': None,
             'filename': display_name or 'Documento',
             'content_type': None,
             'href': web_view,
             'message': download_error
-        })
+        }
     result['href'] = web_view
-    return jsonify(result)
+    return result
+
+@app.route('/api/documents/link', methods=['POST'])
+def link_acc_document():
+    payload = request.get_json() or {}
+    project_id = payload.get('projectId')
+    version_id = payload.get('versionId')
+    if not project_id or not version_id:
+        return jsonify({'error': 'projectId y versionId son obligatorios.'}), 400
+    token = None
+    if not payload.get('stream'):
+        token, error = get_internal_token()
+        if error:
+            return jsonify({'error': error}), 500
+    return jsonify(link_document(
+        project_id, version_id, payload.get('name'), payload.get('href'), payload.get('stream'), token
+    ))
+
+DOCUMENT_LINK_PARALLELISM = int(os.getenv('DOCUMENT_LINK_PARALLELISM', '4'))
+DOCUMENT_LINK_MAX_PARALLELISM = 16
+DOCUMENT_LINK_MAX_BATCH = 200
+
+@app.route('/api/documents/link-batch', methods=['POST'])
+def link_acc_documents_batch():
+    """
+    Vincula varios documentos de ACC a la vez (p. ej. una carpeta de planos para un pin).
+    JSON: {documents: [{projectId, versionId, name, href}], stream: bool, parallelism: N}.
+    Responde en NDJSON: una línea {index, versionId, ok, ...} por documento según
+    va terminando (con staleAge si APS falló y se usó una copia vieja de sus datos),
+    y al final {done: true, succeeded, failed, stale}.
+    """
+    payload = request.get_json(silent=True) or {}
+    documents = payload.get('documents') or []
+    if not isinstance(documents, list) or not documents:
+        return jsonify({'error': 'Falta la lista documents.'}), 400
+    if len(documents) > DOCUMENT_LINK_MAX_BATCH:
+        return jsonify({'error': f'Máximo {DOCUMENT_LINK_MAX_BATCH} documentos por petición.'}), 400
+    try:
+        parallelism = int(payload.get('parallelism') or DOCUMENT_LINK_PARALLELISM)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'parallelism debe ser un entero.'}), 400
+    parallelism = max(1, min(parallelism, DOCUMENT_LINK_MAX_PARALLELISM, len(documents)))
+    stream = bool(payload.get('stream'))
+    token = None
+    if not stream:
+        token, error = get_internal_token()
+        if error:
+            return jsonify({'error': error}), 500
+
+    base = request.host_url.rstrip('/')
+
+    def link_one(index, document):
+        document = document if isinstance(document, dict) else {}
+        project_id = document.get('projectId')
+        version_id = document.get('versionId')
+        line = {'index': index, 'versionId': version_id}
+        if not project_id or not version_id:
+            return dict(line, ok=False, error='projectId y versionId son obligatorios.')
+        try:
+            result = link_document(project_id, version_id, document.get('name'),
+                                   document.get('href'), document.get('stream', stream), token, base)
+        except Exception as e:
+            return dict(line, ok=False, error=str(e))
+        return dict(line, ok=bool(result.get('url')), **result)
+
+    def generate():
+        started = time.time()
+        succeeded = stale = 0
+        executor = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='doc-link')
+        try:
+            # Las cabeceras ya se enviaron: el aviso de copia vieja va en la línea de cada documento.
+            futures = [
+                submit_tracking_stale(executor, link_one, index, document)
+                for index, document in enumerate(documents)
+            ]
+            for future in as_completed(futures):
+                line, stale_age = future.result()
+                if stale_age is not None:
+                    line['staleAge'] = int(stale_age)
+                    stale += 1
+                succeeded += line['ok']
+                yield json.dumps(line, ensure_ascii=False) + '\n'
+        finally:
+            # Si el cliente corta la conexión no se siguen descargando los pendientes.
+            executor.shutdown(wait=False, cancel_futures=True)
+        print(f"[link-batch] {succeeded}/{len(documents)} documentos vinculados en {time.time() - started:.1f}s")
+        yield json.dumps({'done': True, 'succeeded': succeeded, 'failed': len(documents) - succeeded,
+                          'stale': stale}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/build/delete-file', methods=['DELETE'])
 def delete_acc_file():
@@ -847,8 +1676,6 @@ def delete_acc_file():
         return jsonify({'error': str(e)}), 500
 
 
-if __name__ == '__main__':
-    app.run(debug=True, port=3000)
 def extract_download_url(formats_payload):
     entries = formats_payload.get('data') or formats_payload.get('included') or []
     if isinstance(entries, dict):
@@ -877,7 +1704,7 @@ def extract_download_url(formats_payload):
     return None, None
 
 
-def download_acc_document(project_id, version_id, token):
+def download_acc_document(project_id, version_id, token, base=None):
     formats_endpoint = f'data/v1/projects/{project_id}/versions/{version_id}/downloadFormats'
     formats_data, error = get_api_data(formats_endpoint, token)
     if error:
@@ -887,28 +1714,118 @@ def download_acc_document(project_id, version_id, token):
     if not download_url:
         return None, 'No se encontró un enlace de descarga para este documento.'
 
-    resp = requests.get(download_url, stream=True)
+    resp = requests.get(download_url, stream=True, timeout=(10, 60))
     if resp.status_code != 200:
         return None, f'Descarga fallida ({resp.status_code}).'
 
     filename = filename or 'document'
     content_type = resp.headers.get('Content-Type') or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
     local_name = f"acc_{version_id.replace(':', '_')}_{secure_filename(filename)}"
-    local_path = os.path.join(DOC_UPLOAD_FOLDER, local_name)
+    local_path = DOC_STORE.path_for(local_name)
     with open(local_path, 'wb') as file_obj:
         for chunk in resp.iter_content(chunk_size=1024 * 1024):
             if chunk:
                 file_obj.write(chunk)
+    DOC_STORE.register(local_name, origin={'projectId': project_id, 'versionId': version_id})
+    index_map_layer(local_path)
 
-    base = request.host_url.rstrip('/')
+    base = base or request.host_url.rstrip('/')
     url = f'{base}/docs/uploads/{os.path.basename(local_path)}'
     return {
         'url': url,
         'filename': filename,
-        'content_type': content_type
+        'content_type': content_type,
+        'thumbnail_url': document_thumbnail_url(local_path, base)
     }, None
 
 
+STREAM_CHUNK_SIZE = 64 * 1024
+# Cabeceras que se reenvían al origen y las que se devuelven al cliente.
+STREAM_REQUEST_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+STREAM_RESPONSE_HEADERS = (
+    'Content-Type', 'Content-Length', 'Content-Range', 'Content-Encoding', 'Accept-Ranges',
+    'ETag', 'Last-Modified', 'Cache-Control'
+)
+
+
+def unsatisfiable_range_size(upstream):
+    """Tamaño total de un 416 del origen: de Content-Range o del XML de S3 (ActualObjectSize)."""
+    content_range = upstream.headers.get('Content-Range', '')
+    total = content_range.rsplit('/', 1)[-1] if '/' in content_range else ''
+    if total.isdigit():
+        upstream.close()
+        return int(total)
+    try:
+        root = ET.fromstring(upstream.content)
+        size = root.findtext('ActualObjectSize')
+        return int(size) if size and size.isdigit() else None
+    except ET.ParseError:
+        return None
+    finally:
+        upstream.close()
+
+
+def acc_stream_url(project_id, version_id, base=None):
+    base = base or request.host_url.rstrip('/')
+    query = urllib.parse.urlencode({'projectId': project_id, 'versionId': version_id})
+    return f'{base}/api/documents/stream?{query}'
+
+
+@app.route('/api/documents/stream')
+def stream_acc_document():
+    """
+    Proxy de streaming para documentos de ACC: resuelve la URL firmada y reenvía
+    el cuerpo por trozos a medida que llega, sin guardarlo en disco ni en memoria.
+    Reenvía Range / If-None-Match para que PDF.js pueda pedir solo la primera página.
+    """
+    project_id = request.args.get('projectId')
+    version_id = request.args.get('versionId')
+    if not project_id or not version_id:
+        return jsonify({'error': 'projectId y versionId son obligatorios.'}), 400
+    token, error = get_internal_token()
+    if error:
+        return jsonify({'error': error}), 500
+    formats_data, error = get_api_data(f'data/v1/projects/{project_id}/versions/{version_id}/downloadFormats', token)
+    if error:
+        return jsonify({'error': error}), 502
+    download_url, filename = extract_download_url(formats_data)
+    if not download_url:
+        return jsonify({'error': 'No se encontró un enlace de descarga para este documento.'}), 404
+
+    upstream_headers = {name: request.headers[name] for name in STREAM_REQUEST_HEADERS if name in request.headers}
+    try:
+        upstream = requests.get(download_url, headers=upstream_headers, stream=True, timeout=(10, 60))
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': f'Descarga fallida: {e}'}), 502
+    if upstream.status_code == 416:
+        headers = {'Accept-Ranges': 'bytes'}
+        size = unsatisfiable_range_size(upstream)
+        if size is not None:
+            headers['Content-Range'] = f'bytes */{size}'
+        return jsonify({'error': 'Rango no satisfacible.'}), 416, headers
+    if 400 <= upstream.status_code < 500:
+        upstream.close()
+        return jsonify({'error': f'Descarga fallida ({upstream.status_code}).'}), upstream.status_code
+    if upstream.status_code not in (200, 206, 304):
+        upstream.close()
+        return jsonify({'error': f'Descarga fallida ({upstream.status_code}).'}), 502
+
+    headers = {name: upstream.headers[name] for name in STREAM_RESPONSE_HEADERS if name in upstream.headers}
+    headers.setdefault('Accept-Ranges', 'bytes')
+    filename = filename or 'document'
+    if 'Content-Type' not in headers:
+        headers['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    headers['Content-Disposition'] = f"inline; filename*=UTF-8''{urllib.parse.quote(filename)}"
+
+    # requests descomprime gzip de forma transparente; usamos el stream crudo para
+    # respetar Content-Length/Content-Range tal como los envió el origen.
+    body = upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+    response = Response(stream_with_context(body), status=upstream.status_code, headers=headers,
+                        direct_passthrough=True)
+    response.call_on_close(upstream.close)
+    return response
+
+
 @app.route('/api/build/signed-read', methods=['POST'])
 def get_signed_read_url():
     """
@@ -950,7 +1867,7 @@ def get_signed_read_url():
     print(f"[signed-read] bucket={bucket_key} object={object_name}")
     signed_url = f'https://developer.api.autodesk.com/oss/v2/buckets/{bucket_key}/objects/{encoded_obj}/signed?access=read'
     try:
-        resp = requests.get(signed_url, headers={'Authorization': f'Bearer {token}'})
+        resp = guarded_request('GET', signed_url, headers={'Authorization': f'Bearer {token}'})
         if not resp.ok:
             return jsonify({'error': f'Signed read error: {resp.status_code}', 'details': resp.text}), 500
         data = resp.json()
@@ -958,6 +1875,8 @@ def get_signed_read_url():
         if not url:
              return jsonify({'error': 'No se recibió signedUrl de OSS.'}), 500
         return jsonify({'signedUrl': url, 'bucketKey': bucket_key, 'objectName': object_name})
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': f'Request error: {e}'}), 500
 
@@ -979,7 +1898,7 @@ def get_translation_status():
     print(f"[translation-status] Requesting: {url}")
     headers = {'Authorization': f'Bearer {token}'}
     try:
-        resp = requests.get(url, headers=headers)
+        resp = guarded_request('GET', url, headers=headers)
         print(f"[translation-status] Response status: {resp.status_code}")
         if resp.status_code != 200:
             print(f"[translation-status] Not ready yet, returning pending")
@@ -994,9 +1913,13 @@ def get_translation_status():
             return jsonify({'status': 'failed', 'progress': '0%'})
         else:
             return jsonify({'status': 'pending', 'progress': data.get('progress', '0%')})
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
     except Exception as e:
         print(f"[translation-status] ERROR: {e}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    if is_running_from_reloader():
+        start_background_workers()  # solo en el hijo del reloader, no en el proceso vigilante
     app.run(host='0.0.0.0', port=3000, debug=True)
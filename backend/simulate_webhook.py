@@ -0,0 +1,43 @@
+import hashlib
+import hmac
+import json
+import os
+import sys
+
+import requests
+
+# Simula un evento de webhook de APS contra el backend local (firmado con APS_WEBHOOK_SECRET).
+# Uso: python simulate_webhook.py [evento] [folderUrn] [lineageUrn] [versionUrn]
+secret = os.getenv('APS_WEBHOOK_SECRET', 'dev-secret')
+event_type = sys.argv[1] if len(sys.argv) > 1 else 'dm.version.added'
+folder_urn = sys.argv[2] if len(sys.argv) > 2 else os.getenv('ACC_FOLDER_URN', 'urn:adsk.wipprod:fs.folder:co.OdZ3iENkTh6vroYpYJxylA')
+lineage_urn = sys.argv[3] if len(sys.argv) > 3 else 'urn:adsk.wipprod:dm.lineage:fake-item'
+version_urn = sys.argv[4] if len(sys.argv) > 4 else 'urn:adsk.wipprod:fs.file:vf.fake-item?version=2'
+project_id = os.getenv('ACC_PROJECT_ID', 'b.50e13047-2a8c-4c8b-af53-8d509a281dba')
+
+event = {
+    'version': '1.0.0',
+    'resourceUrn': version_urn if event_type.startswith('dm.version.') else folder_urn,
+    'hook': {'event': event_type, 'system': 'data', 'scope': {'folder': folder_urn}},
+    'payload': {
+        'project': project_id[2:] if project_id.startswith('b.') else project_id,
+        'parentFolderUrn': folder_urn,
+        'lineageUrn': lineage_urn,
+        'source': version_urn,
+        'name': 'simulado.pdf',
+    }
+}
+body = json.dumps(event).encode('utf-8')
+signature = hmac.new(secret.encode('utf-8'), body, hashlib.sha1).hexdigest()
+
+url = os.getenv('WEBHOOK_URL', 'http://localhost:3000/api/webhooks/aps')
+print(f"Enviando {event_type} a {url}")
+try:
+    resp = requests.post(url, data=body, headers={
+        'Content-Type': 'application/json',
+        'x-adsk-signature': f'sha1hash={signature}'
+    })
+    print(f"Status: {resp.status_code}")
+    print(f"Response: {resp.text}")
+except Exception as e:
+    print(f"Error: {e}")
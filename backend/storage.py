@@ -0,0 +1,326 @@
+"""
+Almacenamiento de las carpetas de subidas (documentos y capas KML/KMZ).
+
+Los archivos nuevos se reparten en subcarpetas por hash del nombre
+(`uploads/documents/3f/<archivo>`) para que ningún directorio crezca sin
+límite; los que ya estaban en la carpeta plana se indexan donde están (algunos
+los versiona git) y las URLs públicas siguen siendo planas (`/docs/uploads/<archivo>`).
+Un índice SQLite guarda tamaño, nivel y último acceso de cada archivo.
+
+Hay una cuota global (STORAGE_QUOTA_BYTES). Cuando el uso supera
+STORAGE_GC_HIGH_WATERMARK de la cuota, un hilo en segundo plano borra archivos
+fríos (sin acceso en STORAGE_MIN_IDLE_SECONDS) hasta bajar a
+STORAGE_GC_LOW_WATERMARK: primero lo derivado (miniaturas, que se regeneran),
+luego las copias descargadas de ACC, que se pueden volver a leer por el proxy
+de streaming, y solo con STORAGE_EVICT_ORIGINALS las subidas de usuario. Los pines viven en el navegador, así que el servidor
+usa el último acceso como señal de que un archivo sigue referenciado.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+STORAGE_QUOTA_BYTES = int(os.getenv('STORAGE_QUOTA_BYTES', str(5 * 1024 ** 3)))
+STORAGE_GC_HIGH_WATERMARK = float(os.getenv('STORAGE_GC_HIGH_WATERMARK', '0.9'))
+STORAGE_GC_LOW_WATERMARK = float(os.getenv('STORAGE_GC_LOW_WATERMARK', '0.75'))
+STORAGE_GC_INTERVAL = int(os.getenv('STORAGE_GC_INTERVAL_SECONDS', '600'))
+STORAGE_MIN_IDLE_SECONDS = int(os.getenv('STORAGE_MIN_IDLE_SECONDS', str(7 * 24 * 3600)))
+STORAGE_EVICT_ORIGINALS = os.getenv('STORAGE_EVICT_ORIGINALS', 'false').lower() in ('1', 'true', 'yes')
+STORAGE_INDEX_PATH = os.getenv(
+    'STORAGE_INDEX_PATH',
+    os.path.join(os.path.dirname(__file__), 'uploads', 'storage.sqlite3')
+)
+# El último acceso se escribe como mucho una vez por intervalo (PDF.js pide muchos rangos).
+TOUCH_INTERVAL = 300
+SKIPPED_NAMES = {'thumbnails'}
+
+TIER_DERIVED = -1  # miniaturas y demás archivos que se regeneran a partir de otro
+TIER_ACC_COPY = 0  # copias de ACC: se pueden volver a servir por streaming
+TIER_ORIGINAL = 1  # subidas de usuario: únicas
+TIER_NAMES = {TIER_DERIVED: 'derived', TIER_ACC_COPY: 'acc_copy', TIER_ORIGINAL: 'original'}
+
+_stores = {}
+_touched = {}
+_touched_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+_last_gc = {'at': None, 'duration': None, 'evicted': 0, 'freed_bytes': 0}
+
+
+@contextmanager
+def _index():
+    """Conexión al índice SQLite dentro de una transacción; se cierra al salir."""
+    os.makedirs(os.path.dirname(STORAGE_INDEX_PATH), exist_ok=True)
+    conn = sqlite3.connect(STORAGE_INDEX_PATH, timeout=30)
+    try:
+        with conn:
+            conn.executescript(
+                'CREATE TABLE IF NOT EXISTS files ('
+                ' store TEXT NOT NULL, filename TEXT NOT NULL, size INTEGER NOT NULL,'
+                ' created REAL NOT NULL, last_access REAL NOT NULL, tier INTEGER NOT NULL,'
+                ' origin TEXT, evicted INTEGER NOT NULL DEFAULT 0,'
+                ' PRIMARY KEY (store, filename));'
+                'CREATE INDEX IF NOT EXISTS files_gc ON files (evicted, tier, last_access);'
+            )
+            yield conn
+    finally:
+        conn.close()
+
+
+def tier_for(filename):
+    return TIER_ACC_COPY if filename.startswith('acc_') else TIER_ORIGINAL
+
+
+class UploadStore:
+    """Una carpeta de subidas repartida en subcarpetas por hash del nombre."""
+
+    def __init__(self, name, root, on_evict=None, tier=None):
+        self.name = name
+        self.root = root
+        self.on_evict = on_evict
+        self.tier = tier
+        os.makedirs(root, exist_ok=True)
+
+    def tier_of(self, filename):
+        return self.tier if self.tier is not None else tier_for(filename)
+
+    def shard_path(self, filename):
+        shard = hashlib.sha1(filename.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.root, shard, filename)
+
+    def path_for(self, filename):
+        """Ruta donde guardar un archivo nuevo (crea la subcarpeta)."""
+        path = self.shard_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def resolve(self, filename):
+        """Ruta existente del archivo (repartida o, si aún no se migró, plana), o None."""
+        for path in (self.shard_path(filename), os.path.join(self.root, filename)):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def register(self, filename, origin=None):
+        """Da de alta un archivo recién guardado. `origin` ({projectId, versionId}) para copias de ACC."""
+        path = self.resolve(filename)
+        if path is None:
+            return
+        now = time.time()
+        with _index() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO files (store, filename, size, created, last_access, tier, origin, evicted)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, 0)',
+                (self.name, filename, os.path.getsize(path), now, now, self.tier_of(filename),
+                 json.dumps(origin) if origin else None)
+            )
+        if used_bytes() > STORAGE_QUOTA_BYTES * STORAGE_GC_HIGH_WATERMARK:
+            _wakeup.set()
+
+    def touch(self, filename):
+        now = time.time()
+        key = (self.name, filename)
+        with _touched_lock:
+            if now - _touched.get(key, 0) < TOUCH_INTERVAL:
+                return
+            _touched[key] = now
+        with _index() as conn:
+            conn.execute('UPDATE files SET last_access = ? WHERE store = ? AND filename = ?',
+                         (now, self.name, filename))
+
+    def evicted_origin(self, filename):
+        """Origen en ACC de una copia que el recolector ya borró, o None."""
+        with _index() as conn:
+            row = conn.execute(
+                'SELECT origin FROM files WHERE store = ? AND filename = ? AND evicted = 1',
+                (self.name, filename)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def evict(self, filename):
+        """
+        Borra el archivo (y, vía on_evict, lo que dependa de él); las copias de ACC con
+        origen conocido quedan marcadas para redirigir. Devuelve False si ya no existía.
+        """
+        path = self.resolve(filename)
+        removed = False
+        if path:
+            try:
+                os.remove(path)
+                removed = True
+            except FileNotFoundError:
+                pass
+        if self.on_evict:
+            self.on_evict(filename)
+        with _index() as conn:
+            conn.execute('DELETE FROM files WHERE store = ? AND filename = ? AND origin IS NULL',
+                         (self.name, filename))
+            conn.execute('UPDATE files SET evicted = 1 WHERE store = ? AND filename = ?',
+                         (self.name, filename))
+        _forget_touch(self.name, filename)
+        return removed
+
+    def reconcile(self):
+        """
+        Sincroniza el índice con el disco. Los archivos planos antiguos se indexan sin
+        moverlos (resolve los encuentra igual) para no tocar los que versiona git.
+        """
+        on_disk = {}
+        for entry in os.scandir(self.root):
+            if entry.name in SKIPPED_NAMES or entry.name.endswith('.tmp'):
+                continue
+            if entry.is_file():
+                on_disk.setdefault(entry.name, entry.path)
+            elif entry.is_dir() and len(entry.name) == 2:
+                for child in os.scandir(entry.path):
+                    if child.is_file() and not child.name.endswith('.tmp'):
+                        on_disk[child.name] = child.path  # la copia repartida tiene prioridad, como en resolve
+        with _index() as conn:
+            known = {
+                filename: evicted for filename, evicted in conn.execute(
+                    'SELECT filename, evicted FROM files WHERE store = ?', (self.name,)
+                )
+            }
+            for filename, path in on_disk.items():
+                if known.get(filename, 1):
+                    stat = os.stat(path)
+                    conn.execute(
+                        'INSERT OR REPLACE INTO files (store, filename, size, created, last_access, tier, origin, evicted)'
+                        ' VALUES (?, ?, ?, ?, ?, ?, (SELECT origin FROM files WHERE store = ? AND filename = ?), 0)',
+                        (self.name, filename, stat.st_size, stat.st_mtime, stat.st_mtime,
+                         self.tier_of(filename), self.name, filename)
+                    )
+            missing = [f for f, evicted in known.items() if not evicted and f not in on_disk]
+            conn.executemany('DELETE FROM files WHERE store = ? AND filename = ?',
+                             [(self.name, f) for f in missing])
+        # Archivos borrados a mano: se limpian también sus derivados (miniaturas, placemarks).
+        for filename in missing:
+            if self.on_evict:
+                self.on_evict(filename)
+            _forget_touch(self.name, filename)
+        return len(on_disk)
+
+
+def _forget_touch(store_name, filename):
+    with _touched_lock:
+        _touched.pop((store_name, filename), None)
+
+
+def register_store(name, root, on_evict=None, tier=None):
+    store = UploadStore(name, root, on_evict, tier)
+    _stores[name] = store
+    return store
+
+
+def used_bytes():
+    with _index() as conn:
+        return conn.execute('SELECT COALESCE(SUM(size), 0) FROM files WHERE evicted = 0').fetchone()[0]
+
+
+def has_room(size):
+    """True si caben `size` bytes más dentro de la cuota (recolectando antes si hace falta)."""
+    if used_bytes() + (size or 0) <= STORAGE_QUOTA_BYTES:
+        return True
+    collect_garbage(target_bytes=STORAGE_QUOTA_BYTES - (size or 0))
+    return used_bytes() + (size or 0) <= STORAGE_QUOTA_BYTES
+
+
+def collect_garbage(target_bytes=None, min_idle_seconds=None):
+    """
+    Borra archivos fríos, por nivel y del acceso más antiguo al más reciente, hasta `target_bytes`.
+    `min_idle_seconds` nunca baja de STORAGE_MIN_IDLE_SECONDS.
+    """
+    started = time.time()
+    min_idle_seconds = max(min_idle_seconds or 0, STORAGE_MIN_IDLE_SECONDS)
+    used = used_bytes()
+    if target_bytes is None:
+        if used <= STORAGE_QUOTA_BYTES * STORAGE_GC_HIGH_WATERMARK:
+            return 0
+        target_bytes = STORAGE_QUOTA_BYTES * STORAGE_GC_LOW_WATERMARK
+    tiers = (TIER_DERIVED, TIER_ACC_COPY, TIER_ORIGINAL) if STORAGE_EVICT_ORIGINALS else (TIER_DERIVED, TIER_ACC_COPY)
+    with _index() as conn:
+        candidates = conn.execute(
+            'SELECT store, filename, size FROM files WHERE evicted = 0 AND last_access < ?'
+            f" AND tier IN ({','.join('?' * len(tiers))}) ORDER BY tier, last_access",
+            (started - min_idle_seconds, *tiers)
+        ).fetchall()
+    initial = used
+    evicted = 0
+    for store_name, filename, _ in candidates:
+        if used <= target_bytes:
+            break
+        store = _stores.get(store_name)
+        if store is None:
+            continue
+        if not store.evict(filename):
+            continue  # ya se borró junto con el archivo del que se deriva
+        evicted += 1
+        # Se relee del índice: on_evict puede haber borrado también archivos derivados.
+        used = used_bytes()
+    freed = initial - used
+    _last_gc.update(at=time.time(), duration=round(time.time() - started, 3), evicted=evicted, freed_bytes=freed)
+    if evicted:
+        print(f"[storage] {evicted} archivos borrados ({freed / 1024 ** 2:.1f} MB liberados)")
+    if used > target_bytes:
+        print(f"[storage] Aviso: {used / 1024 ** 2:.1f} MB en uso; no quedan archivos fríos que borrar")
+    return evicted
+
+
+def _run():
+    for store in list(_stores.values()):
+        try:
+            print(f"[storage] {store.name}: {store.reconcile()} archivos indexados")
+        except OSError as e:
+            print(f"[storage] No se pudo reconciliar {store.name}: {e}")
+    while True:
+        _wakeup.clear()
+        try:
+            collect_garbage()
+        except Exception as e:
+            print(f"[storage] Error en el recolector: {e}")
+        _wakeup.wait(STORAGE_GC_INTERVAL)
+
+
+def start_storage_gc():
+    """Arranca el hilo de reconciliación y recolección (una vez por proceso)."""
+    global _thread
+    if _thread is not None:
+        return
+    _thread = threading.Thread(target=_run, name='storage-gc', daemon=True)
+    _thread.start()
+
+
+def usage_stats():
+    with _index() as conn:
+        rows = conn.execute(
+            'SELECT store, tier, COUNT(*), SUM(size), MIN(last_access) FROM files'
+            ' WHERE evicted = 0 GROUP BY store, tier'
+        ).fetchall()
+        evicted = conn.execute('SELECT store, COUNT(*) FROM files WHERE evicted = 1 GROUP BY store').fetchall()
+    now = time.time()
+    stores = {name: {'files': 0, 'bytes': 0, 'tiers': {}, 'evicted_acc_copies': 0} for name in _stores}
+    for store_name, tier, count, size, oldest_access in rows:
+        store = stores.setdefault(store_name, {'files': 0, 'bytes': 0, 'tiers': {}, 'evicted_acc_copies': 0})
+        store['files'] += count
+        store['bytes'] += size
+        store['tiers'][TIER_NAMES.get(tier, str(tier))] = {
+            'files': count,
+            'bytes': size,
+            'oldest_access_days': round((now - oldest_access) / 86400, 1),
+        }
+    for store_name, count in evicted:
+        stores.setdefault(store_name, {'files': 0, 'bytes': 0, 'tiers': {}, 'evicted_acc_copies': 0})
+        stores[store_name]['evicted_acc_copies'] = count
+    used = sum(store['bytes'] for store in stores.values())
+    return {
+        'quota_bytes': STORAGE_QUOTA_BYTES,
+        'used_bytes': used,
+        'free_bytes': max(STORAGE_QUOTA_BYTES - used, 0),
+        'usage_ratio': round(used / STORAGE_QUOTA_BYTES, 4) if STORAGE_QUOTA_BYTES else None,
+        'evict_originals': STORAGE_EVICT_ORIGINALS,
+        'stores': stores,
+        'last_gc': dict(_last_gc),
+    }
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import aps
+import cache_invalidation
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_invalidation, 'CACHE_INVALIDATION_DB_PATH', str(tmp_path / 'invalidations.sqlite3'))
+    monkeypatch.setattr(cache_invalidation, 'CACHE_INVALIDATION_POLL_SECONDS', 0)
+    monkeypatch.setattr(cache_invalidation, '_last_id', None)
+    monkeypatch.setattr(cache_invalidation, '_own_ids', set())
+    monkeypatch.setattr(cache_invalidation, '_next_poll', 0.0)
+
+
+def publish_from_other_worker(*endpoints):
+    """Lo que haría publish() en otro proceso: filas nuevas que este no ha publicado."""
+    with cache_invalidation._db() as conn:
+        for endpoint in endpoints:
+            conn.execute('INSERT INTO invalidations (endpoint, created) VALUES (?, ?)', (endpoint, time.time()))
+
+
+def test_first_poll_only_records_the_position():
+    publish_from_other_worker('data/v1/a')
+    assert cache_invalidation.pending() == []
+    publish_from_other_worker('data/v1/b', 'data/v1/b', 'data/v1/c')
+    assert cache_invalidation.pending() == ['data/v1/b', 'data/v1/c']
+    assert cache_invalidation.pending() == []
+
+
+def test_own_events_are_not_applied_twice():
+    cache_invalidation.pending()
+    cache_invalidation.publish(['data/v1/mine'])
+    publish_from_other_worker('data/v1/theirs')
+    assert cache_invalidation.pending() == ['data/v1/theirs']
+    assert cache_invalidation._own_ids == set()
+
+
+def test_polls_are_throttled(monkeypatch):
+    monkeypatch.setattr(cache_invalidation, 'CACHE_INVALIDATION_POLL_SECONDS', 3600)
+    cache_invalidation.pending()
+    publish_from_other_worker('data/v1/a')
+    assert cache_invalidation.pending() == []
+
+
+def test_old_events_are_pruned_on_publish():
+    with cache_invalidation._db() as conn:
+        conn.execute('INSERT INTO invalidations (endpoint, created) VALUES (?, ?)', ('viejo', 0))
+    cache_invalidation.publish(['nuevo'])
+    with cache_invalidation._db() as conn:
+        assert [row[0] for row in conn.execute('SELECT endpoint FROM invalidations')] == ['nuevo']
+
+
+def test_remote_invalidation_evicts_endpoint_and_projections(monkeypatch):
+    monkeypatch.setattr(aps, 'cache', aps.ByteLRUCache(key_group=aps.key_group))
+    monkeypatch.setattr(aps, '_projection_keys', {})
+    refreshed = []
+    monkeypatch.setattr(aps, 'invalidation_listeners', [refreshed.append])
+    endpoint = 'data/v1/projects/b.1/folders/f/contents'
+    aps.cache.set(endpoint, {'data': []})
+    aps.cache.set(f'{endpoint}?fields:x', {'data': []})
+    aps._projection_keys[endpoint] = {f'{endpoint}?fields:x'}
+    aps.cache.set('data/v1/otro', {'data': []})
+
+    aps.apply_remote_invalidations()
+    publish_from_other_worker(endpoint)
+    aps.apply_remote_invalidations()
+
+    assert aps.cache.get(endpoint) is None
+    assert aps.cache.get(f'{endpoint}?fields:x') is None
+    assert aps.cache.get('data/v1/otro') is not None
+    assert refreshed == [endpoint]
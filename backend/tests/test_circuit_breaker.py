@@ -0,0 +1,137 @@
+import types
+
+import pytest
+import requests
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, guarded_request
+
+
+@pytest.fixture(autouse=True)
+def isolated_breakers(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, '_breakers', {})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    state = {'now': 1000.0}
+    monkeypatch.setattr(circuit_breaker, 'time', types.SimpleNamespace(time=lambda: state['now']))
+    return state
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Sustituye requests.request: cada llamada consume el siguiente resultado (status o excepción)."""
+    results = []
+    calls = []
+
+    def fake_request(method, url, **kwargs):
+        calls.append((method, url, kwargs))
+        result = results.pop(0)
+        if isinstance(result, BaseException):
+            raise result
+        return types.SimpleNamespace(status_code=result)
+
+    monkeypatch.setattr(circuit_breaker.requests, 'request', fake_request)
+    return types.SimpleNamespace(results=results, calls=calls)
+
+
+def breaker(family='data'):
+    return circuit_breaker.breaker_for(family)
+
+
+def trip(upstream):
+    """Abre el circuito de 'data' con tantos 5xx como marca el umbral."""
+    upstream.results[:0] = [500] * circuit_breaker.CIRCUIT_FAILURE_THRESHOLD
+    for _ in range(circuit_breaker.CIRCUIT_FAILURE_THRESHOLD):
+        guarded_request('GET', 'data/v1/x')
+    assert breaker().state == OPEN
+
+
+def test_families_from_urls():
+    assert circuit_breaker.endpoint_family('https://developer.api.autodesk.com/data/v1/projects/x') == 'data'
+    assert circuit_breaker.endpoint_family('oss/v2/buckets/b/objects') == 'oss'
+    assert circuit_breaker.endpoint_family('derivativeservice/v2/manifest') == 'modelderivative'
+    assert circuit_breaker.endpoint_family('https://example.com/otra') == 'other'
+
+
+def test_default_timeout_is_applied(upstream, clock):
+    upstream.results.append(200)
+    guarded_request('GET', 'data/v1/x')
+    assert upstream.calls[0][2]['timeout'] == circuit_breaker.APS_REQUEST_TIMEOUT
+
+
+def test_opens_after_threshold_and_fails_fast(upstream, clock):
+    threshold = circuit_breaker.CIRCUIT_FAILURE_THRESHOLD
+    upstream.results.extend([503] * (threshold - 1) + [requests.exceptions.ConnectionError('caído')])
+    for _ in range(threshold - 1):
+        guarded_request('GET', 'data/v1/x')
+    assert breaker().state == CLOSED
+    with pytest.raises(requests.exceptions.ConnectionError):
+        guarded_request('GET', 'data/v1/x')
+    assert breaker().state == OPEN
+    with pytest.raises(CircuitOpenError):
+        guarded_request('GET', 'data/v1/x')
+    assert len(upstream.calls) == threshold
+    # Otra familia no se ve afectada.
+    upstream.results.append(200)
+    guarded_request('GET', 'oss/v2/buckets')
+
+
+def test_client_errors_do_not_count(upstream, clock):
+    upstream.results.extend([404] * 10)
+    for _ in range(10):
+        guarded_request('GET', 'data/v1/x')
+    assert breaker().state == CLOSED
+
+
+def test_half_open_lets_one_probe_through(upstream, clock):
+    trip(upstream)
+    clock['now'] += circuit_breaker.CIRCUIT_RECOVERY_SECONDS
+    breaker().before_call()  # la prueba queda en curso
+    assert breaker().state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        guarded_request('GET', 'data/v1/x')
+    breaker().record_success()
+    assert breaker().state == CLOSED
+
+
+def test_failed_probe_reopens(upstream, clock):
+    upstream.results.append(500)
+    trip(upstream)
+    clock['now'] += circuit_breaker.CIRCUIT_RECOVERY_SECONDS
+    guarded_request('GET', 'data/v1/x')
+    assert breaker().state == OPEN
+    with pytest.raises(CircuitOpenError):
+        guarded_request('GET', 'data/v1/x')
+
+
+def test_unexpected_exception_in_probe_does_not_block_the_family(upstream, clock):
+    upstream.results.extend([ValueError('respuesta ilegible'), 200])
+    trip(upstream)
+    clock['now'] += circuit_breaker.CIRCUIT_RECOVERY_SECONDS
+    with pytest.raises(ValueError):
+        guarded_request('GET', 'data/v1/x')
+    assert breaker().state == OPEN and not breaker().probe_in_flight
+    clock['now'] += circuit_breaker.CIRCUIT_RECOVERY_SECONDS
+    guarded_request('GET', 'data/v1/x')
+    assert breaker().state == CLOSED
+
+
+def test_interrupted_probe_frees_the_slot(upstream, clock):
+    upstream.results.extend([KeyboardInterrupt(), 200])
+    trip(upstream)
+    clock['now'] += circuit_breaker.CIRCUIT_RECOVERY_SECONDS
+    with pytest.raises(KeyboardInterrupt):
+        guarded_request('GET', 'data/v1/x')
+    assert breaker().state == HALF_OPEN and not breaker().probe_in_flight
+    guarded_request('GET', 'data/v1/x')
+    assert breaker().state == CLOSED
+
+
+def test_breaker_states_snapshot(upstream, clock):
+    trip(upstream)
+    clock['now'] += 5
+    assert circuit_breaker.breaker_states() == {
+        'data': {'state': OPEN, 'failures': circuit_breaker.CIRCUIT_FAILURE_THRESHOLD, 'open_for': 5.0}
+    }
@@ -0,0 +1,57 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+import compression
+
+orjson = pytest.importorskip('orjson')
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    compression.init_compression(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify({'data': [{'name': 'plano', 'n': i} for i in range(200)]})
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    return app
+
+
+def test_orjson_provider_is_used(app):
+    assert isinstance(app.json, compression.ORJSONProvider)
+
+
+def test_dumps_honours_sort_keys_and_indent(app):
+    data = {'b': 1, 'a': {'d': 2, 'c': 3}}
+    assert app.json.dumps(data) == '{"a":{"c":3,"d":2},"b":1}'  # sort_keys por defecto en Flask
+    assert app.json.dumps(data, sort_keys=False) == '{"b":1,"a":{"d":2,"c":3}}'
+    assert app.json.dumps(data, indent=2) == json.dumps(data, indent=2, sort_keys=True)
+
+
+def test_dumps_falls_back_for_options_orjson_lacks(app):
+    data = {'b': 1, 'a': [1, 2]}
+    assert app.json.dumps(data, indent=4) == json.dumps(data, indent=4, sort_keys=True)
+    assert app.json.dumps(data, separators=(', ', ': ')) == json.dumps(data, separators=(', ', ': '), sort_keys=True)
+    assert json.loads(app.json.dumps({1: 'clave no str'})) == {'1': 'clave no str'}
+
+
+def test_large_json_is_gzipped(app):
+    response = app.test_client().get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(json.loads(gzip.decompress(response.data))['data']) == 200
+
+
+def test_small_or_unaccepted_responses_are_left_alone(app):
+    client = app.test_client()
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/big', headers={'Accept-Encoding': 'identity'}).headers
+    assert 'Content-Encoding' not in client.get('/big', headers={'Accept-Encoding': 'gzip;q=0'}).headers
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import types
+
+import pytest
+
+import derivative_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivative_cache, 'DERIVATIVE_CACHE_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado: cada lectura avanza un segundo, así el orden de acceso es estable."""
+    state = {'now': 1000.0}
+
+    def now():
+        state['now'] += 1
+        return state['now']
+
+    monkeypatch.setattr(derivative_cache, 'time', types.SimpleNamespace(time=now))
+    return state
+
+
+def put(key, data, content_type='application/octet-stream'):
+    with derivative_cache._index():
+        pass  # crea la carpeta de objetos
+    tmp_path = os.path.join(derivative_cache.DERIVATIVE_CACHE_FOLDER, f'{len(data)}-{key.replace("/", "_")}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    return derivative_cache._store(key, tmp_path, hashlib.sha256(data).hexdigest(), len(data), content_type)
+
+
+def stored_keys():
+    with derivative_cache._index() as conn:
+        return sorted(key for (key,) in conn.execute('SELECT key FROM entries'))
+
+
+def test_store_and_lookup_round_trip(clock):
+    entry = put('modelderivative/v2/designdata/a/manifest', b'{"status": "success"}', 'application/json')
+    found = derivative_cache.lookup('modelderivative/v2/designdata/a/manifest')
+    assert found['digest'] == entry['digest']
+    assert found['content_type'] == 'application/json'
+    with open(found['path'], 'rb') as f:
+        assert f.read() == b'{"status": "success"}'
+
+
+def test_budget_evicts_least_recently_accessed(clock):
+    put('a', b'a' * 10)
+    put('b', b'b' * 10)
+    put('c', b'c' * 10)
+    derivative_cache.lookup('a')  # 'a' pasa a ser la más reciente
+    assert derivative_cache.enforce_budget(max_bytes=20) == 1
+    assert stored_keys() == ['a', 'c']
+
+
+def test_budget_never_evicts_kept_key(clock):
+    put('old', b'o' * 10)
+    put('new', b'n' * 50)
+    derivative_cache.enforce_budget(max_bytes=20, keep=('new',))
+    assert stored_keys() == ['new']
+    assert derivative_cache.lookup('new') is not None
+
+
+def test_store_protects_the_entry_it_just_wrote(clock, monkeypatch):
+    calls = []
+    monkeypatch.setattr(derivative_cache, 'enforce_budget', lambda **kwargs: calls.append(kwargs))
+    put('fresh', b'x')
+    assert calls == [{'keep': ('fresh',)}]
+
+
+def test_shared_content_is_kept_while_referenced(clock):
+    put('first', b'same bytes')
+    put('other', b'z' * 100)
+    entry = put('second', b'same bytes')
+    derivative_cache.enforce_budget(max_bytes=105)
+    # 'first' sale del índice sin liberar nada (su objeto lo usa 'second') y
+    # hace falta expulsar también 'other' para bajar del presupuesto.
+    assert stored_keys() == ['second']
+    assert os.path.exists(entry['path'])
+    assert derivative_cache.lookup('second') is not None
+
+
+def test_missing_object_is_a_cache_miss(clock):
+    entry = put('gone', b'data')
+    os.remove(entry['path'])
+    assert derivative_cache.lookup('gone') is None
+    assert 'gone' not in stored_keys()
+
+
+def test_stats_counts_unique_bytes(clock):
+    put('a', b'dup')
+    put('b', b'dup')
+    put('c', b'12345')
+    stats = derivative_cache.stats()
+    assert stats['entries'] == 3
+    assert stats['logical_bytes'] == 11
+    assert stats['stored_bytes'] == 8
+
+
+def test_allowed_paths():
+    assert derivative_cache.is_allowed_path('modelderivative/v2/designdata/abc/manifest')
+    assert not derivative_cache.is_allowed_path('modelderivative/v2/designdata/../../etc/passwd')
+    assert not derivative_cache.is_allowed_path('oss/v2/buckets/x')
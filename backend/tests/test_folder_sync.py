@@ -0,0 +1,118 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import folder_sync
+from folder_sync import changes_since, format_time, parse_time, sync_folder
+
+ENDPOINT = folder_sync.contents_endpoint('b.1', 'f')
+
+
+def item(item_id, modified, hidden=False, name=None):
+    return {
+        'type': 'items',
+        'id': item_id,
+        'attributes': {'displayName': name or item_id, 'lastModifiedTime': modified, 'hidden': hidden},
+    }
+
+
+@pytest.fixture
+def aps(monkeypatch):
+    """APS y aps.cache falsos: `responses` son las páginas que devuelve APS, en orden."""
+    state = {'responses': [], 'requests': [], 'cache': {}, 'invalidated': []}
+
+    def fetch(endpoint, token, params=None):
+        state['requests'].append((endpoint, params))
+        return state['responses'].pop(0), None
+
+    monkeypatch.setattr(folder_sync, 'FOLDER_SYNC', {})
+    monkeypatch.setattr(folder_sync, 'fetch_api_data', fetch)
+    monkeypatch.setattr(folder_sync, 'set_api_data', lambda endpoint, data: state['cache'].__setitem__(endpoint, data))
+    monkeypatch.setattr(folder_sync, 'invalidate_api_data', state['invalidated'].append)
+    return state
+
+
+def page(data, next_href=None):
+    document = {'jsonapi': {'version': '1.0'}, 'links': {'self': {'href': ENDPOINT}}, 'data': data}
+    if next_href:
+        document['links']['next'] = {'href': next_href}
+    return document
+
+
+def test_parse_and_format_time():
+    parsed = parse_time('2026-01-02T03:04:05.1234567Z')
+    assert parsed == datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc)
+    assert format_time(parsed) == '2026-01-02T03:04:05.123Z'
+    assert parse_time('2026-01-02T03:04:05+02:00') == datetime(2026, 1, 2, 1, 4, 5, tzinfo=timezone.utc)
+    assert parse_time('no es una fecha') is None
+    assert parse_time(None) is None
+
+
+def test_first_sync_reads_every_page_and_caches_the_raw_first_page(aps):
+    first = page([item('a', '2026-01-01T00:00:00.000Z')], next_href='https://aps/page2')
+    aps['responses'] += [first, page([item('b', '2026-01-03T00:00:00.000Z')])]
+    state, error = sync_folder('b.1', 'f', 'token')
+    assert error is None
+    assert sorted(state['entries']) == ['a', 'b']
+    assert format_time(state['watermark']) == '2026-01-03T00:00:00.000Z'
+    # La caché guarda la página 1 tal cual (misma forma que get_api_data y el precalentador).
+    assert aps['cache'] == {ENDPOINT: first}
+    assert aps['requests'][1] == ('https://aps/page2', None)
+
+
+def test_incremental_sync_asks_only_for_changes(aps):
+    aps['responses'].append(page([item('a', '2026-01-01T00:00:00.000Z')]))
+    sync_folder('b.1', 'f', 'token')
+    aps['responses'].append(page([
+        item('a', '2026-01-01T00:00:00.000Z'),
+        item('c', '2026-01-05T00:00:00.000Z'),
+    ]))
+    state, _ = sync_folder('b.1', 'f', 'token')
+    assert aps['requests'][-1][1] == {
+        'filter[lastModifiedTime]-ge': '2026-01-01T00:00:00.000Z',
+        'includeHidden': 'true',
+    }
+    assert sorted(state['entries']) == ['a', 'c']
+    assert aps['invalidated'] == [ENDPOINT]
+
+
+def test_unchanged_delta_keeps_the_cached_page(aps):
+    aps['responses'].append(page([item('a', '2026-01-01T00:00:00.000Z')]))
+    sync_folder('b.1', 'f', 'token')
+    # El filtro -ge devuelve otra vez el elemento de la marca de agua, sin cambios.
+    aps['responses'].append(page([item('a', '2026-01-01T00:00:00.000Z')]))
+    sync_folder('b.1', 'f', 'token')
+    assert aps['invalidated'] == []
+
+
+def test_hidden_items_are_reported_as_deleted(aps):
+    aps['responses'].append(page([item('a', '2026-01-01T00:00:00.000Z'), item('b', '2026-01-01T00:00:00.000Z')]))
+    sync_folder('b.1', 'f', 'token')
+    aps['responses'].append(page([item('b', '2026-01-02T00:00:00.000Z', hidden=True)]))
+    state, _ = sync_folder('b.1', 'f', 'token')
+    assert sorted(state['entries']) == ['a']
+    assert aps['invalidated'] == [ENDPOINT]
+    changes = changes_since(state, parse_time('2026-01-01T12:00:00Z'))
+    assert changes['deleted'] == ['b']
+    assert changes['data'] == []
+
+
+def test_changes_since(aps):
+    aps['responses'].append(page([
+        item('viejo', '2026-01-01T00:00:00.000Z'),
+        item('nuevo', '2026-01-10T00:00:00.000Z'),
+    ]))
+    state, _ = sync_folder('b.1', 'f', 'token')
+    full = changes_since(state, None)
+    assert full['full'] is True and len(full['data']) == 2
+    delta = changes_since(state, parse_time('2026-01-05T00:00:00Z'))
+    assert [resource['id'] for resource in delta['data']] == ['nuevo']
+    assert delta['watermark'] == '2026-01-10T00:00:00.000Z'
+
+
+def test_errors_leave_the_state_untouched(aps, monkeypatch):
+    monkeypatch.setattr(folder_sync, 'fetch_api_data', lambda *args, **kwargs: (None, '503 Service Unavailable'))
+    state, error = sync_folder('b.1', 'f', 'token')
+    assert state is None and error == '503 Service Unavailable'
+    assert folder_sync.FOLDER_SYNC == {}
+    assert aps['cache'] == {} and aps['invalidated'] == []
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from jsonapi import fields_cache_key, parse_fields, project_document
+
+DOCUMENT = {
+    'jsonapi': {'version': '1.0'},
+    'links': {'self': {'href': 'https://aps/folders/f/contents'}},
+    'data': [
+        {
+            'type': 'items',
+            'id': 'urn:item:1',
+            'attributes': {'displayName': 'plano.pdf', 'createTime': '2026-01-01', 'extension': {'type': 'x'}},
+            'links': {'self': {'href': 'https://aps/items/1'}},
+            'relationships': {
+                'tip': {'data': {'type': 'versions', 'id': 'urn:v:1'}, 'links': {'related': {}}},
+                'parent': {'data': {'type': 'folders', 'id': 'f'}},
+            },
+        },
+        {
+            'type': 'folders',
+            'id': 'f2',
+            'attributes': {'displayName': 'Sub', 'objectCount': 3},
+        },
+    ],
+    'included': [
+        {'type': 'versions', 'id': 'urn:v:1', 'attributes': {'versionNumber': 4, 'storageSize': 10}},
+    ],
+    'meta': {'refresh': True},
+}
+
+
+def test_parse_fields_global_and_per_type():
+    args = MultiDict([
+        ('fields', 'displayName, lastModifiedTime'),
+        ('fields[versions]', 'versionNumber'),
+        ('fields[versions]', 'links'),
+        ('fields[]', 'ignorado'),
+        ('otro', 'x'),
+    ])
+    assert parse_fields(args) == {
+        '*': {'displayName', 'lastModifiedTime'},
+        'versions': {'versionNumber', 'links'},
+    }
+
+
+def test_parse_fields_without_projection():
+    assert parse_fields(MultiDict()) is None
+    assert parse_fields(MultiDict([('fields', ' , ')])) is None
+
+
+def test_cache_key_is_canonical():
+    a = fields_cache_key({'versions': {'b', 'a'}, '*': {'z'}})
+    b = fields_cache_key({'*': {'z'}, 'versions': {'a', 'b'}})
+    assert a == b == 'fields:*=z;versions=a,b'
+
+
+def test_projection_keeps_requested_attributes_links_and_relationships():
+    projected = project_document(DOCUMENT, {'items': {'displayName', 'tip', 'links'}})
+    item = projected['data'][0]
+    assert item == {
+        'type': 'items',
+        'id': 'urn:item:1',
+        'attributes': {'displayName': 'plano.pdf'},
+        'relationships': {'tip': {'data': {'type': 'versions', 'id': 'urn:v:1'}}},
+        'links': {'self': {'href': 'https://aps/items/1'}},
+    }
+    # Los tipos sin proyección quedan intactos, igual que meta.
+    assert projected['data'][1] == DOCUMENT['data'][1]
+    assert projected['included'] == DOCUMENT['included']
+    assert projected['meta'] == DOCUMENT['meta']
+    # Los bloques de nivel superior que no son data/included/meta se descartan.
+    assert 'links' not in projected and 'jsonapi' not in projected
+
+
+def test_wildcard_applies_to_every_type_unless_overridden():
+    projected = project_document(DOCUMENT, {'*': {'displayName'}, 'versions': {'versionNumber'}})
+    assert projected['data'][1]['attributes'] == {'displayName': 'Sub'}
+    assert projected['included'][0]['attributes'] == {'versionNumber': 4}
+
+
+def test_single_resource_document():
+    document = {'data': DOCUMENT['included'][0]}
+    assert project_document(document, {'versions': {'storageSize'}}) == {
+        'data': {'type': 'versions', 'id': 'urn:v:1', 'attributes': {'storageSize': 10}}
+    }
+
+
+def test_projection_does_not_mutate_the_cached_document():
+    before = json.dumps(DOCUMENT, sort_keys=True)
+    project_document(DOCUMENT, {'*': {'displayName'}})
+    assert json.dumps(DOCUMENT, sort_keys=True) == before
+
+
+@pytest.mark.parametrize('document', [None, [], 'texto', {'data': []}])
+def test_non_documents_and_empty_fields_pass_through(document):
+    assert project_document(document, {'*': {'x'}}) == document
+    assert project_document(document, None) is document
@@ -0,0 +1,118 @@
+import types
+
+import pytest
+
+import lru_cache
+from lru_cache import ByteLRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado: avanza solo cuando el test lo mueve."""
+    state = {'now': 1000.0}
+    monkeypatch.setattr(lru_cache, 'time', types.SimpleNamespace(time=lambda: state['now']))
+    return state
+
+
+def entry_size(value):
+    """Bytes que ocupa un valor sin comprimir (lo que cuenta para el presupuesto)."""
+    probe = ByteLRUCache(compress_min_bytes=10 ** 9)
+    probe.set('k', value)
+    return probe.stats()['bytes']
+
+
+def test_set_get_round_trip(clock):
+    cache = ByteLRUCache()
+    cache.set('a', {'data': [1, 2, 3]})
+    assert cache.get('a') == {'data': [1, 2, 3]}
+    assert cache.get('missing') is None
+    assert cache.has('a') and not cache.has('missing')
+
+
+def test_evicts_least_recently_used_by_bytes(clock):
+    size = entry_size('x' * 100)
+    cache = ByteLRUCache(max_bytes=size * 2, compress_min_bytes=10 ** 9)
+    cache.set('a', 'x' * 100)
+    cache.set('b', 'y' * 100)
+    cache.get('a')  # 'a' pasa a ser la más reciente
+    cache.set('c', 'z' * 100)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+
+def test_expired_entries_are_dropped_before_live_ones(clock):
+    size = entry_size('x' * 100)
+    cache = ByteLRUCache(max_bytes=size * 2, compress_min_bytes=10 ** 9)
+    cache.set('fresh', 'x' * 100, timeout=1000)
+    cache.set('short', 'y' * 100, timeout=10)
+    clock['now'] += 11
+    cache.set('new', 'z' * 100)
+    assert cache.get('fresh') is not None
+    assert cache.get('new') is not None
+
+
+def test_ttl_expiry(clock):
+    cache = ByteLRUCache()
+    cache.set('a', 1, timeout=10)
+    cache.set('forever', 2, timeout=0)
+    clock['now'] += 9
+    assert cache.get('a') == 1
+    clock['now'] += 1
+    assert cache.get('a') is None
+    assert not cache.has('a')
+    clock['now'] += 10 ** 6
+    assert cache.get('forever') == 2
+
+
+def test_value_larger_than_budget_is_not_stored(clock):
+    cache = ByteLRUCache(max_bytes=64, compress_min_bytes=10 ** 9)
+    cache.set('big', 'small')
+    assert cache.set('big', 'x' * 1000) is False
+    assert cache.get('big') is None  # tampoco queda la versión anterior
+    assert cache.stats()['bytes'] == 0
+
+
+def test_large_values_are_compressed(clock):
+    cache = ByteLRUCache(compress_min_bytes=100)
+    value = {'data': ['repetido'] * 1000}
+    cache.set('a', value)
+    stats = cache.stats()['groups']['a']
+    assert stats['bytes'] < stats['raw_bytes']
+    assert cache.get('a') == value
+
+
+def test_delete_and_get_many(clock):
+    cache = ByteLRUCache()
+    cache.set_many({'a': 1, 'b': 2, 'c': 3})
+    assert cache.delete('b') is True
+    assert cache.delete('b') is False
+    assert cache.get_many('a', 'b', 'c') == [1, None, 3]
+    assert cache.get_dict('a', 'c') == {'a': 1, 'c': 3}
+
+
+def test_add_does_not_overwrite(clock):
+    cache = ByteLRUCache()
+    assert cache.add('a', 1) is True
+    assert cache.add('a', 2) is False
+    assert cache.get('a') == 1
+
+
+def test_stats_group_keys_and_count_hits(clock):
+    cache = ByteLRUCache(key_group=lambda key: key.split('/')[0])
+    cache.set('folders/1', 'a')
+    cache.set('folders/2', 'b')
+    cache.get('folders/1')
+    cache.get('folders/3')
+    group = cache.stats()['groups']['folders']
+    assert group['entries'] == 2
+    assert (group['hits'], group['misses']) == (1, 1)
+    assert group['hit_ratio'] == 0.5
+
+
+def test_clear(clock):
+    cache = ByteLRUCache()
+    cache.set('a', 1)
+    cache.clear()
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
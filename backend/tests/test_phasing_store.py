@@ -0,0 +1,190 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+import phasing_store
+from phasing_store import (
+    PhasingError, decode_runs, encode_runs, intersect_runs, subtract_runs, to_runs, union_runs
+)
+
+
+@pytest.fixture(autouse=True)
+def phasing_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(phasing_store, 'PHASING_DB_PATH', str(tmp_path / 'phasing.sqlite3'))
+
+
+def ids(runs):
+    return set(phasing_store.runs_to_list(runs))
+
+
+def random_ids(rng, size=200, span=400):
+    return {rng.randrange(span) for _ in range(size)}
+
+
+def test_to_runs_sorts_merges_and_drops_duplicates():
+    assert to_runs([5, 1, 2, 3, 3, 9, 10]) == [(1, 3), (5, 1), (9, 2)]
+    assert to_runs([]) == []
+    assert to_runs([0]) == [(0, 1)]
+
+
+@pytest.mark.parametrize('bad', [[-1], [2.7], [True], ['3'], [None]])
+def test_to_runs_rejects_non_integer_or_negative_ids(bad):
+    with pytest.raises(PhasingError):
+        to_runs(bad)
+
+
+def test_encode_decode_round_trip():
+    runs = [(0, 2), (5, 1), (7, 100), (1000000, 3)]
+    flat = encode_runs(runs)
+    assert flat == [0, 2, 3, 1, 1, 100, 1000000 - 107, 3]
+    assert decode_runs(flat) == runs
+
+
+@pytest.mark.parametrize('flat', [
+    [1],            # número impar de elementos
+    [1, 2, 3],
+    [0, 0],         # run vacío
+    [-1, 2],        # hueco negativo
+    [0, 2, 0, 3],   # runs contiguos sin fusionar
+    [0, 2.5],
+    [True, 1],
+    'ab',
+])
+def test_decode_rejects_malformed_runs(flat):
+    with pytest.raises(PhasingError):
+        decode_runs(flat)
+
+
+def test_pack_round_trip_with_large_values():
+    runs = to_runs([0, 1, 127, 128, 129, 2 ** 31, 2 ** 40 + 5])
+    assert phasing_store._unpack(phasing_store._pack(runs)) == runs
+
+
+def test_set_operations_match_python_sets():
+    rng = random.Random(42)
+    for _ in range(200):
+        a, b, c = random_ids(rng), random_ids(rng), random_ids(rng)
+        ra, rb, rc = to_runs(a), to_runs(b), to_runs(c)
+        assert ids(union_runs(ra, rb, rc)) == a | b | c
+        assert ids(intersect_runs(ra, rb)) == a & b
+        assert ids(subtract_runs(ra, rb)) == a - b
+        # El resultado sigue siendo una lista de runs válida (ordenada y sin contiguos).
+        for result in (union_runs(ra, rb), intersect_runs(ra, rb), subtract_runs(ra, rb)):
+            assert decode_runs(encode_runs(result)) == result
+
+
+def test_set_operations_edge_cases():
+    assert union_runs() == []
+    assert union_runs([(0, 5)], [(5, 5)]) == [(0, 10)]
+    assert intersect_runs([(0, 5)], []) == []
+    assert intersect_runs([(0, 5)], [(5, 5)]) == []
+    assert subtract_runs([(0, 10)], [(2, 2), (6, 2)]) == [(0, 2), (4, 2), (8, 2)]
+    assert subtract_runs([(0, 10)], [(0, 10)]) == []
+    assert subtract_runs([], [(0, 10)]) == []
+
+
+@pytest.mark.parametrize('progress, date, expected', [
+    (100, '2026-03-20', 'finished'),
+    (50, '2026-03-20', 'late'),
+    (0, '2026-03-05', 'late'),
+    (40, '2026-03-05', 'inProgress'),
+    (100, '2026-03-05', 'advanced'),
+    (10, '2026-02-01', 'advanced'),
+    (0, '2026-02-01', 'notYetStarted'),
+])
+def test_task_status(progress, date, expected):
+    task = {'start': '2026-03-01', 'end': '2026-03-10', 'progress': progress}
+    reference = datetime.fromisoformat(date).replace(tzinfo=timezone.utc)
+    assert phasing_store.task_status(task, reference) == expected
+
+
+def test_task_status_without_dates():
+    assert phasing_store.task_status({'progress': 10}, datetime.now(timezone.utc)) is None
+
+
+def test_task_status_accepts_numeric_text_and_rejects_the_rest():
+    task = {'start': '2026-03-01', 'end': '2026-03-10'}
+    reference = datetime(2026, 3, 20, tzinfo=timezone.utc)
+    assert phasing_store.task_status({**task, 'progress': '100'}, reference) == 'finished'
+    for bad in ('mucho', 'nan', [50], True):
+        with pytest.raises(PhasingError):
+            phasing_store.task_status({**task, 'progress': bad}, reference)
+
+
+def save_sample():
+    tasks = [
+        {'id': 't1', 'start': '2026-01-01', 'end': '2026-01-10', 'progress': 100},
+        {'id': 't2', 'start': '2026-01-05', 'end': '2026-02-01', 'progress': 30},
+        {'id': 't3', 'start': '2026-03-01', 'end': '2026-03-10', 'progress': 0},
+    ]
+    objects = {
+        't1': [1, 2, 3, 4],
+        't2': {'runs': encode_runs([(3, 5)])},
+        't3': [20, 21],
+    }
+    return phasing_store.save_config('urn:m', 'Semana 3', tasks, objects)
+
+
+def test_save_and_load_config():
+    assert save_sample() == {'name': 'Semana 3', 'tasks': 3, 'dbids': 11}
+    config = phasing_store.load_config('urn:m', 'Semana 3')
+    assert [task['id'] for task in config['tasks']] == ['t1', 't2', 't3']
+    assert decode_runs(config['objects']['t2']['runs']) == [(3, 5)]
+    assert config['objects']['t1'] == {'runs': [1, 4], 'count': 4}
+    assert phasing_store.list_configs('urn:m')[0]['dbids'] == 11
+    assert phasing_store.load_config('urn:m', 'otra') is None
+
+
+def test_save_rejects_invalid_payloads():
+    with pytest.raises(PhasingError):
+        phasing_store.save_config('urn:m', 'x', {}, {})
+    with pytest.raises(PhasingError):
+        phasing_store.save_config('urn:m', 'x', [], {'t1': 'abc'})
+    with pytest.raises(PhasingError):
+        phasing_store.save_config('urn:m', 'x', [], {'t1': [-5]})
+    with pytest.raises(PhasingError):
+        phasing_store.save_config('urn:m', 'x', [{'id': 't1', 'progress': 'abc'}], {})
+    with pytest.raises(PhasingError):
+        phasing_store.save_config('urn:m', 'x', ['t1'], {})
+
+
+def test_visible_at_unions_by_status():
+    save_sample()
+    result = phasing_store.visible_at('urn:m', 'Semana 3', datetime(2026, 1, 20, tzinfo=timezone.utc))
+    statuses = {name: ids(decode_runs(value['runs'])) for name, value in result['statuses'].items()}
+    assert statuses['finished'] == {1, 2, 3, 4}
+    assert statuses['inProgress'] == {3, 4, 5, 6, 7}
+    assert statuses['notYetStarted'] == {20, 21}
+    assert ids(decode_runs(result['visible']['runs'])) == {1, 2, 3, 4, 5, 6, 7}
+    assert result['visible']['count'] == 7
+
+
+def test_set_operation_on_stored_tasks():
+    save_sample()
+    run = phasing_store.set_operation
+    assert ids(decode_runs(run('urn:m', 'Semana 3', 'union', ['t1', 't3'])['runs'])) == {1, 2, 3, 4, 20, 21}
+    assert ids(decode_runs(run('urn:m', 'Semana 3', 'intersection', ['t1', 't2'])['runs'])) == {3, 4}
+    assert ids(decode_runs(run('urn:m', 'Semana 3', 'difference', ['t2', 't1'])['runs'])) == {5, 6, 7}
+    assert run('urn:m', 'Semana 3', 'difference', ['t1'], [[1, 2, 3, 4]])['count'] == 0
+
+
+def test_set_operation_errors():
+    save_sample()
+    with pytest.raises(PhasingError) as missing_task:
+        phasing_store.set_operation('urn:m', 'Semana 3', 'union', ['nope'])
+    assert missing_task.value.status == 404
+    with pytest.raises(PhasingError) as missing_config:
+        phasing_store.set_operation('urn:m', 'otra', 'union', ['t1'])
+    assert missing_config.value.status == 404
+    with pytest.raises(PhasingError):
+        phasing_store.set_operation('urn:m', 'Semana 3', 'xor', ['t1'])
+    with pytest.raises(PhasingError):
+        phasing_store.set_operation('urn:m', 'Semana 3', 'union', [])
+
+
+def test_delete_config():
+    save_sample()
+    assert phasing_store.delete_config('urn:m', 'Semana 3')
+    assert not phasing_store.delete_config('urn:m', 'Semana 3')
+    assert phasing_store.list_configs('urn:m') == []
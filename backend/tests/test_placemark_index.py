@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+import placemark_index
+
+KML = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <Placemark>
+      <name>Buzón B-12</name>
+      <ExtendedData>
+        <Data name="material"><value>concreto</value></Data>
+      </ExtendedData>
+      <Point><coordinates>-81.27,-4.58,0</coordinates></Point>
+    </Placemark>
+    <Placemark>
+      <name>Colector principal</name>
+      <description>Tramo norte</description>
+      <LineString><coordinates>-81.30,-4.60,0 -81.20,-4.50,0</coordinates></LineString>
+    </Placemark>
+    <Placemark>
+      <name>Lote 7</name>
+      <ExtendedData>
+        <SchemaData><SimpleData name="zona">industrial</SimpleData></SchemaData>
+      </ExtendedData>
+      <Polygon>
+        <outerBoundaryIs><LinearRing>
+          <coordinates>10,10 11,10 11,11 10,11 10,10</coordinates>
+        </LinearRing></outerBoundaryIs>
+      </Polygon>
+    </Placemark>
+  </Document>
+</kml>
+"""
+
+
+@pytest.fixture(autouse=True)
+def index_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'placemarks.sqlite3')
+    monkeypatch.setattr(placemark_index, 'PLACEMARK_INDEX_PATH', path)
+    return path
+
+
+@pytest.fixture
+def kml_layer(tmp_path):
+    path = tmp_path / '20260101000000_drenaje.kml'
+    path.write_text(KML, encoding='utf-8')
+    return str(path)
+
+
+def fts_rows(index_path):
+    conn = sqlite3.connect(index_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM features_fts').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def names(features):
+    return sorted(feature['name'] for feature in features)
+
+
+def test_build_indexes_all_placemarks(kml_layer):
+    assert placemark_index.build_layer_index(kml_layer) == 3
+    assert placemark_index.list_layers() == [{'layer': os.path.basename(kml_layer), 'feature_count': 3}]
+
+
+def test_search_by_name_prefix_and_attributes(kml_layer):
+    placemark_index.build_layer_index(kml_layer)
+    assert names(placemark_index.search_features('colec')) == ['Colector principal']
+    assert names(placemark_index.search_features('concreto')) == ['Buzón B-12']
+    assert names(placemark_index.search_features('zona industrial')) == ['Lote 7']
+    assert placemark_index.search_features('inexistente') == []
+
+
+def test_search_ignores_fts_syntax_in_user_text(kml_layer):
+    placemark_index.build_layer_index(kml_layer)
+    assert placemark_index.search_features('lote" OR "x') == []
+    assert placemark_index.search_features('NEAR(') == []
+
+
+def test_search_by_bbox_and_layer(kml_layer):
+    placemark_index.build_layer_index(kml_layer)
+    layer = os.path.basename(kml_layer)
+    assert names(placemark_index.search_features(bbox=(9, 9, 12, 12))) == ['Lote 7']
+    assert names(placemark_index.search_features(bbox=(-81.25, -4.55, -81.0, -4.0))) == ['Colector principal']
+    assert len(placemark_index.search_features(layer=layer)) == 3
+    assert placemark_index.search_features(layer='otra.kml') == []
+
+
+def test_limit_is_clamped(kml_layer):
+    placemark_index.build_layer_index(kml_layer)
+    assert len(placemark_index.search_features(limit=0)) == 1
+    assert len(placemark_index.search_features(limit=10 ** 6)) == 3
+
+
+def test_get_feature_returns_geojson(kml_layer):
+    placemark_index.build_layer_index(kml_layer)
+    summary = placemark_index.search_features('lote')[0]
+    feature = placemark_index.get_feature(summary['id'])
+    assert feature['geometry']['type'] == 'Polygon'
+    assert feature['bbox'] == [10.0, 10.0, 11.0, 11.0]
+    assert feature['properties']['zona'] == 'industrial'
+    assert placemark_index.get_feature(10 ** 9) is None
+
+
+def test_reindex_does_not_duplicate_rows(kml_layer, index_path):
+    placemark_index.build_layer_index(kml_layer)
+    placemark_index.build_layer_index(kml_layer)
+    assert fts_rows(index_path) == 3
+    assert len(placemark_index.search_features('colector')) == 1
+
+
+def test_remove_layer_drops_features_and_fts_rows(kml_layer, index_path, tmp_path):
+    other = tmp_path / 'otra.kml'
+    other.write_text(KML, encoding='utf-8')
+    placemark_index.build_layer_index(kml_layer)
+    placemark_index.build_layer_index(str(other))
+    placemark_index.remove_layer(os.path.basename(kml_layer))
+    assert fts_rows(index_path) == 3
+    assert [layer['layer'] for layer in placemark_index.list_layers()] == ['otra.kml']
+    assert {f['layer'] for f in placemark_index.search_features('colector')} == {'otra.kml'}
+
+
+def test_ensure_layer_index_rebuilds_when_file_changes(kml_layer):
+    placemark_index.ensure_layer_index(kml_layer)
+    with open(kml_layer, 'w', encoding='utf-8') as f:
+        f.write(KML.replace('Lote 7', 'Lote 8'))
+    stat = os.stat(kml_layer)
+    os.utime(kml_layer, (stat.st_atime, stat.st_mtime + 10))
+    placemark_index.ensure_layer_index(kml_layer)
+    assert names(placemark_index.search_features('lote')) == ['Lote 8']
+
+
+def test_kmz_reads_doc_kml(tmp_path):
+    path = tmp_path / 'capa.kmz'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('files/readme.txt', 'sin placemarks')
+        archive.writestr('doc.kml', KML)
+    assert placemark_index.build_layer_index(str(path)) == 3
+
+
+def test_kmz_without_kml_is_rejected(tmp_path):
+    path = tmp_path / 'vacio.kmz'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('readme.txt', 'nada')
+    with pytest.raises(ValueError):
+        placemark_index.build_layer_index(str(path))
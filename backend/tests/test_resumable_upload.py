@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import io
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import process_lock
+import resumable_upload
+from resumable_upload import UploadError
+
+
+@pytest.fixture(autouse=True)
+def partial_folder(tmp_path, monkeypatch):
+    folder = tmp_path / 'partial'
+    folder.mkdir()
+    monkeypatch.setattr(resumable_upload, 'PARTIAL_UPLOAD_FOLDER', str(folder))
+    return folder
+
+
+def new_upload(data=b'', checksum=None):
+    return resumable_upload.create_upload('plano.pdf', len(data), 'documents', checksum)
+
+
+def send(upload, offset, data, chunk_checksum=None):
+    return resumable_upload.append_chunk(upload, offset, io.BytesIO(data), chunk_checksum)
+
+
+def test_chunks_are_appended_in_order_and_finalized(tmp_path):
+    data = b'0123456789'
+    upload = new_upload(data, hashlib.sha256(data).hexdigest())
+    assert send(upload, 0, data[:4]) == 4
+    assert resumable_upload.get_upload(upload['id'])['offset'] == 4
+    assert send(upload, 4, data[4:]) == 10
+    destination = tmp_path / 'final.pdf'
+    resumable_upload.finalize_upload(upload, str(destination))
+    assert destination.read_bytes() == data
+    assert resumable_upload.get_upload(upload['id']) is None
+    assert not os.listdir(resumable_upload.PARTIAL_UPLOAD_FOLDER)
+
+
+def test_wrong_offset_is_a_conflict():
+    upload = new_upload(b'abcdef')
+    send(upload, 0, b'abc')
+    with pytest.raises(UploadError) as error:
+        send(upload, 0, b'abc')
+    assert error.value.status == 409
+
+
+def test_chunk_beyond_length_is_rejected_and_truncated():
+    upload = new_upload(b'abc')
+    with pytest.raises(UploadError) as error:
+        send(upload, 0, b'abcdef')
+    assert error.value.status == 413
+    assert resumable_upload.get_upload(upload['id'])['offset'] == 0
+
+
+def test_chunk_checksum_mismatch_is_rolled_back():
+    upload = new_upload(b'abcdef')
+    send(upload, 0, b'abc')
+    checksum = resumable_upload.parse_checksum_header('sha1 ' + base64.b64encode(hashlib.sha1(b'xyz').digest()).decode())
+    with pytest.raises(UploadError) as error:
+        send(upload, 3, b'def', checksum)
+    assert error.value.status == 460
+    assert resumable_upload.get_upload(upload['id'])['offset'] == 3
+
+
+def test_finalize_checks_size_and_checksum(tmp_path):
+    upload = new_upload(b'abc', hashlib.sha256(b'xyz').hexdigest())
+    send(upload, 0, b'ab')
+    with pytest.raises(UploadError) as incomplete:
+        resumable_upload.finalize_upload(upload, str(tmp_path / 'a'))
+    assert incomplete.value.status == 409
+    send(upload, 2, b'c')
+    with pytest.raises(UploadError) as mismatch:
+        resumable_upload.finalize_upload(upload, str(tmp_path / 'a'))
+    assert mismatch.value.status == 460
+
+
+def test_second_finalize_is_not_found(tmp_path):
+    upload = new_upload(b'abc')
+    send(upload, 0, b'abc')
+    resumable_upload.finalize_upload(dict(upload), str(tmp_path / 'a'))
+    with pytest.raises(UploadError) as error:
+        resumable_upload.finalize_upload(dict(upload), str(tmp_path / 'b'))
+    assert error.value.status == 404
+    with pytest.raises(UploadError):
+        send(upload, 3, b'')
+
+
+def test_writes_wait_for_the_lock_held_by_another_process():
+    upload = new_upload(b'abc')
+    lock_path = resumable_upload._lock_path(upload['id'])
+    holder = subprocess.Popen(
+        [sys.executable, '-c',
+         'import sys, process_lock\n'
+         f'with process_lock.locked({lock_path!r}):\n'
+         '    print("held", flush=True)\n'
+         '    sys.stdin.readline()\n'],
+        cwd=os.path.dirname(process_lock.__file__), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert holder.stdout.readline().strip() == 'held'
+        done = threading.Event()
+        worker = threading.Thread(target=lambda: (send(upload, 0, b'abc'), done.set()))
+        worker.start()
+        assert not done.wait(0.3)
+        holder.stdin.write('\n')
+        holder.stdin.flush()
+        assert done.wait(5)
+        worker.join()
+    finally:
+        holder.kill()
+        holder.wait()
+    assert resumable_upload.get_upload(upload['id'])['offset'] == 3
+
+
+@pytest.mark.parametrize('value, expected', [(0, 0), (10, 10), ('42', 42)])
+def test_parse_size_accepts_non_negative_integers(value, expected):
+    assert resumable_upload.parse_size(value) == expected
+
+
+@pytest.mark.parametrize('value', [True, False, 1.5, 10.0, -1, '-1', '+1', ' 1', '1e3', '', '١٢', None, [1]])
+def test_parse_size_rejects_everything_else(value):
+    with pytest.raises(UploadError) as error:
+        resumable_upload.parse_size(value)
+    assert error.value.status == 400
+
+
+def test_create_upload_validates_length_and_checksum():
+    with pytest.raises(UploadError):
+        resumable_upload.create_upload('a.pdf', True, 'documents')
+    with pytest.raises(UploadError) as too_big:
+        resumable_upload.create_upload('a.pdf', resumable_upload.MAX_UPLOAD_BYTES + 1, 'documents')
+    assert too_big.value.status == 413
+    with pytest.raises(UploadError):
+        resumable_upload.create_upload('a.pdf', 3, 'documents', 'abc')
+    upload = resumable_upload.create_upload('a.pdf', 3, 'documents', '')
+    assert upload['checksum'] is None
+
+
+def test_cleanup_removes_abandoned_uploads_and_orphan_locks():
+    upload = new_upload(b'abc')
+    with process_lock.locked(os.path.join(resumable_upload.PARTIAL_UPLOAD_FOLDER, 'huerfano.lock')):
+        pass
+    assert resumable_upload.cleanup_stale_uploads(max_age=3600) == 0
+    assert resumable_upload.cleanup_stale_uploads(max_age=-1) == 1
+    assert resumable_upload.get_upload(upload['id']) is None
+    assert not os.listdir(resumable_upload.PARTIAL_UPLOAD_FOLDER)
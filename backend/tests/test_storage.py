@@ -0,0 +1,167 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+import storage
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_INDEX_PATH', str(tmp_path / 'storage.sqlite3'))
+    monkeypatch.setattr(storage, 'STORAGE_QUOTA_BYTES', 1000)
+    monkeypatch.setattr(storage, 'STORAGE_GC_HIGH_WATERMARK', 0.9)
+    monkeypatch.setattr(storage, 'STORAGE_GC_LOW_WATERMARK', 0.5)
+    monkeypatch.setattr(storage, 'STORAGE_MIN_IDLE_SECONDS', 3600)
+    monkeypatch.setattr(storage, 'STORAGE_EVICT_ORIGINALS', False)
+    monkeypatch.setattr(storage, '_stores', {})
+    monkeypatch.setattr(storage, '_touched', {})
+    monkeypatch.setattr(storage, '_last_gc', dict(storage._last_gc))
+
+
+@pytest.fixture
+def docs(tmp_path):
+    return storage.register_store('documents', str(tmp_path / 'documents'))
+
+
+def save(store, filename, size, idle_seconds=7200, origin=None):
+    """Guarda y registra un archivo de `size` bytes con su último acceso hace `idle_seconds`."""
+    with open(store.path_for(filename), 'wb') as f:
+        f.write(b'x' * size)
+    store.register(filename, origin=origin)
+    with storage._index() as conn:
+        conn.execute('UPDATE files SET last_access = ? WHERE store = ? AND filename = ?',
+                     (time.time() - idle_seconds, store.name, filename))
+
+
+def test_files_are_sharded_by_name_hash(docs):
+    path = docs.path_for('plano.pdf')
+    shard = hashlib.sha1(b'plano.pdf').hexdigest()[:2]
+    assert path == os.path.join(docs.root, shard, 'plano.pdf')
+    assert os.path.isdir(os.path.dirname(path))
+    assert docs.resolve('plano.pdf') is None
+    save(docs, 'plano.pdf', 10)
+    assert docs.resolve('plano.pdf') == path
+
+
+def test_reconcile_indexes_flat_files_in_place_and_skips_thumbnails(docs):
+    flat_path = os.path.join(docs.root, 'antiguo.pdf')
+    with open(flat_path, 'wb') as f:
+        f.write(b'a' * 40)
+    with open(os.path.join(docs.root, 'parcial.pdf.tmp'), 'wb') as f:
+        f.write(b'tmp')
+    os.makedirs(os.path.join(docs.root, 'thumbnails'))
+    assert docs.reconcile() == 1
+    # No se mueven: algunos archivos de la carpeta plana los versiona git.
+    assert docs.resolve('antiguo.pdf') == flat_path
+    assert not os.path.exists(docs.shard_path('antiguo.pdf'))
+    assert os.path.exists(os.path.join(docs.root, 'parcial.pdf.tmp'))
+    assert storage.used_bytes() == 40
+
+
+def test_flat_files_can_be_evicted(docs):
+    flat_path = os.path.join(docs.root, 'acc_antiguo.pdf')
+    with open(flat_path, 'wb') as f:
+        f.write(b'a' * 40)
+    docs.reconcile()
+    assert docs.evict('acc_antiguo.pdf')
+    assert not os.path.exists(flat_path)
+    assert storage.used_bytes() == 0
+
+
+def test_touch_bookkeeping_is_dropped_with_the_file(docs):
+    save(docs, 'acc_visto.pdf', 10)
+    save(docs, 'acc_borrado.pdf', 10)
+    docs.touch('acc_visto.pdf')
+    docs.touch('acc_borrado.pdf')
+    docs.evict('acc_visto.pdf')
+    os.remove(docs.resolve('acc_borrado.pdf'))
+    docs.reconcile()
+    assert storage._touched == {}
+
+
+def test_reconcile_forgets_missing_files_and_cleans_dependents(tmp_path):
+    removed = []
+    store = storage.register_store('maps', str(tmp_path / 'maps'), on_evict=removed.append)
+    save(store, 'capa.kml', 30)
+    os.remove(store.resolve('capa.kml'))
+    store.reconcile()
+    assert storage.used_bytes() == 0
+    assert removed == ['capa.kml']
+
+
+def test_gc_does_nothing_below_high_watermark(docs):
+    save(docs, 'acc_copia.pdf', 800)
+    assert storage.collect_garbage() == 0
+    assert docs.resolve('acc_copia.pdf')
+
+
+def test_gc_evicts_acc_copies_oldest_first_down_to_low_watermark(docs):
+    save(docs, 'acc_vieja.pdf', 310, idle_seconds=9000)
+    save(docs, 'acc_media.pdf', 310, idle_seconds=8000)
+    save(docs, 'acc_nueva.pdf', 310, idle_seconds=7200)
+    assert storage.collect_garbage() == 2
+    assert docs.resolve('acc_vieja.pdf') is None
+    assert docs.resolve('acc_media.pdf') is None
+    assert docs.resolve('acc_nueva.pdf')
+    assert storage.used_bytes() == 310
+
+
+def test_gc_never_touches_originals_unless_enabled(docs, monkeypatch):
+    save(docs, '20260101_original.pdf', 950)
+    assert storage.collect_garbage() == 0
+    assert docs.resolve('20260101_original.pdf')
+    monkeypatch.setattr(storage, 'STORAGE_EVICT_ORIGINALS', True)
+    assert storage.collect_garbage() == 1
+    assert docs.resolve('20260101_original.pdf') is None
+
+
+def test_gc_respects_minimum_idle_time(docs):
+    save(docs, 'acc_reciente.pdf', 950, idle_seconds=60)
+    assert storage.collect_garbage() == 0
+    # Pedir menos tiempo de inactividad que el configurado no lo reduce.
+    assert storage.collect_garbage(min_idle_seconds=0) == 0
+    assert docs.resolve('acc_reciente.pdf')
+
+
+def test_gc_evicts_derived_files_before_acc_copies(docs, tmp_path):
+    thumbs = storage.register_store('thumbnails', str(tmp_path / 'thumbs'), tier=storage.TIER_DERIVED)
+    save(docs, 'acc_copia.pdf', 450, idle_seconds=99999)
+    save(thumbs, 'otro.pdf.jpg', 500, idle_seconds=7200)
+    assert storage.collect_garbage() == 1
+    assert thumbs.resolve('otro.pdf.jpg') is None
+    assert docs.resolve('acc_copia.pdf')
+
+
+def test_evicting_a_document_evicts_its_thumbnail(tmp_path):
+    thumbs = storage.register_store('thumbnails', str(tmp_path / 'thumbs'), tier=storage.TIER_DERIVED)
+    docs = storage.register_store('documents', str(tmp_path / 'documents'),
+                                  on_evict=lambda name: thumbs.evict(f'{name}.jpg'))
+    save(docs, 'acc_plano.pdf', 900, idle_seconds=9000)
+    save(thumbs, 'acc_plano.pdf.jpg', 50, idle_seconds=100)  # aún no es candidata por sí sola
+    assert storage.collect_garbage() == 1
+    assert thumbs.resolve('acc_plano.pdf.jpg') is None
+    assert storage.used_bytes() == 0
+    assert storage.usage_stats()['last_gc']['freed_bytes'] == 950
+
+
+def test_evicted_acc_copy_keeps_its_origin_for_redirects(docs):
+    origin = {'projectId': 'b.1', 'versionId': 'urn:v1'}
+    save(docs, 'acc_v1_plano.pdf', 950, origin=origin)
+    save(docs, 'acc_sin_origen.pdf', 10)
+    docs.evict('acc_v1_plano.pdf')
+    docs.evict('acc_sin_origen.pdf')
+    assert docs.evicted_origin('acc_v1_plano.pdf') == origin
+    assert docs.evicted_origin('acc_sin_origen.pdf') is None
+    assert storage.used_bytes() == 0
+    assert storage.usage_stats()['stores']['documents']['evicted_acc_copies'] == 1
+
+
+def test_has_room_collects_garbage_when_needed(docs):
+    save(docs, 'acc_copia.pdf', 700)
+    save(docs, '20260101_original.pdf', 200)
+    assert storage.has_room(50)
+    assert storage.has_room(300)  # borra la copia de ACC para hacer sitio
+    assert docs.resolve('acc_copia.pdf') is None
+    assert not storage.has_room(900)  # los originales no se borran
@@ -0,0 +1,160 @@
+"""
+Miniaturas de documentos para la lista de pines.
+
+Las imágenes se reducen con Pillow y los PDF se rasterizan (primera página)
+con PyMuPDF. El trabajo corre en un pool de hilos en segundo plano y el
+resultado se guarda en un `storage.UploadStore` (`uploads/documents/thumbnails`,
+repartido en subcarpetas y dentro de la cuota). Para ítems de ACC se descarga
+una sola vez la miniatura de Model Derivative.
+
+Pillow y PyMuPDF son opcionales: sin ellos simplemente no se generan
+miniaturas locales y el cliente sigue mostrando el nombre del documento.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - dependencia opcional
+    Image = None
+
+try:
+    import pymupdf as fitz
+except ImportError:  # pragma: no cover - dependencia opcional
+    try:
+        import fitz  # PyMuPDF < 1.24
+    except ImportError:
+        fitz = None
+
+THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '256'))
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '2'))
+THUMBNAIL_QUALITY = 80
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tif', 'tiff'}
+PDF_EXTENSIONS = {'pdf'}
+MODEL_DERIVATIVE_URL = 'https://developer.api.autodesk.com/modelderivative/v2/designdata'
+
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def thumbnail_name(filename):
+    return f'{filename}.jpg'
+
+
+def acc_thumbnail_name(urn):
+    safe_urn = ''.join(c if c.isalnum() or c in '-_' else '_' for c in urn)
+    return f'acc_{safe_urn}.png'
+
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def supports_thumbnail(filename):
+    if Image is None:
+        return False
+    ext = _extension(filename)
+    return ext in IMAGE_EXTENSIONS or (ext in PDF_EXTENSIONS and fitz is not None)
+
+
+def _render_image(source_path):
+    image = Image.open(source_path)
+    image.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))  # decodificación reducida en JPEG
+    return image
+
+
+def _render_pdf_first_page(source_path):
+    with fitz.open(source_path) as doc:
+        page = doc[0]
+        zoom = THUMBNAIL_SIZE / max(page.rect.width, page.rect.height, 1)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+
+
+def _build_thumbnail(source_path, target_path, store):
+    try:
+        if _extension(source_path) in PDF_EXTENSIONS:
+            image = _render_pdf_first_page(source_path)
+        else:
+            image = _render_image(source_path)
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        tmp_path = f'{target_path}.tmp'
+        image.save(tmp_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(tmp_path, target_path)
+        store.register(os.path.basename(target_path))
+        print(f"[thumbnails] Generada {os.path.basename(target_path)}")
+    except Exception as e:
+        print(f"[thumbnails] No se pudo generar miniatura de {source_path}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.pop(target_path, None)
+
+
+def schedule_thumbnail(source_path, store):
+    """
+    Encola la miniatura de un archivo local en `store`. Devuelve 'ready', 'pending' o 'unsupported'.
+    """
+    filename = os.path.basename(source_path or '')
+    if not supports_thumbnail(filename):
+        return 'unsupported'
+    if store.resolve(thumbnail_name(filename)):
+        return 'ready'
+    if not os.path.exists(source_path):
+        return 'unsupported'
+    target_path = store.path_for(thumbnail_name(filename))
+    with _pending_lock:
+        if target_path not in _pending:
+            _pending[target_path] = _executor.submit(_build_thumbnail, source_path, target_path, store)
+    return 'pending'
+
+
+def fetch_acc_thumbnail(store, urn, token):
+    """Descarga (una sola vez) la miniatura de Model Derivative. Devuelve (ruta, error)."""
+    name = acc_thumbnail_name(urn)
+    existing = store.resolve(name)
+    if existing:
+        return existing, None
+    target_path = store.path_for(name)
+    try:
+        resp = requests.get(
+            f'{MODEL_DERIVATIVE_URL}/{urn}/thumbnail',
+            headers={'Authorization': f'Bearer {token}'},
+            params={'width': 200, 'height': 200},
+            timeout=30
+        )
+        if resp.status_code != 200:
+            return None, f'Miniatura no disponible ({resp.status_code}).'
+        tmp_path = f'{target_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(resp.content)
+        os.replace(tmp_path, target_path)
+        store.register(name)
+        return target_path, None
+    except requests.exceptions.RequestException as e:
+        return None, str(e)
+
+
+def schedule_acc_thumbnail(store, urn, token):
+    """Encola la descarga de la miniatura de ACC. Devuelve 'ready' o 'pending'."""
+    name = acc_thumbnail_name(urn)
+    if store.resolve(name):
+        return 'ready'
+    target_path = store.path_for(name)
+    with _pending_lock:
+        if target_path in _pending:
+            return 'pending'
+        future = _executor.submit(fetch_acc_thumbnail, store, urn, token)
+        _pending[target_path] = future
+    future.add_done_callback(lambda _: _release(target_path))
+    return 'pending'
+
+
+def _release(target_path):
+    with _pending_lock:
+        _pending.pop(target_path, None)
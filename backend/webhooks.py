@@ -0,0 +1,121 @@
+"""
+Webhooks de APS (Data Management) para invalidar `aps.cache` por eventos.
+
+Se registran hooks sobre la carpeta ACC configurada y el callback verifica la
+firma HMAC-SHA1 (`x-adsk-signature: sha1hash=<hex>`) calculada con el secreto
+registrado en /webhooks/v1/tokens. Cada evento se traduce en desalojos
+puntuales (contenido de carpeta, versiones del ítem, downloadFormats) y, si
+el endpoint está en el precalentador, en un refresco inmediato. Los desalojos
+se publican en cache_invalidation para que los apliquen también los demás
+workers, que no reciben el evento.
+"""
+import hashlib
+import hmac
+import os
+
+import requests
+
+import cache_invalidation
+from aps import invalidate_api_data
+from cache_warmer import refresh_now
+
+APS_WEBHOOKS_URL = 'https://developer.api.autodesk.com/webhooks/v1'
+APS_WEBHOOK_SECRET = os.getenv('APS_WEBHOOK_SECRET')
+# URL pública de /api/webhooks/aps; no se acepta del cliente ni se deduce de la cabecera Host.
+APS_WEBHOOK_CALLBACK_URL = os.getenv('APS_WEBHOOK_CALLBACK_URL')
+WEBHOOK_EVENTS = (
+    'dm.version.added', 'dm.version.modified', 'dm.version.deleted',
+    'dm.version.moved', 'dm.version.copied',
+    'dm.folder.added', 'dm.folder.modified', 'dm.folder.deleted', 'dm.folder.moved',
+)
+
+
+def verify_signature(raw_body, signature_header, secret=APS_WEBHOOK_SECRET):
+    """Compara en tiempo constante la firma `sha1hash=<hex>` del cuerpo crudo."""
+    if not secret or not signature_header:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), raw_body, hashlib.sha1).hexdigest()
+    received = signature_header.split('=', 1)[-1].strip()
+    # En bytes: compare_digest no admite str con caracteres no ASCII (cabeceras latin-1).
+    return hmac.compare_digest(expected.encode('ascii'), received.encode('utf-8'))
+
+
+def register_webhook_secret(token, secret=APS_WEBHOOK_SECRET):
+    """Registra (o actualiza) el secreto con el que APS firma los eventos."""
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    resp = requests.post(f'{APS_WEBHOOKS_URL}/tokens', headers=headers, json={'token': secret}, timeout=30)
+    if resp.status_code == 400:
+        # Ya existe un secreto para esta app: se reemplaza.
+        resp = requests.put(f'{APS_WEBHOOKS_URL}/tokens/@me', headers=headers, json={'token': secret}, timeout=30)
+    if not resp.ok:
+        return f'Webhook secret error: {resp.status_code} {resp.text}'
+    return None
+
+
+def register_webhooks(token, callback_url, folder_urn, events=WEBHOOK_EVENTS):
+    """Crea un hook por evento sobre la carpeta. Devuelve {evento: 'created'|'exists'|error}."""
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    results = {}
+    for event in events:
+        try:
+            resp = requests.post(
+                f'{APS_WEBHOOKS_URL}/systems/data/events/{event}/hooks',
+                headers=headers,
+                json={'callbackUrl': callback_url, 'scope': {'folder': folder_urn}},
+                timeout=30
+            )
+        except requests.exceptions.RequestException as e:
+            results[event] = str(e)
+            continue
+        if resp.status_code in (200, 201):
+            results[event] = 'created'
+        elif resp.status_code == 409:
+            results[event] = 'exists'
+        else:
+            results[event] = f'{resp.status_code} {resp.text}'
+    return results
+
+
+def _project_id(payload):
+    project = payload.get('project') or ''
+    return project if not project or project.startswith('b.') else f'b.{project}'
+
+
+def endpoints_for_event(event):
+    """Endpoints de `aps.cache` afectados por un evento de Data Management."""
+    hook = event.get('hook') or {}
+    event_type = hook.get('event') or event.get('eventType') or ''
+    payload = event.get('payload') or {}
+    project_id = _project_id(payload)
+    if not project_id:
+        return event_type, []
+
+    endpoints = set()
+    folders = {payload.get('parentFolderUrn'), payload.get('sourceParentFolderUrn')}
+    if event_type.startswith('dm.folder.'):
+        folders.add(event.get('resourceUrn') or payload.get('source'))
+    for folder_urn in filter(None, folders):
+        endpoints.add(f'data/v1/projects/{project_id}/folders/{folder_urn}/contents')
+
+    if event_type.startswith('dm.version.'):
+        lineage = payload.get('lineageUrn')
+        if lineage:
+            endpoints.add(f'data/v1/projects/{project_id}/items/{lineage}/versions')
+        version_urn = event.get('resourceUrn') or payload.get('source')
+        if version_urn:
+            endpoints.add(f'data/v1/projects/{project_id}/versions/{version_urn}')
+            endpoints.add(f'data/v1/projects/{project_id}/versions/{version_urn}/downloadFormats')
+    return event_type, sorted(endpoints)
+
+
+def handle_event(event):
+    """Desaloja las entradas afectadas; las que mantiene el precalentador se refrescan ya."""
+    event_type, endpoints = endpoints_for_event(event)
+    refreshed = []
+    for endpoint in endpoints:
+        invalidate_api_data(endpoint)
+        if refresh_now(endpoint):
+            refreshed.append(endpoint)
+    cache_invalidation.publish(endpoints)
+    print(f"[webhooks] {event_type}: {len(endpoints)} entradas invalidadas, {len(refreshed)} en refresco")
+    return {'event': event_type, 'invalidated': endpoints, 'refreshing': refreshed}
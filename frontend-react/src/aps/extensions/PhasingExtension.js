@@ -88,6 +88,34 @@ function formatISO(date) {
   return `${year}-${month}-${day}`;
 }
 
+// dbId sets travel as runs: [gap, length, gap, length, ...], gap measured from the previous run's end
+function encodeDbIdRuns(dbIds) {
+  const sorted = Array.from(new Set(dbIds)).sort((a, b) => a - b);
+  const runs = [];
+  let previousEnd = 0;
+  let i = 0;
+  while (i < sorted.length) {
+    const start = sorted[i];
+    let length = 1;
+    while (i + length < sorted.length && sorted[i + length] === start + length) length += 1;
+    runs.push(start - previousEnd, length);
+    previousEnd = start + length;
+    i += length;
+  }
+  return runs;
+}
+
+function decodeDbIdRuns(runs = []) {
+  const dbIds = [];
+  let previousEnd = 0;
+  for (let i = 0; i < runs.length; i += 2) {
+    const start = previousEnd + runs[i];
+    for (let k = 0; k < runs[i + 1]; k += 1) dbIds.push(start + k);
+    previousEnd = start + runs[i + 1];
+  }
+  return dbIds;
+}
+
 class PhasingPanel extends Autodesk.Viewing.UI.DockingPanel {
   constructor(extension, id, title, options = {}) {
     const merged = { ...DEFAULT_PANEL_OPTIONS, ...options };
@@ -263,6 +291,64 @@ class PhasingPanel extends Autodesk.Viewing.UI.DockingPanel {
 
     this.updateWeeklySaveOptions(phasing_config.activeSave);
     this.updateSimulationRange([]);
+    this.loadServerSaves();
+  }
+
+  getPhasingApiUrl(name = null) {
+    const urn = this.extension.viewer.model?.getData()?.urn;
+    if (!urn) return null;
+    const base = `/api/phasing/${encodeURIComponent(urn)}/configs`;
+    return name ? `${base}/${encodeURIComponent(name)}` : base;
+  }
+
+  async loadServerSaves() {
+    const url = this.getPhasingApiUrl();
+    if (!url) return;
+    try {
+      const res = await fetch(url);
+      if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+      const json = await res.json();
+      (json.configs || []).forEach(config => {
+        if (!phasing_config.weeklySaves[config.name]) {
+          // Placeholder: tasks and dbIds are downloaded when the save is selected
+          phasing_config.weeklySaves[config.name] = { remote: true, tasks: [], objects: {} };
+        }
+      });
+      this.updateWeeklySaveOptions(phasing_config.activeSave);
+    } catch (e) {
+      console.warn('No se pudieron cargar los guardados del servidor:', e);
+    }
+  }
+
+  async persistWeeklySave(name) {
+    const url = this.getPhasingApiUrl(name);
+    const snapshot = phasing_config.weeklySaves[name];
+    if (!url || !snapshot) return;
+    const objects = Object.fromEntries(
+      Object.entries(snapshot.objects).map(([key, list]) => [key, { runs: encodeDbIdRuns(list) }])
+    );
+    try {
+      const res = await fetch(url, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ tasks: snapshot.tasks, objects, propMappings: phasing_config.propMappings })
+      });
+      if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+    } catch (e) {
+      console.warn('No se pudo guardar en el servidor:', e);
+    }
+  }
+
+  async fetchServerSave(name) {
+    const res = await fetch(this.getPhasingApiUrl(name));
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+    const config = await res.json();
+    phasing_config.weeklySaves[name] = {
+      tasks: config.tasks || [],
+      objects: Object.fromEntries(
+        Object.entries(config.objects || {}).map(([key, set]) => [key, decodeDbIdRuns(set.runs)])
+      )
+    };
   }
 
   createButton(label, handler) {
@@ -325,6 +411,7 @@ class PhasingPanel extends Autodesk.Viewing.UI.DockingPanel {
     this.saveWeeklySnapshot(name, phasing_config.tasks, phasing_config.objects);
     phasing_config.activeSave = name;
     this.updateWeeklySaveOptions(name);
+    this.persistWeeklySave(name);
   }
 
   getWeekLabel(date) {
@@ -348,8 +435,16 @@ class PhasingPanel extends Autodesk.Viewing.UI.DockingPanel {
     };
   }
 
-  loadWeeklySave(name) {
+  async loadWeeklySave(name) {
     if (!name || !phasing_config.weeklySaves[name]) return;
+    if (phasing_config.weeklySaves[name].remote) {
+      try {
+        await this.fetchServerSave(name);
+      } catch (e) {
+        console.error('Error loading saved schedule:', e);
+        return;
+      }
+    }
     const snapshot = phasing_config.weeklySaves[name];
     const tasks = snapshot.tasks.map(task => ({
       ...task,
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useMemo } from 'react';
 
 const API_ENDPOINTS = {
     hubs: '/api/hubs',
@@ -6,6 +6,62 @@ const API_ENDPOINTS = {
     topFolders: (hubId, projectId) => `/api/hubs/${hubId}/projects/${projectId}/topFolders`,
     folderContents: (projectId, folderId) => `/api/projects/${projectId}/folders/${folderId}/contents`,
     itemVersions: (projectId, itemId) => `/api/projects/${projectId}/items/${itemId}/versions`,
+    itemsVersionsBatch: (projectId) => `/api/projects/${projectId}/items/versions?fields[versions]=versionNumber,lastModifiedTime,displayName,name,links`,
+};
+
+// Same limit as VERSIONS_BATCH_MAX_ITEMS in the backend; larger folders are split into several requests
+const VERSIONS_BATCH_MAX_ITEMS = 200;
+
+// Highest versionNumber wins, the same rule the backend uses for tip=true
+const tipOf = (versions) => (versions || []).reduce(
+    (best, version) => (!best || (version.attributes?.versionNumber || 0) > (best.attributes?.versionNumber || 0) ? version : best),
+    null
+);
+
+const projectIdFromNode = (node) => {
+    const match = node.links?.self?.href?.match(/projects\/(b\.[a-zA-Z0-9\-_]+)/);
+    return match ? match[1] : null;
+};
+
+// Tip version of every item in a folder listing, in one request
+const useTipVersions = (items, projectId) => {
+    const [tips, setTips] = useState({});
+    // Stable key: the effect only re-runs when the set of item ids changes, not on every render
+    const itemIds = items ? items.map(item => item.id).join(',') : '';
+
+    useEffect(() => {
+        if (!projectId || !itemIds) return;
+        const fetchBatch = async (batch) => {
+            const res = await fetch(API_ENDPOINTS.itemsVersionsBatch(projectId), {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ items: batch, tip: true }),
+            });
+            if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+            const json = await res.json();
+            return json.items || {};
+        };
+        const fetchTips = async () => {
+            try {
+                const ids = itemIds.split(',');
+                const batches = [];
+                for (let i = 0; i < ids.length; i += VERSIONS_BATCH_MAX_ITEMS) {
+                    batches.push(ids.slice(i, i + VERSIONS_BATCH_MAX_ITEMS));
+                }
+                const results = await Promise.all(batches.map(fetchBatch));
+                const next = {};
+                results.forEach(items => Object.entries(items).forEach(([itemId, entry]) => {
+                    if (entry.data) next[itemId] = entry.data;
+                }));
+                setTips(prev => (JSON.stringify(prev) === JSON.stringify(next) ? prev : next));
+            } catch (e) {
+                console.error('Error fetching tip versions:', e);
+            }
+        };
+        fetchTips();
+    }, [itemIds, projectId]);
+
+    return tips;
 };
 
 // Custom hook for fetching data
@@ -34,7 +90,7 @@ const useFetch = (url) => {
     return { data, error, loading };
 };
 
-const TreeNode = ({ node, onFileSelect, hubId }) => {
+const TreeNode = ({ node, onFileSelect, hubId, tipVersion }) => {
     const [isOpen, setIsOpen] = useState(false);
     let url = null;
     if (isOpen) {
@@ -61,6 +117,11 @@ const TreeNode = ({ node, onFileSelect, hubId }) => {
     const { data: children, error, loading } = useFetch(url);
 
     const isFolder = node.type !== 'items' && node.type !== 'versions';
+    const childItems = useMemo(
+        () => (node.type === 'folders' && children ? children.filter(child => child.type === 'items') : null),
+        [node.type, children]
+    );
+    const tipVersions = useTipVersions(childItems, node.type === 'folders' ? projectIdFromNode(node) : null);
 
     const handleToggle = async () => {
         if (isFolder) {
@@ -72,11 +133,14 @@ const TreeNode = ({ node, onFileSelect, hubId }) => {
         if (!projectId) return;
         const versionsUrl = API_ENDPOINTS.itemVersions(projectId, node.id);
         try {
-            const res = await fetch(versionsUrl);
-            if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
-            const json = await res.json();
-            if (!json.data || !json.data.length) return;
-            const latestVersion = json.data[json.data.length - 1];
+            let latestVersion = tipVersion;
+            if (!latestVersion) {
+                const res = await fetch(versionsUrl);
+                if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+                const json = await res.json();
+                latestVersion = tipOf(json.data);
+                if (!latestVersion) return;
+            }
             const versionUrn = latestVersion.id;
             const urn = btoa(versionUrn).replace(/=+$/, '');
             const label = node.attributes.displayName || latestVersion.attributes?.displayName || latestVersion.attributes?.name;
@@ -108,13 +172,19 @@ const TreeNode = ({ node, onFileSelect, hubId }) => {
             <div onClick={handleToggle} style={{ cursor: 'pointer' }}>
                 <i className={getIcon()} style={{ marginRight: '5px' }}></i>
                 {node.attributes.displayName || node.attributes.name}
+                {tipVersion && (
+                    <span style={{ marginLeft: '6px', opacity: 0.6, fontSize: '0.85em' }}>
+                        v{tipVersion.attributes?.versionNumber}
+                        {tipVersion.attributes?.lastModifiedTime && ` · ${new Date(tipVersion.attributes.lastModifiedTime).toLocaleDateString()}`}
+                    </span>
+                )}
             </div>
             {isOpen && (
                 <ul style={{ paddingLeft: '20px' }}>
                     {loading && <li>Loading...</li>}
                     {error && <li>Error loading data.</li>}
                     {children && children.map(child => (
-                        <TreeNode key={child.id} node={child} onFileSelect={onFileSelect} hubId={node.type === 'hubs' ? node.id : hubId} />
+                        <TreeNode key={child.id} node={child} onFileSelect={onFileSelect} hubId={node.type === 'hubs' ? node.id : hubId} tipVersion={tipVersions[child.id]} />
                     ))}
                 </ul>
             )}
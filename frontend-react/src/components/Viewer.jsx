@@ -52,7 +52,11 @@ const Viewer = ({ models, sprites, showSprites, activeSpriteId, onSpriteSelect,
     };
 
     useEffect(() => {
-        const initializeViewer = () => {
+        const initializeViewer = async () => {
+            // Si el backend tiene activo el proxy de derivados, el visor descarga todo a través de él.
+            const viewerConfig = await fetch('/api/viewer/config')
+                .then(res => (res.ok ? res.json() : {}))
+                .catch(() => ({}));
             const options = {
                 env: 'AutodeskProduction',
                 getAccessToken: (onSuccess) => {
@@ -63,6 +67,9 @@ const Viewer = ({ models, sprites, showSprites, activeSpriteId, onSpriteSelect,
             };
 
             Autodesk.Viewing.Initializer(options, () => {
+                if (viewerConfig.derivative_proxy) {
+                    Autodesk.Viewing.endpoint.setEndpointAndApi(viewerConfig.derivative_proxy, 'modelDerivativeV2');
+                }
                 Autodesk.Viewing.theExtensionManager.registerExtension('BaseExtension', BaseExtension);
                 Autodesk.Viewing.theExtensionManager.registerExtension('LoggerExtension', LoggerExtension);
                 Autodesk.Viewing.theExtensionManager.registerExtension('HistogramExtension', HistogramExtension);